@@ -0,0 +1,154 @@
+#!/usr/bin/env python
+"""
+Бенчмарк синхронных и асинхронных представлений (core/async_views.py).
+
+Для каждого режима запускается отдельный процесс:
+    sync  - синхронные представления DRF, WORKERS потоков с тестовым
+            клиентом Django (как WORKERS синхронных воркеров);
+    async - async-представления (ASYNC_VIEWS=True) в одном цикле событий,
+            до CONCURRENCY одновременных запросов через AsyncClient.
+Запросы выполняются в процессе, без сети: сравнивается стоимость
+обработки и поведение при конкурентных запросах, а не сервер.
+
+Нужна база с тестовыми данными (python create_test_data.py).
+Запуск: python benchmarks/bench_asgi.py [запросов] [воркеров] [конкурентность]
+"""
+
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Настройка Django
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+EMAIL = 'user1@example.com'
+PASSWORD = 'User123!'
+
+# (название, метод, путь, нужен ли токен)
+ENDPOINTS = [
+    ('login', 'post', '/api/auth/login/', False),
+    ('profile', 'get', '/api/auth/profile/', True),
+    ('projects', 'get', '/api/projects/', True),
+    ('dashboard', 'get', '/api/dashboard/', True),
+]
+
+
+def _summary(latencies, elapsed):
+    latencies = sorted(latencies)
+    return {
+        'rps': len(latencies) / elapsed,
+        'p50': statistics.median(latencies) * 1000,
+        'p95': latencies[int(len(latencies) * 0.95) - 1] * 1000,
+    }
+
+
+def run_sync(requests, workers):
+    from django.test import Client
+
+    token = Client().post(
+        '/api/auth/login/', {'email': EMAIL, 'password': PASSWORD}, content_type='application/json'
+    ).json()['tokens']['access']
+
+    results = {}
+    for name, method, path, authenticated in ENDPOINTS:
+        headers = {'HTTP_AUTHORIZATION': f'Bearer {token}'} if authenticated else {}
+        body = {'email': EMAIL, 'password': PASSWORD} if method == 'post' else None
+
+        def one(_):
+            client = Client()
+            start = time.perf_counter()
+            response = getattr(client, method)(path, body, content_type='application/json', **headers)
+            assert response.status_code == 200, (name, response.status_code)
+            return time.perf_counter() - start
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            latencies = list(executor.map(one, range(requests)))
+        results[name] = _summary(latencies, time.perf_counter() - start)
+    return results
+
+
+async def run_async(requests, concurrency):
+    from django.test import AsyncClient
+
+    client = AsyncClient()
+    response = await client.post(
+        '/api/auth/login/', {'email': EMAIL, 'password': PASSWORD}, content_type='application/json'
+    )
+    token = response.json()['tokens']['access']
+
+    results = {}
+    for name, method, path, authenticated in ENDPOINTS:
+        headers = {'Authorization': f'Bearer {token}'} if authenticated else {}
+        body = {'email': EMAIL, 'password': PASSWORD} if method == 'post' else None
+        slots = asyncio.Semaphore(concurrency)
+
+        async def one():
+            async with slots:
+                start = time.perf_counter()
+                response = await getattr(client, method)(
+                    path, body, content_type='application/json', headers=headers
+                )
+                assert response.status_code == 200, (name, response.status_code)
+                return time.perf_counter() - start
+
+        start = time.perf_counter()
+        latencies = await asyncio.gather(*(one() for _ in range(requests)))
+        results[name] = _summary(latencies, time.perf_counter() - start)
+    return results
+
+
+def child(mode, requests, workers, concurrency):
+    import django
+
+    django.setup()
+
+    if mode == 'sync':
+        results = run_sync(requests, workers)
+    else:
+        results = asyncio.run(run_async(requests, concurrency))
+    print(json.dumps(results))
+
+
+def main():
+    requests = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    workers = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+    concurrency = int(sys.argv[3]) if len(sys.argv) > 3 else 64
+
+    env = dict(
+        os.environ,
+        # Лимиты попыток входа не должны мешать измерению
+        LOGIN_THROTTLE_EMAIL_RATE=f'{requests * 10}/s',
+        LOGIN_THROTTLE_IP_RATE=f'{requests * 10}/s',
+        PASSWORD_HASHING_MAX_QUEUE=str(max(requests, 32)),
+    )
+    results = {}
+    for mode in ('sync', 'async'):
+        output = subprocess.run(
+            [sys.executable, __file__, '--child', mode, str(requests), str(workers), str(concurrency)],
+            env=dict(env, ASYNC_VIEWS=str(mode == 'async')),
+            check=True, capture_output=True, text=True,
+        ).stdout
+        results[mode] = json.loads(output.strip().splitlines()[-1])
+
+    print(f'Запросов: {requests}, sync-воркеров: {workers}, async-конкурентность: {concurrency}')
+    print(f'{"Эндпоинт":<12} {"sync rps":>9} {"p50 мс":>8} {"p95 мс":>8} {"async rps":>10} {"p50 мс":>8} {"p95 мс":>8}')
+    for name, *_ in ENDPOINTS:
+        sync, async_ = results['sync'][name], results['async'][name]
+        print(
+            f'{name:<12} {sync["rps"]:>9.0f} {sync["p50"]:>8.1f} {sync["p95"]:>8.1f}'
+            f' {async_["rps"]:>10.0f} {async_["p50"]:>8.1f} {async_["p95"]:>8.1f}'
+        )
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1 and sys.argv[1] == '--child':
+        child(sys.argv[2], *map(int, sys.argv[3:6]))
+    else:
+        main()
@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+"""
+Бенчмарк скомпилированных условий доступа (core/conditions.py).
+
+Сравнивает стоимость одной проверки для документов условий растущей
+сложности: скомпилированный предикат против компиляции на каждой проверке.
+Контекст создается на каждую проверку, запрос общий (как в HasPermission):
+IP и время разбираются один раз на запрос.
+Запуск: python benchmarks/bench_conditions.py [количество_итераций]
+"""
+
+import os
+import sys
+import timeit
+
+# Настройка Django
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import django
+
+django.setup()
+
+from django.test import RequestFactory
+
+from core.conditions import ConditionContext, compile_conditions, conditions_key, _compile
+from core.models import User
+
+
+CASES = [
+    ('без условий', {}),
+    ('отдел', {'department': 'sales'}),
+    ('отдел + время', {
+        'department': ['sales', 'it'],
+        'time_restriction': {'start': '00:00', 'end': '23:59', 'weekdays': [0, 1, 2, 3, 4, 5, 6]},
+    }),
+    ('отдел + время + атрибуты', {
+        'department': ['sales', 'it'],
+        'time_restriction': {'start': '00:00', 'end': '23:59'},
+        'attributes': {'is_staff': False, 'is_active': True, 'last_name': ['Иванов', 'Петров']},
+    }),
+    ('все + 32 IP-сети', {
+        'department': ['sales', 'it'],
+        'time_restriction': {'start': '00:00', 'end': '23:59'},
+        'attributes': {'is_staff': False, 'is_active': True},
+        'ip_ranges': [f'10.{i}.0.0/16' for i in range(31)] + ['127.0.0.0/8'],
+    }),
+]
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+
+    user = User(email='bench@example.com', last_name='Иванов', department='sales')
+    request = RequestFactory().get('/', REMOTE_ADDR='127.0.0.1')
+
+    print(f'{"Условия":<28} {"компилир., нс":>14} {"без кэша, нс":>14}')
+    for name, conditions in CASES:
+        key = conditions_key(conditions)
+        predicate = compile_conditions(conditions, key)
+
+        def compiled():
+            predicate(ConditionContext(user, request))
+
+        def uncompiled():
+            _compile(conditions)(ConditionContext(user, request))
+
+        assert predicate(ConditionContext(user, request)), name
+
+        compiled_ns = min(timeit.repeat(compiled, number=iterations, repeat=3)) / iterations * 1e9
+        uncompiled_ns = min(timeit.repeat(uncompiled, number=iterations // 10, repeat=3)) / (iterations // 10) * 1e9
+        print(f'{name:<28} {compiled_ns:>14.0f} {uncompiled_ns:>14.0f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,122 @@
+"""
+Асинхронные версии читающих эндпоинтов (ASGI, ASYNC_VIEWS=True).
+Данные и проверки совпадают с business_app/views.py.
+"""
+
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse
+from rest_framework import status
+
+from core.async_views import async_api
+from core.utils import alog_action
+from .views import (
+    mock_project_list, mock_project_details, mock_document_list, mock_document,
+    mock_dashboard, dashboard_roles
+)
+
+
+@async_api()
+async def project_list(request):
+    """Список проектов (моковые данные)"""
+    mock_projects = mock_project_list(request.user.email)
+
+    # Логируем доступ
+    await alog_action(
+        user=request.user,
+        action='view',
+        resource_type='project',
+        details={'action': 'list_projects'}
+    )
+
+    return JsonResponse({
+        'message': 'Список проектов',
+        'mock_projects': mock_projects,
+        'total': len(mock_projects)
+    })
+
+
+@async_api()
+async def project_detail(request, project_id):
+    """Детали проекта (моковые данные)"""
+    project = mock_project_details(project_id, request.user.email)
+    if project is None:
+        return JsonResponse(
+            {'error': 'Проект не найден'},
+            status=status.HTTP_404_NOT_FOUND
+        )
+
+    await alog_action(
+        user=request.user,
+        action='view',
+        resource_type='project',
+        resource_id=project_id,
+        details={'mock_data': True}
+    )
+
+    return JsonResponse({
+        'message': 'Детали проекта (моковые данные)',
+        'project': project,
+        'note': 'Это демонстрационные данные'
+    })
+
+
+@async_api()
+async def document_list(request):
+    """Список документов (моковые данные)"""
+    mock_documents = mock_document_list(request.user.email)
+
+    await alog_action(
+        user=request.user,
+        action='view',
+        resource_type='document',
+        details={'action': 'list_documents'}
+    )
+
+    return JsonResponse({
+        'message': 'Список документов',
+        'mock_documents': mock_documents,
+        'total': len(mock_documents)
+    })
+
+
+@async_api()
+async def document_download(request, document_id):
+    """Скачивание документа (моковые данные)"""
+    document = mock_document(document_id)
+    if document is None:
+        return JsonResponse(
+            {'error': 'Документ не найден'},
+            status=status.HTTP_404_NOT_FOUND
+        )
+
+    await alog_action(
+        user=request.user,
+        action='download',
+        resource_type='document',
+        resource_id=document_id,
+        details={
+            'file_name': document['name'],
+            'file_size': document['size']
+        }
+    )
+
+    return JsonResponse({
+        'message': 'Документ готов к скачиванию',
+        'document': document,
+        'download_url': f'/api/documents/{document_id}/download/file/',
+        'note': 'Это демонстрационные данные. В реальном приложении здесь был бы файл.'
+    })
+
+
+@async_api()
+async def dashboard(request):
+    """Панель управления (моковые данные)"""
+    roles = await sync_to_async(dashboard_roles)(request.user)
+
+    await alog_action(
+        user=request.user,
+        action='view',
+        resource_type='dashboard'
+    )
+
+    return JsonResponse(mock_dashboard(request.user, roles))
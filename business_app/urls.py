@@ -1,16 +1,32 @@
+from django.conf import settings
 from django.urls import path
 from . import views
 
+if settings.ASYNC_VIEWS:
+    # ASGI: асинхронные версии читающих эндпоинтов
+    from . import async_views
+    project_list = async_views.project_list
+    project_detail = async_views.project_detail
+    document_list = async_views.document_list
+    document_download = async_views.document_download
+    dashboard = async_views.dashboard
+else:
+    project_list = views.ProjectListView.as_view()
+    project_detail = views.ProjectDetailView.as_view()
+    document_list = views.DocumentListView.as_view()
+    document_download = views.DocumentDownloadView.as_view()
+    dashboard = views.DashboardView.as_view()
+
 urlpatterns = [
     # Бизнес-эндпоинты
-    path('projects/', views.ProjectListView.as_view(), name='project-list'),
-    path('projects/<uuid:project_id>/', views.ProjectDetailView.as_view(), name='project-detail'),
+    path('projects/', project_list, name='project-list'),
+    path('projects/<uuid:project_id>/', project_detail, name='project-detail'),
     path('projects/create/', views.CreateProjectView.as_view(), name='project-create'),
     
-    path('documents/', views.DocumentListView.as_view(), name='document-list'),
-    path('documents/<uuid:document_id>/download/', views.DocumentDownloadView.as_view(), name='document-download'),
+    path('documents/', document_list, name='document-list'),
+    path('documents/<uuid:document_id>/download/', document_download, name='document-download'),
     
-    path('dashboard/', views.DashboardView.as_view(), name='dashboard'),
+    path('dashboard/', dashboard, name='dashboard'),
     
     # Демонстрационные эндпоинты
     path('demo/access/', views.AccessDeniedDemoView.as_view(), name='access-demo'),
@@ -5,7 +5,171 @@ from rest_framework.permissions import AllowAny, BasePermission
 from django.utils import timezone
 import uuid
 
+from core.models import Role
 from core.utils import log_action
+from core.snapshot import get_permission_snapshot
+from core.tokens import get_authz_claims
+
+
+# Моковые данные (общие для синхронных и async-представлений)
+def mock_project_list(owner_email):
+    """Моковые проекты для демонстрации"""
+    return [
+        {
+            'id': str(uuid.uuid4()),
+            'name': 'Проект Альфа',
+            'description': 'Разработка новой системы управления',
+            'status': 'active',
+            'created_at': '2024-01-15T10:00:00Z',
+            'owner': owner_email
+        },
+        {
+            'id': str(uuid.uuid4()),
+            'name': 'Проект Бета',
+            'description': 'Модернизация инфраструктуры',
+            'status': 'planning',
+            'created_at': '2024-02-01T14:30:00Z',
+            'owner': owner_email
+        },
+        {
+            'id': str(uuid.uuid4()),
+            'name': 'Проект Гамма',
+            'description': 'Внедрение системы безопасности',
+            'status': 'completed',
+            'created_at': '2023-12-10T09:15:00Z',
+            'owner': owner_email
+        },
+    ]
+
+
+def mock_project_details(project_id, owner_email):
+    """Детали мокового проекта (None - не найден)"""
+    mock_projects = {
+        '550e8400-e29b-41d4-a716-446655440000': {
+            'id': '550e8400-e29b-41d4-a716-446655440000',
+            'name': 'Проект Альфа',
+            'description': 'Разработка новой системы управления',
+            'status': 'active',
+            'owner': owner_email,
+            'created_at': '2024-01-15T10:00:00Z',
+            'team_members': [
+                {'name': 'Иван Иванов', 'role': 'Team Lead'},
+                {'name': 'Петр Петров', 'role': 'Backend Developer'},
+                {'name': 'Сидор Сидоров', 'role': 'Frontend Developer'},
+            ],
+            'tasks_completed': 42,
+            'tasks_total': 100,
+            'budget': '1,200,000 руб.',
+            'deadline': '2024-06-30'
+        }
+    }
+    return mock_projects.get(str(project_id))
+
+
+def mock_document_list(owner_email):
+    """Моковые документы для демонстрации"""
+    return [
+        {
+            'id': str(uuid.uuid4()),
+            'name': 'Техническое задание.pdf',
+            'type': 'pdf',
+            'size': '2.4 MB',
+            'uploaded_at': '2024-01-20T11:30:00Z',
+            'owner': owner_email
+        },
+        {
+            'id': str(uuid.uuid4()),
+            'name': 'Презентация проекта.pptx',
+            'type': 'pptx',
+            'size': '5.1 MB',
+            'uploaded_at': '2024-01-18T15:45:00Z',
+            'owner': owner_email
+        },
+        {
+            'id': str(uuid.uuid4()),
+            'name': 'Бюджет проекта.xlsx',
+            'type': 'xlsx',
+            'size': '1.2 MB',
+            'uploaded_at': '2024-01-17T09:20:00Z',
+            'owner': owner_email
+        },
+    ]
+
+
+def mock_document(document_id):
+    """Моковый документ для скачивания (None - не найден)"""
+    mock_documents = {
+        '550e8400-e29b-41d4-a716-446655440001': {
+            'id': '550e8400-e29b-41d4-a716-446655440001',
+            'name': 'Техническое задание.pdf',
+            'content': 'Моковое содержимое PDF файла',
+            'mime_type': 'application/pdf',
+            'size': 2516582  # 2.4 MB в байтах
+        }
+    }
+    return mock_documents.get(str(document_id))
+
+
+def dashboard_roles(user):
+    """Роли пользователя для панели: назначенные напрямую, через группы и унаследованные"""
+    codes = get_permission_snapshot(user).role_codes
+    return list(Role.objects.filter(code__in=codes).order_by('name'))
+
+
+def mock_dashboard(user, roles):
+    """Панель управления пользователя с ролями roles (моковые данные)"""
+    role_names = [role.name for role in roles]
+    
+    # Простая проверка прав на основе ролей
+    has_project_view = False
+    has_document_view = False
+    has_user_manage = False
+    
+    for role in roles:
+        role_code = role.code
+        if role_code in ['admin', 'manager', 'user', 'viewer']:
+            has_project_view = True
+        if role_code in ['admin', 'manager', 'user']:
+            has_document_view = True
+        if role_code == 'admin':
+            has_user_manage = True
+    
+    return {
+        'message': 'Панель управления',
+        'user': {
+            'email': user.email,
+            'full_name': user.get_full_name(),
+            'roles': role_names
+        },
+        'permissions': {
+            'view_projects': has_project_view,
+            'view_documents': has_document_view,
+            'manage_users': has_user_manage,
+        },
+        'stats': {
+            'total_projects': 15,
+            'active_projects': 8,
+            'total_documents': 127,
+            'storage_used': '2.3 GB'
+        },
+        'recent_activity': [
+            {
+                'action': 'Создан проект',
+                'project': 'Проект Альфа',
+                'time': '2 часа назад'
+            },
+            {
+                'action': 'Загружен документ',
+                'document': 'Техническое задание.pdf',
+                'time': 'Вчера, 14:30'
+            },
+            {
+                'action': 'Обновлен профиль',
+                'details': 'Изменена контактная информация',
+                'time': '3 дня назад'
+            }
+        ]
+    }
 
 
 # Простые кастомные классы разрешений
@@ -28,14 +192,11 @@ class CanCreateProjects(BasePermission):
             return False
         
         # Проверяем, есть ли у пользователя роль admin или manager
-        from core.models import UserRole
-        user_roles = UserRole.objects.filter(user=request.user)
-        
-        for user_role in user_roles:
-            if user_role.role.code in ['admin', 'manager']:
-                return True
+        claims = get_authz_claims(request)
+        if claims is not None:
+            return not {'admin', 'manager'}.isdisjoint(claims['roles'])
         
-        return False
+        return get_permission_snapshot(request.user).has_role('admin', 'manager')
 
 
 class CanViewDocuments(BasePermission):
@@ -52,33 +213,7 @@ class ProjectListView(APIView):
     permission_classes = [CanViewProjects]
     
     def get(self, request):
-        # Моковые проекты для демонстрации
-        mock_projects = [
-            {
-                'id': str(uuid.uuid4()),
-                'name': 'Проект Альфа',
-                'description': 'Разработка новой системы управления',
-                'status': 'active',
-                'created_at': '2024-01-15T10:00:00Z',
-                'owner': request.user.email
-            },
-            {
-                'id': str(uuid.uuid4()),
-                'name': 'Проект Бета',
-                'description': 'Модернизация инфраструктуры',
-                'status': 'planning',
-                'created_at': '2024-02-01T14:30:00Z',
-                'owner': request.user.email
-            },
-            {
-                'id': str(uuid.uuid4()),
-                'name': 'Проект Гамма',
-                'description': 'Внедрение системы безопасности',
-                'status': 'completed',
-                'created_at': '2023-12-10T09:15:00Z',
-                'owner': request.user.email
-            },
-        ]
+        mock_projects = mock_project_list(request.user.email)
         
         # Логируем доступ
         log_action(
@@ -100,28 +235,8 @@ class ProjectDetailView(APIView):
     permission_classes = [CanViewProjects]
     
     def get(self, request, project_id):
-        # Моковые данные для демонстрации
-        mock_projects = {
-            '550e8400-e29b-41d4-a716-446655440000': {
-                'id': '550e8400-e29b-41d4-a716-446655440000',
-                'name': 'Проект Альфа',
-                'description': 'Разработка новой системы управления',
-                'status': 'active',
-                'owner': request.user.email,
-                'created_at': '2024-01-15T10:00:00Z',
-                'team_members': [
-                    {'name': 'Иван Иванов', 'role': 'Team Lead'},
-                    {'name': 'Петр Петров', 'role': 'Backend Developer'},
-                    {'name': 'Сидор Сидоров', 'role': 'Frontend Developer'},
-                ],
-                'tasks_completed': 42,
-                'tasks_total': 100,
-                'budget': '1,200,000 руб.',
-                'deadline': '2024-06-30'
-            }
-        }
-        
-        if project_id in mock_projects:
+        project = mock_project_details(project_id, request.user.email)
+        if project is not None:
             # Логируем доступ к моковому проекту
             log_action(
                 user=request.user,
@@ -133,7 +248,7 @@ class ProjectDetailView(APIView):
             
             return Response({
                 'message': 'Детали проекта (моковые данные)',
-                'project': mock_projects[project_id],
+                'project': project,
                 'note': 'Это демонстрационные данные'
             })
         
@@ -148,33 +263,7 @@ class DocumentListView(APIView):
     permission_classes = [CanViewDocuments]
     
     def get(self, request):
-        # Моковые документы
-        mock_documents = [
-            {
-                'id': str(uuid.uuid4()),
-                'name': 'Техническое задание.pdf',
-                'type': 'pdf',
-                'size': '2.4 MB',
-                'uploaded_at': '2024-01-20T11:30:00Z',
-                'owner': request.user.email
-            },
-            {
-                'id': str(uuid.uuid4()),
-                'name': 'Презентация проекта.pptx',
-                'type': 'pptx',
-                'size': '5.1 MB',
-                'uploaded_at': '2024-01-18T15:45:00Z',
-                'owner': request.user.email
-            },
-            {
-                'id': str(uuid.uuid4()),
-                'name': 'Бюджет проекта.xlsx',
-                'type': 'xlsx',
-                'size': '1.2 MB',
-                'uploaded_at': '2024-01-17T09:20:00Z',
-                'owner': request.user.email
-            },
-        ]
+        mock_documents = mock_document_list(request.user.email)
         
         # Логируем доступ
         log_action(
@@ -196,18 +285,8 @@ class DocumentDownloadView(APIView):
     permission_classes = [CanViewDocuments]
     
     def get(self, request, document_id):
-        # Моковые данные для демонстрации
-        mock_documents = {
-            '550e8400-e29b-41d4-a716-446655440001': {
-                'id': '550e8400-e29b-41d4-a716-446655440001',
-                'name': 'Техническое задание.pdf',
-                'content': 'Моковое содержимое PDF файла',
-                'mime_type': 'application/pdf',
-                'size': 2516582  # 2.4 MB в байтах
-            }
-        }
-        
-        if document_id in mock_documents:
+        document = mock_document(document_id)
+        if document is not None:
             # Логируем скачивание
             log_action(
                 user=request.user,
@@ -215,14 +294,14 @@ class DocumentDownloadView(APIView):
                 resource_type='document',
                 resource_id=document_id,
                 details={
-                    'file_name': mock_documents[document_id]['name'],
-                    'file_size': mock_documents[document_id]['size']
+                    'file_name': document['name'],
+                    'file_size': document['size']
                 }
             )
             
             return Response({
                 'message': 'Документ готов к скачиванию',
-                'document': mock_documents[document_id],
+                'document': document,
                 'download_url': f'/api/documents/{document_id}/download/file/',
                 'note': 'Это демонстрационные данные. В реальном приложении здесь был бы файл.'
             })
@@ -239,24 +318,7 @@ class DashboardView(APIView):
     
     def get(self, request):
         # Проверяем разные уровни доступа
-        from core.models import UserRole
-        
-        user_roles = UserRole.objects.filter(user=request.user)
-        role_names = [ur.role.name for ur in user_roles]
-        
-        # Простая проверка прав на основе ролей
-        has_project_view = False
-        has_document_view = False
-        has_user_manage = False
-        
-        for user_role in user_roles:
-            role_code = user_role.role.code
-            if role_code in ['admin', 'manager', 'user', 'viewer']:
-                has_project_view = True
-            if role_code in ['admin', 'manager', 'user']:
-                has_document_view = True
-            if role_code == 'admin':
-                has_user_manage = True
+        roles = dashboard_roles(request.user)
         
         # Логируем доступ к панели
         log_action(
@@ -265,42 +327,7 @@ class DashboardView(APIView):
             resource_type='dashboard'
         )
         
-        return Response({
-            'message': 'Панель управления',
-            'user': {
-                'email': request.user.email,
-                'full_name': request.user.get_full_name(),
-                'roles': role_names
-            },
-            'permissions': {
-                'view_projects': has_project_view,
-                'view_documents': has_document_view,
-                'manage_users': has_user_manage,
-            },
-            'stats': {
-                'total_projects': 15,
-                'active_projects': 8,
-                'total_documents': 127,
-                'storage_used': '2.3 GB'
-            },
-            'recent_activity': [
-                {
-                    'action': 'Создан проект',
-                    'project': 'Проект Альфа',
-                    'time': '2 часа назад'
-                },
-                {
-                    'action': 'Загружен документ',
-                    'document': 'Техническое задание.pdf',
-                    'time': 'Вчера, 14:30'
-                },
-                {
-                    'action': 'Обновлен профиль',
-                    'details': 'Изменена контактная информация',
-                    'time': '3 дня назад'
-                }
-            ]
-        })
+        return Response(mock_dashboard(request.user, roles))
 
 
 class CreateProjectView(APIView):
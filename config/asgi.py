@@ -0,0 +1,18 @@
+"""
+ASGI config for auth_system project.
+
+It exposes the ASGI callable as a module-level variable named ``application``.
+Под ASGI по умолчанию включаются async-версии горячих представлений
+(ASYNC_VIEWS, см. core/async_views.py).
+
+For more information on this file, see
+https://docs.djangoproject.com/en/5.0/howto/deployment/asgi/
+"""
+
+import os
+from django.core.asgi import get_asgi_application
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+os.environ.setdefault('ASYNC_VIEWS', 'True')
+
+application = get_asgi_application()
\ No newline at end of file
@@ -70,6 +70,11 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'config.wsgi.application'
+ASGI_APPLICATION = 'config.asgi.application'
+
+# Асинхронные версии входа, обновления токенов, профиля и читающих
+# эндпоинтов business_app (core/async_views.py); включается в config/asgi.py
+ASYNC_VIEWS = os.getenv('ASYNC_VIEWS', 'False') == 'True'
 
 # Database
 DATABASES = {
@@ -83,6 +88,14 @@ DATABASES = {
     }
 }
 
+# Cache
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', ''),
+    }
+}
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -118,7 +131,7 @@ AUTH_USER_MODEL = 'core.User'
 # REST Framework settings
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'core.authentication.CachedJWTAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticated',
@@ -134,7 +147,8 @@ SIMPLE_JWT = {
     'REFRESH_TOKEN_LIFETIME': timedelta(days=7),
     'ROTATE_REFRESH_TOKENS': True,
     'BLACKLIST_AFTER_ROTATION': True,
-    'UPDATE_LAST_LOGIN': True,
+    # last_login обновляет LoginView с отложенной записью (core/last_login.py)
+    'UPDATE_LAST_LOGIN': False,
     'AUTH_HEADER_TYPES': ('Bearer',),
     
     # Для blacklist
@@ -146,7 +160,8 @@ SIMPLE_JWT = {
     'JWK_URL': None,
     'LEEWAY': 0,
     
-    'AUTH_TOKEN_CLASSES': ('rest_framework_simplejwt.tokens.AccessToken',),
+    'AUTH_TOKEN_CLASSES': ('core.tokens.AuthzAccessToken',),
+    'TOKEN_REFRESH_SERIALIZER': 'core.serializers.TokenRefreshSerializer',
     'TOKEN_TYPE_CLAIM': 'token_type',
     'TOKEN_USER_CLASS': 'rest_framework_simplejwt.models.TokenUser',
     
@@ -156,6 +171,76 @@ SIMPLE_JWT = {
     'SLIDING_TOKEN_REFRESH_LIFETIME': timedelta(days=1),
 }
 
+# Хэширование паролей в ограниченном пуле потоков (core/hashing.py):
+# число потоков и предел задач в пуле, сверх которого вход и регистрация
+# получают 503 с Retry-After
+PASSWORD_HASHING_WORKERS = int(os.getenv('PASSWORD_HASHING_WORKERS', str(os.cpu_count() or 2)))
+PASSWORD_HASHING_MAX_QUEUE = int(os.getenv('PASSWORD_HASHING_MAX_QUEUE', '32'))
+PASSWORD_HASHING_RETRY_AFTER = int(os.getenv('PASSWORD_HASHING_RETRY_AFTER', '1'))
+
+# Обратные прокси (адреса и сети через запятую), которым доверяется
+# заголовок X-Forwarded-For. Пусто - IP клиента берется только из REMOTE_ADDR
+TRUSTED_PROXIES = [value for value in os.getenv('TRUSTED_PROXIES', '').split(',') if value.strip()]
+
+# Лимиты попыток входа (core/throttling.py): на email и на IP-адрес.
+# Хранилище: memory - в памяти процесса, cache - общий кэш Django
+LOGIN_THROTTLE_RATES = {
+    'email': os.getenv('LOGIN_THROTTLE_EMAIL_RATE', '5/min'),
+    'ip': os.getenv('LOGIN_THROTTLE_IP_RATE', '30/min'),
+}
+LOGIN_THROTTLE_BACKEND = os.getenv('LOGIN_THROTTLE_BACKEND', 'memory')
+LOGIN_THROTTLE_MAX_KEYS = int(os.getenv('LOGIN_THROTTLE_MAX_KEYS', '100000'))
+
+# Отложенная запись последнего входа (core/last_login.py): не обновлять чаще
+# раза в LAST_LOGIN_UPDATE_INTERVAL минут, записывать пачками по
+# LAST_LOGIN_FLUSH_SIZE или фоновым таймером через LAST_LOGIN_FLUSH_INTERVAL секунд
+LAST_LOGIN_UPDATE_INTERVAL = int(os.getenv('LAST_LOGIN_UPDATE_INTERVAL', '15'))
+LAST_LOGIN_FLUSH_SIZE = int(os.getenv('LAST_LOGIN_FLUSH_SIZE', '500'))
+LAST_LOGIN_FLUSH_INTERVAL = int(os.getenv('LAST_LOGIN_FLUSH_INTERVAL', '10'))
+
+# Асимметричная подпись JWT (core/jwks.py): каталог PEM-ключей <kid>.pem
+# (RSA - RS256, Ed25519 - EdDSA) и <kid>.pub.pem (ключи, выведенные из ротации).
+# Пусто - HS256 с SECRET_KEY. Открытые ключи публикуются в /.well-known/jwks.json
+JWT_KEYS_DIR = os.getenv('JWT_KEYS_DIR', '')
+JWT_ACTIVE_KID = os.getenv('JWT_ACTIVE_KID', '')
+JWKS_CACHE_MAX_AGE = int(os.getenv('JWKS_CACHE_MAX_AGE', '300'))
+
+# Кэш снимков прав пользователей (core/snapshot.py)
+# Локальный кэш процесса сбрасывается сигналами только в своем процессе,
+# поэтому его время жизни ограничивает устаревание прав в остальных процессах.
+AUTHZ_SNAPSHOT_TTL = int(os.getenv('AUTHZ_SNAPSHOT_TTL', '300'))
+AUTHZ_SNAPSHOT_LOCAL_TTL = int(os.getenv('AUTHZ_SNAPSHOT_LOCAL_TTL', '5'))
+AUTHZ_SNAPSHOT_LOCAL_MAX_SIZE = int(os.getenv('AUTHZ_SNAPSHOT_LOCAL_MAX_SIZE', '10000'))
+
+# Черный список refresh-токенов (core/blacklist.py): число jti, на которое
+# рассчитан фильтр Блума в памяти процесса (около 1.8 МБ на миллион);
+# при превышении фильтр перестраивается из неистекших токенов
+BLACKLIST_BLOOM_CAPACITY = int(os.getenv('BLACKLIST_BLOOM_CAPACITY', '1000000'))
+
+# Кэш пользователей для аутентификации по JWT (core/authentication.py), 0 - выключен
+AUTH_USER_CACHE_TTL = int(os.getenv('AUTH_USER_CACHE_TTL', '60'))
+
+# Кэш решений авторизации (core/decisions.py), 0 - выключен
+AUTHZ_DECISION_TTL = int(os.getenv('AUTHZ_DECISION_TTL', '60'))
+
+# Утверждения авторизации в JWT (core/tokens.py): роли и разрешения
+# проверяются по токену доступа без обращения к базе данных
+AUTHZ_STATELESS = os.getenv('AUTHZ_STATELESS', 'False') == 'True'
+
+# Пакетная проверка прав POST /api/authz/check: максимум проверок в запросе
+AUTHZ_CHECK_MAX_BATCH = int(os.getenv('AUTHZ_CHECK_MAX_BATCH', '1000'))
+
+# Проверка доступа для обратных прокси (core/forward_auth.py):
+# (методы, регулярное выражение пути, разрешение или None - только аутентификация).
+# Используется первый подходящий маршрут, без маршрута - 403.
+AUTHZ_FORWARD_ROUTES = [
+    ('POST', r'^/api/projects/create/$', 'create_project'),
+    ('GET,HEAD', r'^/api/projects/', 'view_project'),
+    ('GET,HEAD', r'^/api/documents/', 'view_document'),
+    ('*', r'^/', None),
+]
+AUTHZ_FORWARD_CACHE_TTL = int(os.getenv('AUTHZ_FORWARD_CACHE_TTL', '5'))
+
 # CORS settings
 CORS_ALLOW_ALL_ORIGINS = DEBUG
 CORS_ALLOW_CREDENTIALS = True
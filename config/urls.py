@@ -1,13 +1,29 @@
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, re_path, include
 from rest_framework_simplejwt.views import TokenRefreshView
 
+from core.views import AuthzCheckView, AuthzExplainView
+from core.forward_auth import forward_auth
+from core.jwks import jwks
+
 urlpatterns = [
     path('admin/', admin.site.urls),
     
     # Authentication endpoints
     path('api/auth/', include('core.urls')),
     
+    # Пакетная проверка прав для внешних сервисов
+    re_path(r'^api/authz/check/?$', AuthzCheckView.as_view(), name='authz-check'),
+    
+    # Объяснение проверки прав с замерами (только для администраторов)
+    re_path(r'^api/authz/explain/?$', AuthzExplainView.as_view(), name='authz-explain'),
+    
+    # Проверка доступа для обратных прокси (nginx auth_request, Traefik ForwardAuth)
+    re_path(r'^api/authz/forward/?$', forward_auth, name='authz-forward'),
+    
+    # Открытые ключи для локальной проверки токенов другими сервисами
+    path('.well-known/jwks.json', jwks, name='jwks'),
+    
     # Business app endpoints
     path('api/', include('business_app.urls')),
 ]
\ No newline at end of file
@@ -48,7 +48,7 @@ class UserAdmin(admin.ModelAdmin):
     
     fieldsets = (
         (None, {'fields': ('email', 'password')}),
-        ('Персональная информация', {'fields': ('first_name', 'last_name', 'patronymic')}),
+        ('Персональная информация', {'fields': ('first_name', 'last_name', 'patronymic', 'department')}),
         ('Права доступа', {
             'fields': ('is_active', 'is_staff', 'is_superuser', 'groups', 'user_permissions'),
         }),
@@ -0,0 +1,134 @@
+"""
+Асинхронные версии горячих представлений для развертывания через ASGI
+(config/asgi.py, ASYNC_VIEWS=True).
+
+DRF 3.14 не поддерживает async-представления, поэтому это обычные
+async-функции Django с аутентификацией CachedJWTAuthentication и ответами
+об ошибках в формате DRF. Обращения к базе данных идут через async ORM,
+хэширование пароля - в пул core/hashing.py без блокировки потока.
+Операции без async-аналога (выпуск и ротация токенов, сериализаторы со
+связанными объектами) выполняются через sync_to_async.
+"""
+
+import functools
+import json
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import AnonymousUser
+from django.http import JsonResponse
+from django.utils.translation import gettext as _
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework import status
+from rest_framework.exceptions import (
+    APIException, NotAuthenticated, ParseError, Throttled, ValidationError
+)
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+
+from .authentication import CachedJWTAuthentication
+from .hashing import acheck_user_password
+from .models import User
+from .serializers import LoginSerializer, TokenRefreshSerializer, UserSerializer
+from .throttling import LoginRateThrottle
+from .views import UserProfileView, complete_login
+
+
+_authentication = CachedJWTAuthentication()
+
+
+def _error_response(exc):
+    detail = exc.detail
+    data = detail if isinstance(detail, (dict, list)) else {'detail': detail}
+    response = JsonResponse(data, status=exc.status_code, safe=False)
+    if exc.status_code == status.HTTP_401_UNAUTHORIZED:
+        response['WWW-Authenticate'] = _authentication.authenticate_header(None)
+    if getattr(exc, 'wait', None):
+        response['Retry-After'] = '%d' % exc.wait
+    return response
+
+
+def async_api(authenticated=True, methods=('GET',)):
+    """
+    Декоратор async-представления: JWT-аутентификация (request.user,
+    request.auth), разрешенные методы и ошибки APIException в формате DRF.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            if request.method not in methods:
+                return JsonResponse(
+                    {'detail': _('Method "%s" not allowed.') % request.method},
+                    status=status.HTTP_405_METHOD_NOT_ALLOWED
+                )
+            try:
+                result = await _authentication.aauthenticate(request)
+                request.user, request.auth = result if result else (AnonymousUser(), None)
+                if authenticated and not request.user.is_authenticated:
+                    raise NotAuthenticated()
+                return await view(request, *args, **kwargs)
+            except APIException as exc:
+                return _error_response(exc)
+        return csrf_exempt(wrapper)
+    return decorator
+
+
+def _json_body(request):
+    try:
+        data = json.loads(request.body or b'{}')
+    except ValueError:
+        raise ParseError()
+    if not isinstance(data, dict):
+        raise ParseError()
+    return data
+
+
+@async_api(authenticated=False, methods=('POST',))
+async def login(request):
+    """Вход в систему (LoginView)"""
+    request.data = _json_body(request)
+
+    # Лимит попыток проверяется до хэширования пароля
+    throttle = LoginRateThrottle()
+    if not await sync_to_async(throttle.allow_request)(request, None):
+        raise Throttled(throttle.wait())
+
+    # Проверка полей LoginSerializer (формат email, обязательность); пароль
+    # проверяется ниже в пуле хэширования без блокировки цикла событий
+    data = LoginSerializer().to_internal_value(request.data)
+    email, password = data['email'], data['password']
+
+    user = await User.objects.by_email(email).afirst()
+    if user is None or not await acheck_user_password(user, password):
+        raise ValidationError({'non_field_errors': ['Неверный email или пароль']})
+    if not user.is_active:
+        raise ValidationError({'non_field_errors': ['Аккаунт деактивирован']})
+
+    return JsonResponse(await sync_to_async(complete_login)(user, request))
+
+
+def _refresh_tokens(data):
+    serializer = TokenRefreshSerializer(data=data)
+    try:
+        serializer.is_valid(raise_exception=True)
+    except TokenError as e:
+        raise InvalidToken(e.args[0])
+    return serializer.validated_data
+
+
+@async_api(authenticated=False, methods=('POST',))
+async def refresh(request):
+    """Обновление токенов (TokenRefreshView)"""
+    return JsonResponse(await sync_to_async(_refresh_tokens)(_json_body(request)))
+
+
+_profile_view = UserProfileView.as_view()
+
+
+@async_api(methods=('GET', 'PUT', 'PATCH', 'DELETE'))
+async def profile(request):
+    """Профиль пользователя: чтение асинхронно, изменения - UserProfileView"""
+    if request.method != 'GET':
+        response = await sync_to_async(_profile_view)(request)
+        return await sync_to_async(response.render)()
+
+    data = await sync_to_async(lambda: UserSerializer(request.user).data)()
+    return JsonResponse(data)
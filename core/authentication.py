@@ -0,0 +1,153 @@
+"""
+Аутентификация по JWT с кэшированием пользователя.
+
+Стандартный JWTAuthentication читает строку пользователя из базы данных
+на каждый запрос. CachedJWTAuthentication берет поля пользователя из общего
+кэша Django (время жизни AUTH_USER_CACHE_TTL) и обращается к базе только
+при промахе. Запись сбрасывается сигналами при сохранении и удалении
+пользователя (см. core/signals.py), поэтому деактивация (soft_delete_user)
+действует сразу.
+
+Токены несут версию токенов пользователя (утверждение tver, User.token_version).
+Токен с устаревшей версией отклоняется, поэтому выход на всех устройствах
+и деактивация - это одно увеличение счетчика (revoke_user_tokens), а не
+занесение в черный список каждого выпущенного токена.
+
+В кэш не попадают хэш пароля и эпоха прав: эти поля загружаются
+отложенно, а сохранение такого пользователя их не перезаписывает.
+"""
+
+import zlib
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import models, transaction
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+
+from .models import User
+
+
+USER_CACHE_PREFIX = 'auth:user:'
+TOKEN_VERSION_CLAIM = 'tver'
+UNCACHED_FIELDS = ('password', 'permission_epoch')
+
+CACHED_FIELDS = tuple(
+    field.attname for field in User._meta.concrete_fields
+    if field.attname not in UNCACHED_FIELDS
+)
+
+# Версия набора полей: после изменения модели старые записи не читаются
+_FIELDS_VERSION = zlib.crc32(','.join(CACHED_FIELDS).encode())
+
+
+def _user_cache_key(user_id):
+    return f'{USER_CACHE_PREFIX}{_FIELDS_VERSION}:{user_id}'
+
+
+def get_cached_user(user_id):
+    """Пользователь из кэша или базы данных (None - не найден)"""
+    key = _user_cache_key(user_id)
+    values = cache.get(key)
+    if values is None:
+        values = User.objects.filter(pk=user_id).values_list(*CACHED_FIELDS).first()
+        if values is None:
+            return None
+        cache.set(key, values, settings.AUTH_USER_CACHE_TTL)
+    return User.from_db('default', CACHED_FIELDS, values)
+
+
+async def aget_cached_user(user_id):
+    """get_cached_user для async-представлений"""
+    key = _user_cache_key(user_id)
+    values = await cache.aget(key)
+    if values is None:
+        values = await User.objects.filter(pk=user_id).values_list(*CACHED_FIELDS).afirst()
+        if values is None:
+            return None
+        await cache.aset(key, values, settings.AUTH_USER_CACHE_TTL)
+    return User.from_db('default', CACHED_FIELDS, values)
+
+
+def invalidate_cached_users(user_ids):
+    """Сбрасывает закэшированных пользователей (и после коммита транзакции)"""
+    keys = [_user_cache_key(user_id) for user_id in user_ids]
+    if not keys:
+        return
+    cache.delete_many(keys)
+    transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def revoke_user_tokens(user_ids):
+    """Отзывает все выпущенные токены пользователей (выход на всех устройствах)"""
+    user_ids = set(user_ids)
+    if not user_ids:
+        return
+    User.objects.filter(pk__in=user_ids).update(
+        token_version=models.F('token_version') + 1
+    )
+    invalidate_cached_users(user_ids)
+
+
+def token_version_matches(token, user):
+    """Выпущен ли токен для текущей версии токенов пользователя"""
+    return token.get(TOKEN_VERSION_CLAIM, 0) == user.token_version
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """JWTAuthentication, читающий пользователя через кэш"""
+
+    def get_user(self, validated_token):
+        # Проверка отзыва по смене пароля требует хэша пароля из базы
+        if not settings.AUTH_USER_CACHE_TTL or api_settings.CHECK_REVOKE_TOKEN:
+            user = super().get_user(validated_token)
+        else:
+            user = self._check_user(get_cached_user(self._user_id(validated_token)))
+
+        return self._check_token_version(validated_token, user)
+
+    async def aauthenticate(self, request):
+        """authenticate() для async-представлений: (пользователь, токен) или None"""
+        header = self.get_header(request)
+        if header is None:
+            return None
+
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+
+        validated_token = self.get_validated_token(raw_token)
+        return await self.aget_user(validated_token), validated_token
+
+    async def aget_user(self, validated_token):
+        """get_user для async-представлений: те же источник пользователя и проверки"""
+        if not settings.AUTH_USER_CACHE_TTL or api_settings.CHECK_REVOKE_TOKEN:
+            user = await sync_to_async(super().get_user)(validated_token)
+        else:
+            user = self._check_user(await aget_cached_user(self._user_id(validated_token)))
+
+        return self._check_token_version(validated_token, user)
+
+    def _user_id(self, validated_token):
+        try:
+            return validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_('Token contained no recognizable user identification'))
+
+    def _check_user(self, user):
+        if user is None:
+            raise AuthenticationFailed(_('User not found'), code='user_not_found')
+
+        if not user.is_active:
+            raise AuthenticationFailed(_('User is inactive'), code='user_inactive')
+
+        return user
+
+    def _check_token_version(self, validated_token, user):
+        if not token_version_matches(validated_token, user):
+            raise AuthenticationFailed(_('Token has been revoked'), code='token_revoked')
+
+        return user
@@ -0,0 +1,76 @@
+"""
+Битовое кодирование наборов разрешений.
+
+Каждому разрешению назначается постоянный номер бита (Permission.bit),
+набор разрешений кодируется целым числом, проверка - побитовое И.
+Для JWT и кэшей маска сериализуется в base64url (encode_mask/decode_mask).
+"""
+
+import base64
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+
+PERMISSION_BITS_CACHE_KEY = 'authz:permission_bits'
+
+_local_bits = {}
+
+
+def get_permission_bits():
+    """
+    Соответствие {codename: bit}, кэшируется в процессе и в общем кэше.
+    Номера битов не меняются, поэтому локальная копия может лишь
+    не знать о недавно добавленных разрешениях (до AUTHZ_SNAPSHOT_LOCAL_TTL).
+    """
+    entry = _local_bits.get('bits')
+    if entry is not None and entry[0] > time.monotonic():
+        return entry[1]
+
+    bits = cache.get(PERMISSION_BITS_CACHE_KEY)
+    if bits is None:
+        from .models import Permission
+
+        bits = dict(
+            Permission.objects.filter(bit__isnull=False).values_list('codename', 'bit')
+        )
+        cache.set(PERMISSION_BITS_CACHE_KEY, bits, None)
+    _local_bits['bits'] = (time.monotonic() + settings.AUTHZ_SNAPSHOT_LOCAL_TTL, bits)
+    return bits
+
+
+def invalidate_permission_bits():
+    _local_bits.clear()
+    cache.delete(PERMISSION_BITS_CACHE_KEY)
+
+
+def mask_from_bits(bits):
+    mask = 0
+    for bit in bits:
+        if bit is not None:
+            mask |= 1 << bit
+    return mask
+
+
+def mask_from_codenames(codenames):
+    permission_bits = get_permission_bits()
+    return mask_from_bits(permission_bits.get(codename) for codename in codenames)
+
+
+def mask_has(mask, codename):
+    """Проверяет, входит ли разрешение в маску"""
+    bit = get_permission_bits().get(codename)
+    return bit is not None and bool(mask >> bit & 1)
+
+
+def encode_mask(mask):
+    """Маска -> компактная строка base64url без выравнивания"""
+    raw = mask.to_bytes((mask.bit_length() + 7) // 8 or 1, 'little')
+    return base64.urlsafe_b64encode(raw).rstrip(b'=').decode('ascii')
+
+
+def decode_mask(value):
+    """Строка base64url -> маска"""
+    raw = base64.urlsafe_b64decode(value + '=' * (-len(value) % 4))
+    return int.from_bytes(raw, 'little')
@@ -0,0 +1,206 @@
+"""
+Быстрая проверка черного списка refresh-токенов.
+
+simplejwt проверяет каждый refresh-токен запросом к BlacklistedToken.
+Здесь jti неистекших токенов из черного списка хранятся в фильтре Блума
+в памяти процесса: его размер задается BLACKLIST_BLOOM_CAPACITY и не растет
+с числом токенов. Отрицательный ответ не требует обращения к базе данных,
+положительный подтверждается тем же запросом, что и в simplejwt.
+
+Черный список пополняется из любого процесса, поэтому каждое занесение
+(сигнал post_save BlacklistedToken) после коммита увеличивает счетчик
+поколений в общем кэше Django. Процесс, увидевший новое поколение, догружает
+строки с id больше последнего прочитанного и пропуски в id, которые могут
+принадлежать еще не закоммиченным транзакциям (в течение COMMIT_LOOKBACK).
+Свое занесение процесс сразу добавляет в фильтр и не перечитывает.
+"""
+
+import hashlib
+import math
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+
+from .utils import delete_in_batches
+
+
+GENERATION_KEY = 'auth:blacklist:generation'
+
+# Запас на транзакции, закоммиченные позже вставки строки черного списка
+COMMIT_LOOKBACK = timedelta(minutes=1)
+
+# Доля ложноположительных ответов фильтра при BLACKLIST_BLOOM_CAPACITY записях
+BLOOM_ERROR_RATE = 0.001
+
+
+class _BloomFilter:
+    """Фильтр Блума: ложноположительные ответы возможны, ложноотрицательные - нет"""
+
+    def __init__(self, capacity, error_rate=BLOOM_ERROR_RATE):
+        self.capacity = max(1, capacity)
+        self.size = max(64, int(-self.capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / self.capacity * math.log(2)))
+        self.count = 0
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, value):
+        # Двойное хэширование: k позиций из двух 64-битных хэшей
+        digest = hashlib.blake2b(value.encode(), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], 'little')
+        second = int.from_bytes(digest[8:], 'little') | 1
+        return [(first + i * second) % self.size for i in range(self.hashes)]
+
+    def add(self, value):
+        for position in self._positions(value):
+            self._bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, value):
+        bits = self._bits
+        return all(bits[position >> 3] & (1 << (position & 7)) for position in self._positions(value))
+
+
+class _BlacklistIndex:
+    """Фильтр Блума черного списка с догрузкой по поколению и курсору id"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._filter = None
+        self._rebuild_at = 0
+        self._cursor = 0
+        # Пропущенные id ниже курсора: {id: время обнаружения}
+        self._gaps = {}
+        self._generation = None
+
+    def _load(self, bloom, queryset):
+        """Добавляет jti строк в фильтр и сдвигает курсор, запоминая пропуски"""
+        cursor = self._cursor
+        seen = set()
+        for row_id, jti in queryset.values_list('id', 'token__jti').iterator(chunk_size=10000):
+            bloom.add(jti)
+            seen.add(row_id)
+
+        top = max(seen, default=cursor)
+        noticed = time.monotonic()
+        expired = noticed - COMMIT_LOOKBACK.total_seconds()
+        gaps = {
+            row_id: since for row_id, since in self._gaps.items()
+            if row_id not in seen and since > expired
+        }
+        for row_id in range(cursor + 1, top + 1):
+            if row_id not in seen:
+                gaps[row_id] = noticed
+        self._gaps = gaps
+        self._cursor = max(cursor, top)
+
+    def _rebuild(self):
+        """Новый фильтр из неистекших токенов (истекшие при этом выпадают)"""
+        now = timezone.now()
+        # Строки старше COMMIT_LOOKBACK закоммичены: курсор начинается с последней
+        # из них, более новые id без строк считаются пропусками
+        floor = 0
+        rows = BlacklistedToken.objects.order_by('-id').values_list('id', 'blacklisted_at')
+        for row_id, blacklisted_at in rows.iterator(chunk_size=1000):
+            if blacklisted_at < now - COMMIT_LOOKBACK:
+                floor = row_id
+                break
+
+        # Фильтр заполняется до публикации: проверки без блокировки
+        # не должны увидеть его пустым
+        bloom = _BloomFilter(settings.BLACKLIST_BLOOM_CAPACITY)
+        self._cursor = floor
+        self._gaps = {}
+        self._load(bloom, BlacklistedToken.objects.filter(token__expires_at__gt=now))
+        self._filter = bloom
+        # Неистекших токенов больше расчетного: следующая перестройка - после
+        # удвоения, а не на каждой догрузке (растет доля ложноположительных ответов)
+        self._rebuild_at = max(bloom.capacity, 2 * bloom.count)
+
+    def _refresh(self, generation):
+        if self._filter is None or self._filter.count > self._rebuild_at:
+            self._rebuild()
+        else:
+            self._load(self._filter, BlacklistedToken.objects.filter(
+                Q(id__gt=self._cursor) | Q(id__in=list(self._gaps))
+            ))
+        self._generation = generation
+
+    def contains(self, jti):
+        generation = cache.get(GENERATION_KEY)
+        if generation is None:
+            cache.add(GENERATION_KEY, int(time.time() * 1000), None)
+            generation = cache.get(GENERATION_KEY)
+
+        if generation != self._generation:
+            with self._lock:
+                if generation != self._generation:
+                    self._refresh(generation)
+
+        if jti not in self._filter:
+            return False
+        return BlacklistedToken.objects.filter(token__jti=jti).exists()
+
+    def add(self, jti):
+        with self._lock:
+            if self._filter is not None:
+                self._filter.add(jti)
+
+    def advance(self, generation):
+        """Поколение, созданное своим занесением: перечитывать нечего"""
+        with self._lock:
+            if self._generation is not None and generation == self._generation + 1:
+                self._generation = generation
+
+
+_index = _BlacklistIndex()
+
+
+def is_blacklisted(jti):
+    """Находится ли токен с указанным jti в черном списке"""
+    return _index.contains(jti)
+
+
+def bump_blacklist_generation():
+    """Увеличивает поколение; None - счетчик вытеснен из кэша и создан заново"""
+    try:
+        return cache.incr(GENERATION_KEY)
+    except ValueError:
+        cache.add(GENERATION_KEY, int(time.time() * 1000), None)
+        return None
+
+
+def token_blacklisted(blacklisted_token):
+    """Учитывает новый токен черного списка в этом и остальных процессах"""
+    _index.add(blacklisted_token.token.jti)
+
+    def committed():
+        generation = bump_blacklist_generation()
+        if generation is not None:
+            _index.advance(generation)
+
+    transaction.on_commit(committed)
+
+
+def prune_expired_tokens(batch_size=1000, now=None, dry_run=False):
+    """
+    Удаляет истекшие выпущенные токены (OutstandingToken) и их записи
+    в черном списке (каскадом) пачками. Возвращает количество удаленных
+    выпущенных токенов (при dry_run - число истекших токенов в первой пачке).
+    Из фильтров процессов истекшие jti выпадают при следующей перестройке.
+    """
+    expired = OutstandingToken.objects.filter(
+        expires_at__lte=now or timezone.now()
+    ).order_by('expires_at').values_list('id', flat=True)
+    return delete_in_batches(
+        expired,
+        lambda ids: OutstandingToken.objects.filter(id__in=ids).delete(),
+        batch_size=batch_size,
+        dry_run=dry_run,
+    )
@@ -0,0 +1,213 @@
+"""
+Компилятор условий доступа (RolePermission.conditions, ResourceAccess.conditions).
+
+Язык условий - JSON-объект, все ключи объединяются по И:
+
+    {
+        "time_restriction": {"start": "09:00", "end": "18:00", "weekdays": [0, 1, 2, 3, 4]},
+        "department": "sales" | ["sales", "it"],
+        "attributes": {"is_staff": false, "last_name": ["Иванов", "Петров"]},
+        "ip_ranges": ["10.0.0.0/8", "192.168.1.15"]
+    }
+
+Документ условий компилируется один раз в предикат и кэшируется по хэшу
+содержимого (conditions_key). Неизвестные ключи и ошибки формата
+компилируются в запрещающий предикат.
+"""
+
+import bisect
+import datetime
+import hashlib
+import ipaddress
+import json
+import logging
+
+from django.utils import timezone
+
+from .utils import client_ip_address
+
+
+logger = logging.getLogger(__name__)
+
+COMPILED_CACHE_MAX_SIZE = 10000
+
+_compiled = {}
+
+
+class ConditionContext:
+    """
+    Контекст проверки условий: пользователь, время и IP запроса (вычисляются
+    лениво, один раз на запрос)
+    """
+    __slots__ = ('user', 'request', '_now', '_ip')
+
+    def __init__(self, user, request=None, now=None):
+        self.user = user
+        self.request = request
+        self._now = now
+        self._ip = False
+
+    @property
+    def now(self):
+        if self._now is None:
+            # Одно время на запрос: все проверки запроса видят один момент
+            self._now = getattr(self.request, '_condition_now', None)
+            if self._now is None:
+                # Часовой пояс проекта (TIME_ZONE); get_current_timezone заметно дороже
+                self._now = datetime.datetime.now(timezone.get_default_timezone())
+                if self.request is not None:
+                    self.request._condition_now = self._now
+        return self._now
+
+    @property
+    def ip(self):
+        if self._ip is False:
+            self._ip = None
+            if self.request is not None:
+                # Разбирается один раз на запрос, X-Forwarded-For - только от
+                # доверенных прокси (TRUSTED_PROXIES)
+                self._ip = client_ip_address(self.request)
+        return self._ip
+
+
+def conditions_key(conditions):
+    """Хэш содержимого документа условий ('' - без условий)"""
+    if not conditions:
+        return ''
+    raw = json.dumps(conditions, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+
+def _allow(context):
+    return True
+
+
+def _deny(context):
+    return False
+
+
+def _parse_minutes(value):
+    hours, minutes = value.split(':')
+    return int(hours) * 60 + int(minutes)
+
+
+def _as_frozenset(value):
+    if isinstance(value, (list, tuple, set)):
+        return frozenset(value)
+    return frozenset([value])
+
+
+def _compile_time_restriction(spec):
+    start = _parse_minutes(spec.get('start', '00:00'))
+    end = _parse_minutes(spec.get('end', '23:59'))
+    weekdays = frozenset(spec['weekdays']) if 'weekdays' in spec else None
+    overnight = start > end
+
+    def check(context):
+        now = context.now
+        if weekdays is not None and now.weekday() not in weekdays:
+            return False
+        minutes = now.hour * 60 + now.minute
+        if overnight:
+            return minutes >= start or minutes <= end
+        return start <= minutes <= end
+    return check
+
+
+def _compile_department(spec):
+    departments = _as_frozenset(spec)
+
+    def check(context):
+        return getattr(context.user, 'department', '') in departments
+    return check
+
+
+def _compile_attributes(spec):
+    expected = tuple((name, _as_frozenset(value)) for name, value in spec.items())
+
+    def check(context):
+        user = context.user
+        for name, values in expected:
+            if getattr(user, name, None) not in values:
+                return False
+        return True
+    return check
+
+
+def _compile_ip_ranges(spec):
+    # Сети приводятся к отсортированным диапазонам целых чисел по версиям IP,
+    # поиск - бинарный, стоимость почти не зависит от числа сетей
+    ranges = {4: [], 6: []}
+    for value in _as_frozenset(spec):
+        network = ipaddress.ip_network(value, strict=False)
+        ranges[network.version].append(
+            (int(network.network_address), int(network.broadcast_address))
+        )
+    starts = {}
+    ends = {}
+    for version, items in ranges.items():
+        items.sort()
+        starts[version] = [start for start, end in items]
+        # Максимальный конец среди диапазонов слева (на случай вложенных сетей)
+        running_end = []
+        current = -1
+        for start, end in items:
+            current = max(current, end)
+            running_end.append(current)
+        ends[version] = running_end
+
+    def check(context):
+        ip = context.ip
+        if ip is None:
+            return False
+        version_starts = starts[ip.version]
+        value = int(ip)
+        index = bisect.bisect_right(version_starts, value) - 1
+        return index >= 0 and ends[ip.version][index] >= value
+    return check
+
+
+COMPILERS = {
+    'time_restriction': _compile_time_restriction,
+    'department': _compile_department,
+    'attributes': _compile_attributes,
+    'ip_ranges': _compile_ip_ranges,
+}
+
+
+def _compile(conditions):
+    if not conditions:
+        return _allow
+
+    try:
+        checks = tuple(COMPILERS[name](spec) for name, spec in sorted(conditions.items()))
+    except (KeyError, TypeError, ValueError, AttributeError) as exc:
+        logger.warning('Некорректные условия доступа %r: %r', conditions, exc)
+        return _deny
+
+    if len(checks) == 1:
+        return checks[0]
+
+    def predicate(context):
+        for check in checks:
+            if not check(context):
+                return False
+        return True
+    return predicate
+
+
+def compile_conditions(conditions, key=None):
+    """
+    Возвращает предикат predicate(context) для документа условий.
+    key - заранее вычисленный conditions_key, чтобы не обходить JSON повторно.
+    """
+    if key is None:
+        key = conditions_key(conditions)
+
+    predicate = _compiled.get(key)
+    if predicate is None:
+        predicate = _compile(conditions)
+        if len(_compiled) >= COMPILED_CACHE_MAX_SIZE:
+            _compiled.clear()
+        _compiled[key] = predicate
+    return predicate
@@ -0,0 +1,131 @@
+"""
+Кэш решений авторизации (разрешено и запрещено).
+
+Ключ решения: (глобальная версия, пользователь, эпоха прав пользователя,
+разрешение, цель проверки). Глобальная версия увеличивается при изменении
+ролей, разрешений и групп, эпоха пользователя (User.permission_epoch) -
+при изменении его назначений (см. core/signals.py). Сброс - это смена
+версии, старые ключи просто перестают читаться и истекают по TTL.
+
+Решения, зависящие от условий доступа (время, IP и т.д.), не кэшируются;
+время жизни решения по срочному прямому доступу не превышает срока доступа.
+"""
+
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from .snapshot import _epoch_key, _user_id, get_permission_epoch, get_permission_snapshot
+
+
+DECISION_CACHE_PREFIX = 'authz:decision:'
+GLOBAL_VERSION_KEY = 'authz:version'
+
+# Цель проверки "разрешение без ресурса" и проверка административной роли
+TARGET_PERMISSION = '-'
+ADMIN_CODENAME = ':admin'
+
+
+def get_global_version():
+    """
+    Глобальная версия прав. Начальное значение - время в миллисекундах,
+    чтобы после вытеснения ключа из кэша версии не повторялись.
+    """
+    version = cache.get(GLOBAL_VERSION_KEY)
+    if version is None:
+        cache.add(GLOBAL_VERSION_KEY, int(time.time() * 1000), None)
+        version = cache.get(GLOBAL_VERSION_KEY)
+    return version
+
+
+def bump_global_version():
+    """Сбрасывает все закэшированные решения"""
+    try:
+        cache.incr(GLOBAL_VERSION_KEY)
+    except ValueError:
+        get_global_version()
+
+
+def _versions(request, user_id):
+    """Версии для ключа, один раз на запрос и пользователя"""
+    memo = getattr(request, '_authz_versions', None) if request is not None else None
+    if memo is not None and user_id in memo:
+        return memo[user_id]
+
+    values = cache.get_many([GLOBAL_VERSION_KEY, _epoch_key(user_id)])
+    global_version = values.get(GLOBAL_VERSION_KEY)
+    if global_version is None:
+        global_version = get_global_version()
+    epoch = values.get(_epoch_key(user_id))
+    if epoch is None:
+        epoch = get_permission_epoch(user_id)
+
+    versions = (global_version, epoch)
+    if request is not None:
+        if memo is None:
+            memo = {}
+            request._authz_versions = memo
+        memo[user_id] = versions
+    return versions
+
+
+def decision_key(user_id, codename, target, versions):
+    global_version, epoch = versions
+    return f'{DECISION_CACHE_PREFIX}{global_version}:{user_id}:{epoch}:{codename}:{target}'
+
+
+def resource_target(resource):
+    """Цель проверки ресурса: изменение ресурса (владелец, тип) меняет ключ"""
+    updated_at = getattr(resource, 'updated_at', None)
+    stamp = updated_at.timestamp() if updated_at else ''
+    return f'r:{resource.pk}:{stamp}'
+
+
+def _decision_ttl(snapshot, codename):
+    """
+    Время жизни решения: None - не кэшировать (есть условия доступа),
+    иначе AUTHZ_DECISION_TTL, но не дольше ближайшего истечения прямого доступа.
+    """
+    if codename == ADMIN_CODENAME:
+        return settings.AUTHZ_DECISION_TTL
+
+    role_grants = snapshot.role_permissions.get(codename, ())
+    direct_grants = snapshot.direct_grants.get(codename, ())
+    if any(grant.conditions_key for grant in role_grants + direct_grants):
+        return None
+
+    ttl = settings.AUTHZ_DECISION_TTL
+    now = timezone.now()
+    for grant in direct_grants:
+        if grant.expires_at is not None and grant.expires_at > now:
+            ttl = min(ttl, int((grant.expires_at - now).total_seconds()))
+    return ttl or None
+
+
+def cached_decision(request, user, codename, target, compute):
+    """
+    Решение из кэша или compute() с сохранением результата.
+    target - TARGET_PERMISSION или resource_target(ресурс).
+    """
+    if not settings.AUTHZ_DECISION_TTL:
+        return compute()
+
+    user_id = _user_id(user)
+    global_version, epoch = _versions(request, user_id)
+    decision = cache.get(decision_key(user_id, codename, target, (global_version, epoch)))
+    if decision is not None:
+        return decision
+
+    # Решение сохраняется под эпохой снимка, по которому вычислено: устаревший
+    # локальный снимок процесса (до AUTHZ_SNAPSHOT_LOCAL_TTL) не попадет под
+    # новую эпоху и не разойдется по другим процессам. compute() берет тот же
+    # или более новый снимок.
+    snapshot = get_permission_snapshot(user)
+    decision = bool(compute())
+    ttl = _decision_ttl(snapshot, codename)
+    if ttl:
+        key = decision_key(user_id, codename, target, (global_version, snapshot.epoch))
+        cache.set(key, decision, ttl)
+    return decision
@@ -0,0 +1,375 @@
+"""
+Поддержка производных таблиц авторизации.
+
+UserEffectivePermission: строки выводятся из UserRole -> RolePermission
+(source='role') и из ResourceAccess (source='direct') и обновляются
+инкрементально сигналами (см. core/signals.py). Полная перестройка и
+сверка - команда manage.py rebuild_effective_permissions.
+
+UserRoleScope: нормализованная область действия UserRole.resource_scope.
+
+RoleClosure, GroupClosure: транзитивные замыкания иерархий ролей и групп.
+Роль наследует разрешения всех предков; строки UserEffectivePermission
+ссылаются на роль, которой принадлежит разрешение (role_id), и на
+назначение роли, через которое оно получено (user_role_id).
+
+Назначения группам материализуются строками группы (group_id), а не
+строками каждого участника.
+"""
+
+import json
+import uuid
+
+from django.db import transaction
+from django.db.models import Q
+
+from .snapshot import compile_scope
+
+
+def _json_key(value):
+    return json.dumps(value or {}, sort_keys=True, default=str)
+
+
+def _in_scope(resource_type_id, resource_scope):
+    """Входит ли тип ресурса в область действия роли"""
+    scope = compile_scope(resource_scope)
+    return (
+        scope is None
+        or scope.resource_types is None
+        or str(resource_type_id) in scope.resource_types
+    )
+
+
+def _principals_q(user_ids, group_ids):
+    return Q(user_id__in=user_ids) | Q(group_id__in=group_ids)
+
+
+def _desired_rows(user_ids, group_ids, sources):
+    """Строки, которые должны быть в таблице для пользователей и групп: {ключ: kwargs}"""
+    from .models import UserRole, ResourceAccess, UserEffectivePermission
+
+    rows = {}
+    principals = _principals_q(user_ids, group_ids)
+
+    if UserEffectivePermission.SOURCE_ROLE in sources:
+        role_rows = UserRole.objects.filter(
+            principals,
+            role__ancestor_links__ancestor__role_permissions__isnull=False,
+        ).values_list(
+            'id',
+            'user_id',
+            'group_id',
+            'role__ancestor_links__ancestor_id',
+            'resource_scope',
+            'role__ancestor_links__ancestor__role_permissions__permission_id',
+            'role__ancestor_links__ancestor__role_permissions__permission__codename',
+            'role__ancestor_links__ancestor__role_permissions__permission__resource_type_id',
+            'role__ancestor_links__ancestor__role_permissions__conditions',
+        )
+        for user_role_id, user_id, group_id, role_id, scope, permission_id, codename, resource_type_id, conditions in role_rows:
+            row = dict(
+                user_id=user_id,
+                group_id=group_id,
+                user_role_id=user_role_id,
+                permission_id=permission_id,
+                codename=codename,
+                resource_type_id=resource_type_id,
+                source=UserEffectivePermission.SOURCE_ROLE,
+                role_id=role_id,
+                resource_id=None,
+                resource_access_id=None,
+                scope=scope or {},
+                in_scope=_in_scope(resource_type_id, scope),
+                conditions=conditions or {},
+                expires_at=None,
+            )
+            rows[_row_key(row)] = row
+
+    if UserEffectivePermission.SOURCE_DIRECT in sources:
+        direct_rows = ResourceAccess.objects.filter(principals).values_list(
+            'id',
+            'user_id',
+            'group_id',
+            'permission_id',
+            'permission__codename',
+            'permission__resource_type_id',
+            'resource_id',
+            'conditions',
+            'expires_at',
+        )
+        for access_id, user_id, group_id, permission_id, codename, resource_type_id, resource_id, conditions, expires_at in direct_rows:
+            row = dict(
+                resource_access_id=access_id,
+                user_id=user_id,
+                group_id=group_id,
+                permission_id=permission_id,
+                codename=codename,
+                resource_type_id=resource_type_id,
+                source=UserEffectivePermission.SOURCE_DIRECT,
+                user_role_id=None,
+                role_id=None,
+                resource_id=resource_id,
+                scope={},
+                in_scope=True,
+                conditions=conditions or {},
+                expires_at=expires_at,
+            )
+            rows[_row_key(row)] = row
+
+    return rows
+
+
+_KEY_FIELDS = (
+    'user_id', 'group_id', 'permission_id', 'codename', 'resource_type_id', 'source',
+    'user_role_id', 'role_id', 'resource_id', 'resource_access_id', 'in_scope', 'expires_at',
+)
+
+
+def _row_key(row):
+    return tuple(str(row[field]) for field in _KEY_FIELDS) + (
+        _json_key(row['scope']),
+        _json_key(row['conditions']),
+    )
+
+
+def sync_effective_permissions(user_ids, sources=None, dry_run=False, group_ids=()):
+    """
+    Приводит строки пользователей и групп к актуальному состоянию по разнице
+    между ожидаемыми и существующими строками.
+    Возвращает (число добавленных, число удаленных) строк.
+    """
+    from .models import UserEffectivePermission
+
+    user_ids = list(set(user_ids))
+    group_ids = list(set(group_ids))
+    if not user_ids and not group_ids:
+        return 0, 0
+    sources = sources or (
+        UserEffectivePermission.SOURCE_ROLE,
+        UserEffectivePermission.SOURCE_DIRECT,
+    )
+
+    desired = _desired_rows(user_ids, group_ids, sources)
+
+    stale_ids = []
+    existing = UserEffectivePermission.objects.filter(
+        _principals_q(user_ids, group_ids), source__in=sources
+    ).values('id', *_KEY_FIELDS, 'scope', 'conditions')
+    for row in existing:
+        key = _row_key(row)
+        if key in desired:
+            del desired[key]
+        else:
+            stale_ids.append(row['id'])
+
+    if not dry_run:
+        with transaction.atomic():
+            if stale_ids:
+                UserEffectivePermission.objects.filter(id__in=stale_ids).delete()
+            UserEffectivePermission.objects.bulk_create(
+                [UserEffectivePermission(**row) for row in desired.values()],
+                batch_size=1000,
+            )
+
+    return len(desired), len(stale_ids)
+
+
+def add_role_permissions(role_id, permission_ids):
+    """
+    Добавляет строки держателям (пользователям и группам) роли
+    и ролей-потомков при добавлении разрешений роли
+    """
+    from .models import RolePermission, UserEffectivePermission, UserRole
+
+    role_permissions = list(RolePermission.objects.filter(
+        role_id=role_id, permission_id__in=permission_ids
+    ).values_list(
+        'permission_id', 'permission__codename',
+        'permission__resource_type_id', 'conditions',
+    ))
+    holders = list(UserRole.objects.filter(
+        role__ancestor_links__ancestor_id=role_id
+    ).values_list(
+        'id', 'user_id', 'group_id', 'resource_scope'
+    ))
+
+    UserEffectivePermission.objects.bulk_create([
+        UserEffectivePermission(
+            user_id=user_id,
+            group_id=group_id,
+            user_role_id=user_role_id,
+            permission_id=permission_id,
+            codename=codename,
+            resource_type_id=resource_type_id,
+            source=UserEffectivePermission.SOURCE_ROLE,
+            role_id=role_id,
+            scope=scope or {},
+            in_scope=_in_scope(resource_type_id, scope),
+            conditions=conditions or {},
+        )
+        for user_role_id, user_id, group_id, scope in holders
+        for permission_id, codename, resource_type_id, conditions in role_permissions
+    ], batch_size=1000)
+
+
+def remove_role_permissions(role_id, permission_ids=None):
+    """Удаляет строки держателей роли при удалении разрешений роли"""
+    from .models import UserEffectivePermission
+
+    rows = UserEffectivePermission.objects.filter(
+        source=UserEffectivePermission.SOURCE_ROLE, role_id=role_id
+    )
+    if permission_ids is not None:
+        rows = rows.filter(permission_id__in=permission_ids)
+    rows.delete()
+
+
+def subtree_ids(closure_model, node_ids):
+    """Идентификаторы узлов и всех их потомков"""
+    return set(closure_model.objects.filter(ancestor_id__in=node_ids).values_list(
+        'descendant_id', flat=True
+    ))
+
+
+def group_members(group_ids):
+    """Участники групп, включая участников вложенных групп"""
+    from .models import GroupMembership
+
+    if not group_ids:
+        return []
+    return list(GroupMembership.objects.filter(
+        group__ancestor_links__ancestor_id__in=group_ids
+    ).values_list('user_id', flat=True).distinct())
+
+
+def detach_subtree(closure_model, node_id):
+    """Удаляет связи поддерева узла с его бывшими предками"""
+    closure_model.objects.filter(
+        ancestor_id__in=closure_model.objects.filter(
+            descendant_id=node_id, depth__gt=0
+        ).values('ancestor_id'),
+        descendant_id__in=closure_model.objects.filter(
+            ancestor_id=node_id
+        ).values('descendant_id'),
+    ).delete()
+
+
+def attach_subtree(node, adding=False):
+    """
+    Обновляет замыкание после создания узла (роли, группы) или смены его
+    родителя: поддерево узла отвязывается от прежних предков и
+    привязывается ко всем предкам нового родителя. Затрагиваются только
+    связи перемещаемого поддерева.
+    """
+    closure_model = node.get_closure_model()
+
+    if adding:
+        closure_model.objects.create(ancestor=node, descendant=node, depth=0)
+    else:
+        detach_subtree(closure_model, node.pk)
+
+    if node.parent_id is None:
+        return
+
+    ancestors = list(closure_model.objects.filter(descendant_id=node.parent_id).values_list(
+        'ancestor_id', 'depth'
+    ))
+    descendants = list(closure_model.objects.filter(ancestor_id=node.pk).values_list(
+        'descendant_id', 'depth'
+    ))
+    closure_model.objects.bulk_create([
+        closure_model(
+            ancestor_id=ancestor_id,
+            descendant_id=descendant_id,
+            depth=ancestor_depth + descendant_depth + 1,
+        )
+        for ancestor_id, ancestor_depth in ancestors
+        for descendant_id, descendant_depth in descendants
+    ], batch_size=1000)
+
+
+def sync_direct_grant(access):
+    """
+    Обновляет строку прямого доступа по идентификатору доступа: смена
+    пользователя, ресурса или разрешения заменяет прежнюю строку.
+    Возвращает прежних (user_id, group_id) строки, если они изменились.
+    Удаленный доступ забирает строку каскадом (resource_access).
+    """
+    from .models import UserEffectivePermission
+
+    previous = list(UserEffectivePermission.objects.filter(
+        resource_access_id=access.pk
+    ).exclude(
+        user_id=access.user_id, group_id=access.group_id
+    ).values_list('user_id', 'group_id'))
+    UserEffectivePermission.objects.update_or_create(
+        resource_access_id=access.pk,
+        defaults={
+            'source': UserEffectivePermission.SOURCE_DIRECT,
+            'user_id': access.user_id,
+            'group_id': access.group_id,
+            'resource_id': access.resource_id,
+            'permission_id': access.permission_id,
+            'codename': access.permission.codename,
+            'resource_type_id': access.permission.resource_type_id,
+            'conditions': access.conditions or {},
+            'expires_at': access.expires_at,
+        },
+    )
+    return previous
+
+
+def _existing_ids(model, values):
+    """Существующие идентификаторы из списка строк (некорректные пропускаются)"""
+    ids = []
+    for value in values or ():
+        try:
+            ids.append(uuid.UUID(value))
+        except ValueError:
+            continue
+    if not ids:
+        return []
+    return list(model.objects.filter(pk__in=ids).values_list('pk', flat=True))
+
+
+def sync_user_role_scopes(user_role):
+    """
+    Перестраивает строки UserRoleScope по resource_scope роли пользователя.
+    Каждый заданный вид ограничения получает строку-маркер без значения:
+    ограничение без подходящих строк (неизвестные или удаленные владельцы,
+    пустой список отделов) запрещает все.
+    """
+    from .models import User, ResourceType, UserRoleScope
+
+    scope = compile_scope(user_role.resource_scope)
+    rows = []
+    if scope is not None:
+        for kind, values in (
+            (UserRoleScope.KIND_RESOURCE_TYPE, scope.resource_types),
+            (UserRoleScope.KIND_OWNER, scope.owners),
+            (UserRoleScope.KIND_DEPARTMENT, scope.departments),
+        ):
+            if values is not None:
+                rows.append(UserRoleScope(user_role=user_role, kind=kind, department=None))
+        for resource_type_id in _existing_ids(ResourceType, scope.resource_types):
+            rows.append(UserRoleScope(
+                user_role=user_role,
+                kind=UserRoleScope.KIND_RESOURCE_TYPE,
+                resource_type_id=resource_type_id,
+            ))
+        for owner_id in _existing_ids(User, scope.owners):
+            rows.append(UserRoleScope(
+                user_role=user_role,
+                kind=UserRoleScope.KIND_OWNER,
+                owner_id=owner_id,
+            ))
+        for department in scope.departments or ():
+            rows.append(UserRoleScope(
+                user_role=user_role,
+                kind=UserRoleScope.KIND_DEPARTMENT,
+                department=department,
+            ))
+
+    with transaction.atomic():
+        UserRoleScope.objects.filter(user_role=user_role).delete()
+        UserRoleScope.objects.bulk_create(rows)
@@ -0,0 +1,147 @@
+"""
+Объяснение проверки прав: какие правила проверялись, с каким результатом,
+сколько запросов к базе данных выполнило каждое правило и сколько времени
+оно заняло.
+
+Правила повторяют порядок HasPermission._check_user_permission и
+_check_resource_permission; итоговое решение получается вызовом самих
+этих методов (шаг decision), поэтому объяснение не может разойтись с
+реальной проверкой.
+"""
+
+import time
+from contextlib import contextmanager
+
+from django.db import connection
+from django.utils import timezone
+
+from .bitmask import mask_has
+from .conditions import ConditionContext
+from .models import User
+from .permissions import HasPermission
+from .snapshot import build_permission_snapshot, get_permission_snapshot
+
+
+@contextmanager
+def _measure(steps, rule, **details):
+    """Добавляет в steps шаг с запросами и временем выполнения блока"""
+    queries = []
+
+    def capture(execute, sql, params, many, context):
+        queries.append(sql)
+        return execute(sql, params, many, context)
+
+    step = {'rule': rule, **details}
+    start = time.perf_counter()
+    with connection.execute_wrapper(capture):
+        yield step
+    step['time_ms'] = round((time.perf_counter() - start) * 1000, 3)
+    step['queries'] = len(queries)
+    step['sql'] = queries
+    steps.append(step)
+
+
+def _scope_details(scope):
+    if scope is None:
+        return None
+    return {key: sorted(value) if value is not None else None for key, value in scope._asdict().items()}
+
+
+def _explain_grant_conditions(steps, checker, context, grant, **details):
+    """Шаг проверки условий доступа (только для правил с условиями)"""
+    if not grant.conditions_key:
+        return True
+    with _measure(steps, 'conditions', conditions=grant.conditions, **details) as step:
+        step['result'] = checker._check_conditions(context, grant)
+    return step['result']
+
+
+def _explain_user_permission(steps, checker, user, snapshot, permission_codename, request):
+    context = ConditionContext(user, request)
+    now = timezone.now()
+
+    with _measure(steps, 'mask') as step:
+        step['result'] = mask_has(snapshot.permission_mask, permission_codename)
+
+    for grant in snapshot.role_permissions.get(permission_codename, ()):
+        with _measure(steps, 'role', role=grant.role_code) as step:
+            step['result'] = True
+        step['result'] = _explain_grant_conditions(steps, checker, context, grant, role=grant.role_code)
+
+    for grant in snapshot.direct_grants.get(permission_codename, ()):
+        with _measure(steps, 'direct_grant', resource=str(grant.resource_id), expires_at=grant.expires_at) as step:
+            step['result'] = grant.expires_at is None or grant.expires_at > now
+        if step['result']:
+            step['result'] = _explain_grant_conditions(
+                steps, checker, context, grant, resource=str(grant.resource_id)
+            )
+
+    with _measure(steps, 'decision') as step:
+        step['result'] = checker._check_user_permission(user, permission_codename, request, snapshot)
+    return step['result']
+
+
+def _explain_resource_permission(steps, checker, user, snapshot, permission_codename, resource):
+    now = timezone.now()
+
+    with _measure(steps, 'owner', owner=str(resource.owner_id)) as step:
+        step['result'] = resource.owner_id == user.pk
+
+    for grant in snapshot.direct_grants.get(permission_codename, ()):
+        with _measure(steps, 'direct_grant', resource=str(grant.resource_id), expires_at=grant.expires_at) as step:
+            step['result'] = (
+                grant.resource_id == resource.pk
+                and (grant.expires_at is None or grant.expires_at > now)
+            )
+
+    for grant in snapshot.role_permissions.get(permission_codename, ()):
+        with _measure(steps, 'role', role=grant.role_code) as step:
+            step['result'] = grant.resource_type_id == resource.resource_type_id
+        if step['result']:
+            with _measure(steps, 'scope', role=grant.role_code, scope=_scope_details(grant.scope)) as step:
+                step['result'] = checker._check_resource_scope(resource, grant.scope)
+
+    with _measure(steps, 'decision') as step:
+        step['result'] = checker._check_resource_permission(user, resource, permission_codename)
+    return step['result']
+
+
+def explain_permission(user, permission_codename, resource=None, request=None, fresh=False):
+    """
+    Пошаговое объяснение проверки разрешения (resource=None) или доступа
+    к ресурсу. fresh - строить снимок прав из базы, минуя кэш.
+    """
+    checker = HasPermission(permission_codename)
+    steps = []
+    started = time.perf_counter()
+
+    with _measure(steps, 'superuser', is_superuser=user.is_superuser, is_staff=user.is_staff) as step:
+        step['result'] = allowed = user.is_superuser or user.is_staff
+
+    with _measure(steps, 'snapshot', source='database' if fresh else 'cache') as step:
+        snapshot = build_permission_snapshot(user) if fresh else get_permission_snapshot(user)
+        step['roles'] = sorted(snapshot.role_codes)
+        step['role_grants'] = sum(len(grants) for grants in snapshot.role_permissions.values())
+        step['direct_grants'] = sum(len(grants) for grants in snapshot.direct_grants.values())
+
+    if resource is None:
+        decision = _explain_user_permission(steps, checker, user, snapshot, permission_codename, request)
+    else:
+        decision = _explain_resource_permission(steps, checker, user, snapshot, permission_codename, resource)
+
+    return {
+        'user': str(user.pk),
+        'permission': permission_codename,
+        'resource': str(resource.pk) if resource is not None else None,
+        'allowed': allowed or decision,
+        'total_ms': round((time.perf_counter() - started) * 1000, 3),
+        'total_queries': sum(step['queries'] for step in steps),
+        'steps': steps,
+    }
+
+
+def resolve_user(value):
+    """Пользователь по идентификатору или email"""
+    if '@' in value:
+        return User.objects.by_email(value).first()
+    return User.objects.filter(pk=value).first()
@@ -0,0 +1,126 @@
+"""
+Проверка доступа для обратных прокси (nginx auth_request, Traefik ForwardAuth).
+
+Обычная Django-функция без диспетчеризации DRF. Исходный запрос передается
+прокси в заголовках X-Original-Method/X-Original-URI (nginx) или
+X-Forwarded-Method/X-Forwarded-Uri (Traefik) и сопоставляется с таблицей
+AUTHZ_FORWARD_ROUTES:
+
+    (методы, регулярное выражение пути, кодовое имя разрешения | None)
+
+Методы - '*' или список через запятую; None - достаточно аутентификации.
+Запрос без подходящего маршрута запрещается.
+
+Ответ: 200 с заголовками X-Auth-User-Id, X-Auth-User-Email, X-Auth-Roles,
+401 (нет или недействителен токен) или 403. Решения кэшируются в процессе
+на AUTHZ_FORWARD_CACHE_TTL секунд по (jti токена, маршрут).
+"""
+
+import re
+from collections import namedtuple
+
+from django.conf import settings
+from django.http import HttpResponse
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.settings import api_settings
+
+from .authentication import CachedJWTAuthentication, get_cached_user, token_version_matches
+from .permissions import HasPermission
+from .snapshot import get_permission_snapshot, _LocalSnapshotCache
+
+
+Route = namedtuple('Route', ['methods', 'pattern', 'permission'])
+
+DECISION_CACHE_MAX_SIZE = 100000
+
+_decisions = _LocalSnapshotCache()
+_routes = [None, ()]
+_authentication = CachedJWTAuthentication()
+
+
+def _compiled_routes():
+    """Таблица маршрутов, скомпилированная при первом обращении"""
+    source = settings.AUTHZ_FORWARD_ROUTES
+    if _routes[0] is not source:
+        routes = []
+        for methods, pattern, permission in source:
+            methods = None if methods == '*' else frozenset(
+                method.strip().upper() for method in methods.split(',')
+            )
+            routes.append(Route(methods, re.compile(pattern), permission))
+        _routes[:] = [source, tuple(routes)]
+    return _routes[1]
+
+
+def match_route(method, uri):
+    """Индекс и маршрут для метода и URI исходного запроса (None, None - нет маршрута)"""
+    path = uri.split('?', 1)[0]
+    for index, route in enumerate(_compiled_routes()):
+        if route.methods is not None and method not in route.methods:
+            continue
+        if route.pattern.match(path):
+            return index, route
+    return None, None
+
+
+def _original_request(request):
+    meta = request.META
+    method = meta.get('HTTP_X_ORIGINAL_METHOD') or meta.get('HTTP_X_FORWARDED_METHOD') or request.method
+    uri = meta.get('HTTP_X_ORIGINAL_URI') or meta.get('HTTP_X_FORWARDED_URI') or '/'
+    return method.upper(), uri
+
+
+def _response(status, headers=None):
+    response = HttpResponse(status=status)
+    for name, value in (headers or {}).items():
+        response[name] = value
+    if status == 401:
+        response['WWW-Authenticate'] = 'Bearer'
+    return response
+
+
+def _decide(request, token, route):
+    """Решение по маршруту: (статус, заголовки)"""
+    user = get_cached_user(token[api_settings.USER_ID_CLAIM])
+    if user is None or not user.is_active or not token_version_matches(token, user):
+        return 401, {}
+
+    snapshot = get_permission_snapshot(user)
+    if route.permission is not None and not (user.is_superuser or user.is_staff):
+        checker = HasPermission(route.permission)
+        if not checker._check_user_permission(user, route.permission, request, snapshot):
+            return 403, {}
+
+    return 200, {
+        'X-Auth-User-Id': str(user.pk),
+        'X-Auth-User-Email': user.email,
+        'X-Auth-Roles': ','.join(sorted(snapshot.role_codes)),
+    }
+
+
+@csrf_exempt
+def forward_auth(request):
+    """Проверка запроса для обратного прокси"""
+    header = _authentication.get_header(request)
+    raw_token = _authentication.get_raw_token(header) if header else None
+    if raw_token is None:
+        return _response(401)
+
+    try:
+        token = _authentication.get_validated_token(raw_token)
+    except AuthenticationFailed:
+        return _response(401)
+
+    method, uri = _original_request(request)
+    index, route = match_route(method, uri)
+    if route is None:
+        return _response(403)
+
+    key = (token[api_settings.JTI_CLAIM], index)
+    decision = _decisions.get(key)
+    if decision is None:
+        decision = _decide(request, token, route)
+        _decisions.set(key, decision, settings.AUTHZ_FORWARD_CACHE_TTL, DECISION_CACHE_MAX_SIZE)
+
+    return _response(*decision)
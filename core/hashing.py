@@ -0,0 +1,107 @@
+"""
+Хэширование паролей в ограниченном пуле потоков.
+
+Хэширование пароля - самая дорогая по CPU операция сервиса. Проверка при
+входе и хэширование при регистрации выполняются в пуле из
+PASSWORD_HASHING_WORKERS потоков (hashlib освобождает GIL на время
+вычисления), поэтому всплеск входов занимает не больше этого числа ядер.
+Если задач в пуле (выполняемых и ожидающих) уже PASSWORD_HASHING_MAX_QUEUE,
+новая задача не ставится в очередь: запрос сразу получает 503 с Retry-After.
+
+При успешной проверке пароль перехэшируется, если сменился основной
+хэшер или его параметры (число итераций и т.д.) - как в
+AbstractBaseUser.check_password, но хэш вычисляется в том же задании пула.
+"""
+
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password, verify_password
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+
+class PasswordHashingOverloaded(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = 'Сервер перегружен, повторите попытку позже'
+    default_code = 'hashing_overloaded'
+
+    def __init__(self, detail=None, code=None):
+        super().__init__(detail, code)
+        # DRF добавляет заголовок Retry-After по атрибуту wait
+        self.wait = settings.PASSWORD_HASHING_RETRY_AFTER
+
+
+_pool = {}
+_pool_lock = threading.Lock()
+
+
+def _get_pool():
+    if 'executor' not in _pool:
+        with _pool_lock:
+            if 'executor' not in _pool:
+                _pool['slots'] = threading.BoundedSemaphore(settings.PASSWORD_HASHING_MAX_QUEUE)
+                _pool['executor'] = ThreadPoolExecutor(
+                    max_workers=settings.PASSWORD_HASHING_WORKERS,
+                    thread_name_prefix='password-hashing',
+                )
+    return _pool['executor'], _pool['slots']
+
+
+def _submit(function, *args):
+    executor, slots = _get_pool()
+    if not slots.acquire(blocking=False):
+        raise PasswordHashingOverloaded()
+
+    try:
+        future = executor.submit(function, *args)
+    except BaseException:
+        slots.release()
+        raise
+    future.add_done_callback(lambda _: slots.release())
+    return future
+
+
+def run_hashing(function, *args):
+    """Выполняет function(*args) в пуле хэширования и возвращает результат"""
+    return _submit(function, *args).result()
+
+
+async def arun_hashing(function, *args):
+    """run_hashing для async-представлений: ожидание не занимает поток"""
+    return await asyncio.wrap_future(_submit(function, *args))
+
+
+def _verify(raw_password, encoded):
+    is_correct, must_update = verify_password(raw_password, encoded)
+    if is_correct and must_update:
+        return True, make_password(raw_password)
+    return is_correct, None
+
+
+def hash_password(raw_password):
+    """Хэш пароля для сохранения (make_password в пуле)"""
+    return run_hashing(make_password, raw_password)
+
+
+def check_user_password(user, raw_password):
+    """
+    Проверяет пароль пользователя в пуле. При необходимости сохраняет
+    новый хэш (смена хэшера или его параметров).
+    """
+    is_correct, new_encoded = run_hashing(_verify, raw_password, user.password)
+    if new_encoded is not None:
+        user.password = new_encoded
+        type(user).objects.filter(pk=user.pk).update(password=new_encoded)
+    return is_correct
+
+
+async def acheck_user_password(user, raw_password):
+    """check_user_password для async-представлений"""
+    is_correct, new_encoded = await arun_hashing(_verify, raw_password, user.password)
+    if new_encoded is not None:
+        user.password = new_encoded
+        await type(user).objects.filter(pk=user.pk).aupdate(password=new_encoded)
+    return is_correct
@@ -0,0 +1,171 @@
+"""
+Асимметричная подпись JWT с ротацией ключей и публикация JWKS.
+
+По умолчанию токены подписываются HS256 ключом SECRET_KEY (SIMPLE_JWT).
+Если задан каталог JWT_KEYS_DIR, токены подписываются закрытым ключом из
+этого каталога, а сервисы могут проверять их сами по открытым ключам
+из /.well-known/jwks.json, без обращения к этому сервису.
+
+Файлы каталога - PEM-ключи, имя файла без .pem - идентификатор ключа (kid):
+    <kid>.pem - закрытый ключ RSA (RS256) или Ed25519 (EdDSA)
+    <kid>.pub.pem - только открытый ключ (выведенный из ротации ключ,
+                    токены с ним еще проверяются)
+
+Подписывает ключ JWT_ACTIVE_KID (по умолчанию - последний по имени
+закрытый ключ), проверка выбирает ключ по заголовку kid токена.
+Ротация: добавить новый ключ, дождаться, пока JWKS разойдется по сервисам,
+сделать его активным; старый ключ удалить после истечения его токенов.
+"""
+
+import json
+import os
+from collections import namedtuple
+
+import jwt
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.http import HttpResponse
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.backends import TokenBackend
+from rest_framework_simplejwt.exceptions import TokenBackendError
+from rest_framework_simplejwt.settings import api_settings
+
+
+SigningKey = namedtuple('SigningKey', ['kid', 'algorithm', 'private_key', 'public_key'])
+
+_state = {}
+
+
+def _load_key(kid, pem, private):
+    from cryptography.hazmat.primitives import serialization
+    from cryptography.hazmat.primitives.asymmetric import ed25519, rsa
+
+    if private:
+        private_key = serialization.load_pem_private_key(pem, password=None)
+        public_key = private_key.public_key()
+    else:
+        private_key = None
+        public_key = serialization.load_pem_public_key(pem)
+
+    if isinstance(public_key, rsa.RSAPublicKey):
+        algorithm = 'RS256'
+    elif isinstance(public_key, ed25519.Ed25519PublicKey):
+        algorithm = 'EdDSA'
+    else:
+        raise ImproperlyConfigured(f'Ключ {kid}: поддерживаются только RSA и Ed25519')
+    return SigningKey(kid, algorithm, private_key, public_key)
+
+
+def load_keyring(directory):
+    """Ключи каталога: {kid: SigningKey}"""
+    keys = {}
+    for name in sorted(os.listdir(directory)):
+        if not name.endswith('.pem'):
+            continue
+        private = not name.endswith('.pub.pem')
+        kid = name[:-len('.pem')] if private else name[:-len('.pub.pem')]
+        with open(os.path.join(directory, name), 'rb') as key_file:
+            keys[kid] = _load_key(kid, key_file.read(), private)
+    return keys
+
+
+class KeyRingTokenBackend(TokenBackend):
+    """
+    TokenBackend simplejwt с набором ключей: подпись активным ключом
+    с заголовком kid, проверка - ключом, указанным в токене.
+    """
+
+    def __init__(self, keys, active_kid, audience=None, issuer=None, leeway=None, json_encoder=None):
+        # Базовый __init__ не вызывается: он допускает один алгоритм и без EdDSA
+        active = keys.get(active_kid)
+        if active is None or active.private_key is None:
+            raise ImproperlyConfigured(f'Нет закрытого ключа для JWT_ACTIVE_KID={active_kid!r}')
+
+        self.keys = keys
+        self.active = active
+        self.algorithm = active.algorithm
+        self.signing_key = active.private_key
+        self.verifying_key = active.public_key
+        self.audience = audience
+        self.issuer = issuer
+        self.jwks_client = None
+        self.leeway = leeway
+        self.json_encoder = json_encoder
+
+    def encode(self, payload):
+        jwt_payload = payload.copy()
+        if self.audience is not None:
+            jwt_payload['aud'] = self.audience
+        if self.issuer is not None:
+            jwt_payload['iss'] = self.issuer
+
+        return jwt.encode(
+            jwt_payload,
+            self.active.private_key,
+            algorithm=self.active.algorithm,
+            headers={'kid': self.active.kid},
+            json_encoder=self.json_encoder,
+        )
+
+    def decode(self, token, verify=True):
+        try:
+            key = self.keys.get(jwt.get_unverified_header(token).get('kid'))
+            if key is None and verify:
+                raise TokenBackendError(_('Token is invalid or expired'))
+
+            return jwt.decode(
+                token,
+                key.public_key if key else None,
+                algorithms=[key.algorithm] if key else None,
+                audience=self.audience,
+                issuer=self.issuer,
+                leeway=self.get_leeway(),
+                options={
+                    'verify_aud': self.audience is not None,
+                    'verify_signature': verify,
+                },
+            )
+        except jwt.InvalidTokenError as ex:
+            raise TokenBackendError(_('Token is invalid or expired')) from ex
+
+
+def get_keyring_backend():
+    """Backend с ключами JWT_KEYS_DIR или None, если асимметричная подпись не настроена"""
+    if not settings.JWT_KEYS_DIR:
+        return None
+
+    if 'backend' not in _state:
+        keys = load_keyring(settings.JWT_KEYS_DIR)
+        active_kid = settings.JWT_ACTIVE_KID or max(
+            (kid for kid, key in keys.items() if key.private_key is not None), default=None
+        )
+        _state['backend'] = KeyRingTokenBackend(
+            keys,
+            active_kid,
+            audience=api_settings.AUDIENCE,
+            issuer=api_settings.ISSUER,
+            leeway=api_settings.LEEWAY,
+            json_encoder=api_settings.JSON_ENCODER,
+        )
+    return _state['backend']
+
+
+def _public_jwk(key):
+    if key.algorithm == 'RS256':
+        jwk = jwt.algorithms.RSAAlgorithm.to_jwk(key.public_key, as_dict=True)
+    else:
+        jwk = jwt.algorithms.OKPAlgorithm.to_jwk(key.public_key, as_dict=True)
+    jwk.update(kid=key.kid, alg=key.algorithm, use='sig')
+    return jwk
+
+
+def jwks(request):
+    """Открытые ключи проверки токенов (RFC 7517), кэшируются клиентами"""
+    if 'jwks' not in _state:
+        backend = get_keyring_backend()
+        keys = backend.keys.values() if backend else ()
+        _state['jwks'] = json.dumps({'keys': [_public_jwk(key) for key in keys]})
+
+    response = HttpResponse(_state['jwks'], content_type='application/json')
+    response['Cache-Control'] = f'public, max-age={settings.JWKS_CACHE_MAX_AGE}'
+    return response
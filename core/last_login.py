@@ -0,0 +1,115 @@
+"""
+Отложенная запись User.last_login.
+
+Вход не обновляет строку пользователя сразу: время входа попадает в буфер
+процесса и записывается пачкой (один bulk_update) при накоплении
+LAST_LOGIN_FLUSH_SIZE записей, фоновым таймером не позже чем через
+LAST_LOGIN_FLUSH_INTERVAL секунд после первого входа в буфер (в том числе
+в простаивающем процессе) и при завершении процесса. Если последний вход
+был меньше LAST_LOGIN_UPDATE_INTERVAL назад, время не обновляется вовсе -
+частые входы одной учетной записи не создают конкуренции за строку core_user.
+
+Ошибка записи не доходит до входа: она логируется, а времена остаются
+в буфере до следующей попытки. При аварийном завершении процесса
+несохраненные времена входа теряются: last_login - справочное поле,
+аудит входов ведется в AuditLog.
+"""
+
+import atexit
+import logging
+import threading
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection
+from django.utils import timezone
+
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_pending = {}
+_timer = [None]
+
+
+def _schedule_flush():
+    """Запускает таймер записи буфера, если он еще не запущен (под _lock)"""
+    if _timer[0] is None:
+        timer = threading.Timer(settings.LAST_LOGIN_FLUSH_INTERVAL, _timed_flush)
+        timer.daemon = True
+        _timer[0] = timer
+        timer.start()
+
+
+def _timed_flush():
+    with _lock:
+        _timer[0] = None
+    try:
+        _flush_safely()
+    finally:
+        # Соединение потока таймера не переиспользуется
+        connection.close()
+    with _lock:
+        if _pending:
+            _schedule_flush()
+
+
+def _flush_safely():
+    try:
+        return flush_last_login()
+    except Exception:
+        logger.exception('Не удалось записать время последнего входа')
+        return 0
+
+
+def record_login(user, now=None):
+    """Учитывает вход пользователя; user.last_login обновляется сразу в памяти"""
+    now = now or timezone.now()
+    interval = timedelta(minutes=settings.LAST_LOGIN_UPDATE_INTERVAL)
+
+    with _lock:
+        last_login = _pending.get(user.pk) or user.last_login
+        if last_login is not None and now - last_login < interval:
+            user.last_login = last_login
+            return
+        _pending[user.pk] = now
+        user.last_login = now
+        due = len(_pending) >= settings.LAST_LOGIN_FLUSH_SIZE
+        # Таймер запишет буфер и в простаивающем процессе, и после ошибки
+        _schedule_flush()
+
+    if due:
+        _flush_safely()
+
+
+def flush_last_login():
+    """Записывает накопленные времена входа одним запросом"""
+    from .models import User
+    from .authentication import invalidate_cached_users
+
+    with _lock:
+        pending = dict(_pending)
+        _pending.clear()
+
+    if not pending:
+        return 0
+
+    try:
+        User.objects.bulk_update(
+            [User(pk=user_id, last_login=last_login) for user_id, last_login in pending.items()],
+            ['last_login'],
+        )
+    except Exception:
+        # Возвращаем в буфер, не затирая более поздние входы
+        with _lock:
+            for user_id, last_login in pending.items():
+                _pending.setdefault(user_id, last_login)
+        raise
+    invalidate_cached_users(pending)
+    return len(pending)
+
+
+@atexit.register
+def _flush_at_exit():
+    # База данных может быть уже недоступна при завершении процесса
+    _flush_safely()
@@ -0,0 +1,47 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+
+class BatchDeleteCommand(BaseCommand):
+    """
+    Очистка пачками с опциями --batch-size, --dry-run и --loop.
+    Наследник задает noun (родительный падеж множественного числа,
+    например 'доступов') и delete(batch_size, dry_run).
+    """
+    noun = ''
+
+    def delete(self, batch_size, dry_run):
+        raise NotImplementedError
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help=f'Количество {self.noun} в одной пачке',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help=f'Только посчитать количество истекших {self.noun} в первой пачке',
+        )
+        parser.add_argument(
+            '--loop',
+            type=int,
+            default=0,
+            metavar='SECONDS',
+            help='Повторять очистку с указанным интервалом (фоновый режим)',
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            count = self.delete(batch_size=options['batch_size'], dry_run=options['dry_run'])
+            if options['dry_run']:
+                self.stdout.write(f'Истекших {self.noun} (не больше одной пачки): {count}')
+            else:
+                self.stdout.write(self.style.SUCCESS(f'Удалено истекших {self.noun}: {count}'))
+
+            if not options['loop'] or options['dry_run']:
+                return
+            time.sleep(options['loop'])
@@ -0,0 +1,217 @@
+import csv
+import io
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+import django
+from django.contrib.auth.hashers import make_password
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.core.validators import validate_email
+from django.db import transaction
+from django.db.models.functions import Lower
+
+from core.effective import sync_effective_permissions
+from core.models import User, Role, UserRole, UserEffectivePermission
+from core.utils import log_action
+
+
+FIELDS = ('first_name', 'last_name', 'patronymic', 'department')
+
+
+def _init_worker(settings_module):
+    # При запуске процессов через spawn Django нужно настроить заново
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', settings_module)
+    django.setup()
+
+
+def _read_csv(stream):
+    for row in csv.DictReader(stream):
+        roles = row.get('roles') or ''
+        row['roles'] = [code.strip() for code in roles.split(';') if code.strip()]
+        yield row
+
+
+def _read_ndjson(stream):
+    for number, line in enumerate(stream, 1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError:
+            yield {'_error': f'строка {number}: некорректный JSON'}
+            continue
+        roles = row.get('roles') or []
+        row['roles'] = [roles] if isinstance(roles, str) else list(roles)
+        yield row
+
+
+class Command(BaseCommand):
+    help = (
+        'Импортирует пользователей из CSV или NDJSON (email, password, first_name, '
+        'last_name, patronymic, department, roles). Пароли хэшируются в пуле '
+        'процессов, пользователи и роли создаются пачками. Уже существующие email '
+        'пропускаются, поэтому после сбоя импорт можно просто запустить повторно.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Файл .csv/.ndjson или - для стандартного ввода')
+        parser.add_argument(
+            '--format',
+            choices=['csv', 'ndjson'],
+            help='Формат файла (по умолчанию - по расширению)',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Количество пользователей в одной пачке (одна транзакция)',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=os.cpu_count() or 2,
+            help='Количество процессов для хэширования паролей',
+        )
+
+    def _rows(self, options):
+        path = options['path']
+        file_format = options['format'] or ('csv' if path.endswith('.csv') else 'ndjson')
+        if path == '-':
+            stream = io.TextIOWrapper(sys.stdin.buffer, encoding='utf-8')
+        else:
+            try:
+                stream = open(path, encoding='utf-8', newline='')
+            except OSError as e:
+                raise CommandError(f'Не удалось открыть {path}: {e}')
+        return stream, (_read_csv if file_format == 'csv' else _read_ndjson)(stream)
+
+    def _validate(self, batch, seen):
+        """Строки пачки с проверенным email; ошибки и повторы - в stderr"""
+        valid, errors = [], 0
+        for row in batch:
+            if '_error' in row:
+                self.stderr.write(row['_error'])
+                errors += 1
+                continue
+            email = User.objects.normalize_email((row.get('email') or '').strip())
+            try:
+                validate_email(email)
+            except ValidationError:
+                self.stderr.write(f'Некорректный email: {email!r}')
+                errors += 1
+                continue
+            if email in seen:
+                self.stderr.write(f'Повтор email в файле: {email}')
+                errors += 1
+                continue
+            seen.add(email)
+            row['email'] = email
+            valid.append(row)
+        return valid, errors
+
+    def _import_batch(self, rows, executor, role_ids):
+        """Создает пользователей пачки и их роли; возвращает (создано, ролей, ошибок)"""
+        passwords = [row.get('password') or None for row in rows]
+        hashes = executor.map(make_password, passwords, chunksize=max(1, len(rows) // 64))
+
+        users = []
+        user_roles = []
+        errors = 0
+        for row, password in zip(rows, hashes):
+            user = User(
+                email=row['email'],
+                password=password,
+                **{field: row.get(field) or '' for field in FIELDS}
+            )
+            users.append(user)
+            for code in row['roles']:
+                if code in role_ids:
+                    user_roles.append(UserRole(user=user, role_id=role_ids[code]))
+                else:
+                    # Пользователь создается с остальными ролями, роль учитывается как ошибка
+                    self.stderr.write(f'{row["email"]}: неизвестная роль {code!r}')
+                    errors += 1
+
+        with transaction.atomic():
+            User.objects.bulk_create(users)
+            UserRole.objects.bulk_create(user_roles)
+            # bulk_create не вызывает сигналы: строки эффективных разрешений
+            # новых пользователей строятся одним запросом на пачку
+            if user_roles:
+                sync_effective_permissions(
+                    {user_role.user_id for user_role in user_roles},
+                    sources=[UserEffectivePermission.SOURCE_ROLE],
+                )
+        return len(users), len(user_roles), errors
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        role_ids = dict(Role.objects.values_list('code', 'pk'))
+        stream, rows = self._rows(options)
+
+        started = time.perf_counter()
+        created = skipped = errors = roles = 0
+        seen = set()
+
+        executor = ProcessPoolExecutor(
+            max_workers=options['workers'],
+            initializer=_init_worker,
+            initargs=(os.environ.get('DJANGO_SETTINGS_MODULE', 'config.settings'),),
+        )
+        try:
+            while True:
+                batch = list(islice(rows, batch_size))
+                if not batch:
+                    break
+
+                batch, batch_errors = self._validate(batch, seen)
+                errors += batch_errors
+
+                # Повторный запуск после сбоя: созданные ранее пользователи пропускаются
+                existing = set(User.objects.annotate(email_lower=Lower('email')).filter(
+                    email_lower__in=[row['email'] for row in batch]
+                ).values_list('email_lower', flat=True))
+                batch = [row for row in batch if row['email'] not in existing]
+                skipped += len(existing)
+
+                if batch:
+                    batch_created, batch_roles, batch_errors = self._import_batch(batch, executor, role_ids)
+                    created += batch_created
+                    roles += batch_roles
+                    errors += batch_errors
+
+                elapsed = time.perf_counter() - started
+                self.stdout.write(
+                    f'Создано: {created}, пропущено: {skipped}, ошибок: {errors} '
+                    f'({created / elapsed:.0f} польз./с)'
+                )
+        finally:
+            executor.shutdown()
+            stream.close()
+
+        elapsed = time.perf_counter() - started
+        log_action(
+            user=None,
+            action='create',
+            resource_type='user',
+            details={
+                'action': 'import',
+                'source': options['path'],
+                'created': created,
+                'skipped': skipped,
+                'errors': errors,
+                'roles_assigned': roles,
+                'seconds': round(elapsed, 1),
+            }
+        )
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Импорт завершен за {elapsed:.1f} с: создано пользователей - {created}, '
+            f'назначено ролей - {roles}, пропущено существующих - {skipped}, ошибок - {errors} '
+            f'({created / elapsed if elapsed else 0:.0f} польз./с)'
+        ))
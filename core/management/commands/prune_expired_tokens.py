@@ -0,0 +1,11 @@
+from core.blacklist import prune_expired_tokens
+
+from ._batch_delete import BatchDeleteCommand
+
+
+class Command(BatchDeleteCommand):
+    help = 'Удаляет истекшие выпущенные токены и записи черного списка пачками'
+    noun = 'токенов'
+
+    def delete(self, batch_size, dry_run):
+        return prune_expired_tokens(batch_size=batch_size, dry_run=dry_run)
@@ -0,0 +1,78 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models.functions import Lower
+
+from core.effective import sync_effective_permissions, group_members
+from core.models import User, Group
+from core.snapshot import invalidate_permission_snapshots
+from core.decisions import bump_global_version
+
+
+class Command(BaseCommand):
+    help = 'Перестраивает и сверяет таблицу эффективных разрешений (UserEffectivePermission)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verify',
+            action='store_true',
+            help='Только сверить таблицу, ничего не изменяя',
+        )
+        parser.add_argument(
+            '--user',
+            dest='emails',
+            action='append',
+            default=[],
+            help='Email пользователя (можно указать несколько раз)',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Количество пользователей в одной пачке',
+        )
+
+    def handle(self, *args, **options):
+        users = User.objects.order_by('pk')
+        if options['emails']:
+            users = users.alias(email_lower=Lower('email')).filter(
+                email_lower__in=[User.objects.normalize_email(email) for email in options['emails']]
+            )
+        user_ids = list(users.values_list('pk', flat=True))
+
+        batch_size = options['batch_size']
+        dry_run = options['verify']
+        total_added = total_removed = 0
+
+        for start in range(0, len(user_ids), batch_size):
+            batch = user_ids[start:start + batch_size]
+            added, removed = sync_effective_permissions(batch, dry_run=dry_run)
+            total_added += added
+            total_removed += removed
+            if not dry_run and (added or removed):
+                invalidate_permission_snapshots(batch)
+
+        # Строки групп (только при полной перестройке)
+        group_ids = [] if options['emails'] else list(Group.objects.values_list('pk', flat=True))
+        for start in range(0, len(group_ids), batch_size):
+            batch = group_ids[start:start + batch_size]
+            added, removed = sync_effective_permissions([], dry_run=dry_run, group_ids=batch)
+            total_added += added
+            total_removed += removed
+            if not dry_run and (added or removed):
+                invalidate_permission_snapshots(group_members(batch))
+
+        if not dry_run and (total_added or total_removed):
+            bump_global_version()
+
+        if dry_run:
+            if total_added or total_removed:
+                raise CommandError(
+                    f'Расхождения: отсутствует строк - {total_added}, лишних строк - {total_removed}'
+                )
+            self.stdout.write(self.style.SUCCESS(
+                f'Таблица согласована ({len(user_ids)} пользователей, {len(group_ids)} групп)'
+            ))
+        else:
+            self.stdout.write(self.style.SUCCESS(
+                f'Перестроено для {len(user_ids)} пользователей и {len(group_ids)} групп: '
+                f'добавлено строк - {total_added}, удалено - {total_removed}'
+            ))
@@ -0,0 +1,11 @@
+from core.utils import sweep_expired_grants
+
+from ._batch_delete import BatchDeleteCommand
+
+
+class Command(BatchDeleteCommand):
+    help = 'Удаляет истекшие прямые доступы к ресурсам (ResourceAccess) пачками'
+    noun = 'доступов'
+
+    def delete(self, batch_size, dry_run):
+        return sweep_expired_grants(batch_size=batch_size, dry_run=dry_run)
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.2 on 2026-10-17 06:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="user",
+            name="permission_epoch",
+            field=models.PositiveIntegerField(default=0, verbose_name="Эпоха прав"),
+        ),
+    ]
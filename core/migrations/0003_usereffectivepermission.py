@@ -0,0 +1,170 @@
+# Generated by Django 5.0.2 on 2026-10-17 06:02
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def populate_effective_permissions(apps, schema_editor):
+    UserRole = apps.get_model("core", "UserRole")
+    ResourceAccess = apps.get_model("core", "ResourceAccess")
+    UserEffectivePermission = apps.get_model("core", "UserEffectivePermission")
+
+    rows = []
+    for user_role in UserRole.objects.select_related("role"):
+        scope = user_role.resource_scope or {}
+        allowed_types = scope.get("resource_types")
+        for role_permission in user_role.role.role_permissions.select_related(
+            "permission"
+        ):
+            permission = role_permission.permission
+            rows.append(
+                UserEffectivePermission(
+                    user_id=user_role.user_id,
+                    permission_id=permission.id,
+                    codename=permission.codename,
+                    resource_type_id=permission.resource_type_id,
+                    source="role",
+                    role_id=user_role.role_id,
+                    scope=scope,
+                    in_scope=allowed_types is None
+                    or str(permission.resource_type_id)
+                    in {str(type_id) for type_id in allowed_types},
+                    conditions=role_permission.conditions or {},
+                )
+            )
+    for access in ResourceAccess.objects.select_related("permission"):
+        rows.append(
+            UserEffectivePermission(
+                user_id=access.user_id,
+                permission_id=access.permission_id,
+                codename=access.permission.codename,
+                resource_type_id=access.permission.resource_type_id,
+                source="direct",
+                resource_id=access.resource_id,
+                conditions=access.conditions or {},
+                expires_at=access.expires_at,
+            )
+        )
+    UserEffectivePermission.objects.bulk_create(rows, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0002_user_permission_epoch"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="UserEffectivePermission",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "codename",
+                    models.CharField(max_length=100, verbose_name="Кодовое имя"),
+                ),
+                (
+                    "source",
+                    models.CharField(
+                        choices=[("role", "Роль"), ("direct", "Прямой доступ")],
+                        max_length=20,
+                        verbose_name="Источник",
+                    ),
+                ),
+                (
+                    "scope",
+                    models.JSONField(
+                        blank=True, default=dict, verbose_name="Область действия"
+                    ),
+                ),
+                (
+                    "in_scope",
+                    models.BooleanField(
+                        default=True, verbose_name="Тип ресурса в области действия"
+                    ),
+                ),
+                (
+                    "conditions",
+                    models.JSONField(blank=True, default=dict, verbose_name="Условия"),
+                ),
+                (
+                    "expires_at",
+                    models.DateTimeField(
+                        blank=True, null=True, verbose_name="Истекает"
+                    ),
+                ),
+                (
+                    "permission",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to="core.permission",
+                    ),
+                ),
+                (
+                    "resource",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to="core.resource",
+                    ),
+                ),
+                (
+                    "resource_type",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to="core.resourcetype",
+                    ),
+                ),
+                (
+                    "role",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to="core.role",
+                    ),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="effective_permissions",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Эффективное разрешение",
+                "verbose_name_plural": "Эффективные разрешения",
+                "indexes": [
+                    models.Index(
+                        fields=["user", "codename", "source"],
+                        name="core_useref_user_id_3c6ee3_idx",
+                    ),
+                    models.Index(
+                        fields=["role", "permission"],
+                        name="core_useref_role_id_1d1cce_idx",
+                    ),
+                    models.Index(
+                        fields=["resource", "user"],
+                        name="core_useref_resourc_126832_idx",
+                    ),
+                ],
+            },
+        ),
+        migrations.RunPython(populate_effective_permissions, migrations.RunPython.noop),
+    ]
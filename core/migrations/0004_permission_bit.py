@@ -0,0 +1,35 @@
+# Generated by Django 5.0.2 on 2026-10-17 06:03
+
+from django.db import migrations, models
+
+
+def assign_permission_bits(apps, schema_editor):
+    Permission = apps.get_model("core", "Permission")
+    permissions = Permission.objects.order_by(
+        "resource_type__code", "action", "codename"
+    )
+    for bit, permission in enumerate(permissions):
+        permission.bit = bit
+        permission.save(update_fields=["bit"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0003_usereffectivepermission"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="permission",
+            name="bit",
+            field=models.PositiveIntegerField(
+                blank=True,
+                editable=False,
+                null=True,
+                unique=True,
+                verbose_name="Номер бита",
+            ),
+        ),
+        migrations.RunPython(assign_permission_bits, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.0.2 on 2026-10-17 06:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0004_permission_bit"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="user",
+            name="department",
+            field=models.CharField(
+                blank=True, db_index=True, max_length=100, verbose_name="Отдел"
+            ),
+        ),
+    ]
@@ -0,0 +1,159 @@
+# Generated by Django 5.0.2 on 2026-10-17 06:06
+
+import uuid
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def populate_user_role_scopes(apps, schema_editor):
+    UserRole = apps.get_model("core", "UserRole")
+    UserRoleScope = apps.get_model("core", "UserRoleScope")
+    UserEffectivePermission = apps.get_model("core", "UserEffectivePermission")
+    ResourceType = apps.get_model("core", "ResourceType")
+    User = apps.get_model("core", "User")
+
+    def existing_ids(model, values):
+        ids = []
+        for value in values if isinstance(values, (list, tuple)) else [values]:
+            try:
+                ids.append(uuid.UUID(str(value)))
+            except ValueError:
+                continue
+        return model.objects.filter(pk__in=ids).values_list("pk", flat=True)
+
+    rows = []
+    for user_role in UserRole.objects.all():
+        UserEffectivePermission.objects.filter(
+            source="role", user_id=user_role.user_id, role_id=user_role.role_id
+        ).update(user_role=user_role)
+
+        scope = user_role.resource_scope or {}
+        if scope.get("resource_types") is not None:
+            for resource_type_id in existing_ids(ResourceType, scope["resource_types"]):
+                rows.append(
+                    UserRoleScope(
+                        user_role=user_role,
+                        kind="resource_type",
+                        resource_type_id=resource_type_id,
+                    )
+                )
+        if scope.get("owners") is not None:
+            for owner_id in existing_ids(User, scope["owners"]):
+                rows.append(
+                    UserRoleScope(user_role=user_role, kind="owner", owner_id=owner_id)
+                )
+        if scope.get("owner_department") is not None:
+            departments = scope["owner_department"]
+            if not isinstance(departments, (list, tuple)):
+                departments = [departments]
+            for department in departments:
+                rows.append(
+                    UserRoleScope(
+                        user_role=user_role,
+                        kind="department",
+                        department=str(department),
+                    )
+                )
+    UserRoleScope.objects.bulk_create(rows, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0005_user_department"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="usereffectivepermission",
+            name="user_role",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="+",
+                to="core.userrole",
+            ),
+        ),
+        migrations.CreateModel(
+            name="UserRoleScope",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "kind",
+                    models.CharField(
+                        choices=[
+                            ("resource_type", "Тип ресурса"),
+                            ("owner", "Владелец"),
+                            ("department", "Отдел владельца"),
+                        ],
+                        max_length=20,
+                        verbose_name="Вид ограничения",
+                    ),
+                ),
+                (
+                    "department",
+                    models.CharField(
+                        blank=True, max_length=100, verbose_name="Отдел владельца"
+                    ),
+                ),
+                (
+                    "owner",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+                (
+                    "resource_type",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to="core.resourcetype",
+                    ),
+                ),
+                (
+                    "user_role",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="scopes",
+                        to="core.userrole",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Область действия роли",
+                "verbose_name_plural": "Области действия ролей",
+                "indexes": [
+                    models.Index(
+                        fields=["user_role", "kind", "resource_type"],
+                        name="core_userro_user_ro_2840cb_idx",
+                    ),
+                    models.Index(
+                        fields=["user_role", "kind", "owner"],
+                        name="core_userro_user_ro_0e770c_idx",
+                    ),
+                    models.Index(
+                        fields=["user_role", "kind", "department"],
+                        name="core_userro_user_ro_dc956a_idx",
+                    ),
+                ],
+            },
+        ),
+        migrations.RunPython(populate_user_role_scopes, migrations.RunPython.noop),
+    ]
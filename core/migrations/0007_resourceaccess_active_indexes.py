@@ -0,0 +1,45 @@
+# Generated by Django 5.0.2 on 2026-10-17 06:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0006_userrolescope"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="resourceaccess",
+            index=models.Index(
+                condition=models.Q(("expires_at__isnull", True)),
+                fields=["user", "permission", "resource"],
+                name="core_access_no_expiry_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="resourceaccess",
+            index=models.Index(
+                condition=models.Q(("expires_at__isnull", False)),
+                fields=["user", "permission", "expires_at"],
+                name="core_access_expiring_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="resourceaccess",
+            index=models.Index(
+                condition=models.Q(("expires_at__isnull", False)),
+                fields=["expires_at"],
+                name="core_access_expires_at_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="usereffectivepermission",
+            index=models.Index(
+                condition=models.Q(("expires_at__isnull", False)),
+                fields=["expires_at"],
+                name="core_effperm_expires_at_idx",
+            ),
+        ),
+    ]
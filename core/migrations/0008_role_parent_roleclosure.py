@@ -0,0 +1,81 @@
+# Generated by Django 5.0.2 on 2026-10-17 06:10
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def populate_role_closure(apps, schema_editor):
+    # До появления иерархии все роли корневые: только связи роли с собой
+    Role = apps.get_model("core", "Role")
+    RoleClosure = apps.get_model("core", "RoleClosure")
+    RoleClosure.objects.bulk_create(
+        [
+            RoleClosure(ancestor_id=pk, descendant_id=pk, depth=0)
+            for pk in Role.objects.values_list("pk", flat=True)
+        ]
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0007_resourceaccess_active_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="role",
+            name="parent",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="children",
+                to="core.role",
+                verbose_name="Родительская роль",
+            ),
+        ),
+        migrations.CreateModel(
+            name="RoleClosure",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("depth", models.PositiveIntegerField(verbose_name="Глубина")),
+                (
+                    "ancestor",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="descendant_links",
+                        to="core.role",
+                    ),
+                ),
+                (
+                    "descendant",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="ancestor_links",
+                        to="core.role",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Связь иерархии ролей",
+                "verbose_name_plural": "Иерархия ролей",
+                "indexes": [
+                    models.Index(
+                        fields=["descendant", "ancestor"],
+                        name="core_rolecl_descend_9f6e2e_idx",
+                    )
+                ],
+                "unique_together": {("ancestor", "descendant")},
+            },
+        ),
+        migrations.RunPython(populate_role_closure, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,278 @@
+# Generated by Django 5.0.2 on 2026-10-17 06:14
+
+import core.models
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0008_role_parent_roleclosure"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="GroupClosure",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("depth", models.PositiveIntegerField(verbose_name="Глубина")),
+            ],
+            options={
+                "verbose_name": "Связь иерархии групп",
+                "verbose_name_plural": "Иерархия групп",
+            },
+        ),
+        migrations.CreateModel(
+            name="GroupMembership",
+            fields=[
+                (
+                    "id",
+                    models.UUIDField(
+                        default=uuid.uuid4,
+                        editable=False,
+                        primary_key=True,
+                        serialize=False,
+                    ),
+                ),
+                (
+                    "joined_at",
+                    models.DateTimeField(auto_now_add=True, verbose_name="Добавлен"),
+                ),
+            ],
+            options={
+                "verbose_name": "Участник группы",
+                "verbose_name_plural": "Участники групп",
+            },
+        ),
+        migrations.AlterField(
+            model_name="resourceaccess",
+            name="user",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="resource_accesses",
+                to=settings.AUTH_USER_MODEL,
+            ),
+        ),
+        migrations.AlterField(
+            model_name="usereffectivepermission",
+            name="user",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="effective_permissions",
+                to=settings.AUTH_USER_MODEL,
+            ),
+        ),
+        migrations.AlterField(
+            model_name="userrole",
+            name="user",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="user_roles",
+                to=settings.AUTH_USER_MODEL,
+            ),
+        ),
+        migrations.CreateModel(
+            name="Group",
+            fields=[
+                (
+                    "id",
+                    models.UUIDField(
+                        default=uuid.uuid4,
+                        editable=False,
+                        primary_key=True,
+                        serialize=False,
+                    ),
+                ),
+                (
+                    "name",
+                    models.CharField(
+                        max_length=100, unique=True, verbose_name="Название"
+                    ),
+                ),
+                (
+                    "code",
+                    models.CharField(max_length=50, unique=True, verbose_name="Код"),
+                ),
+                ("description", models.TextField(blank=True, verbose_name="Описание")),
+                (
+                    "created_at",
+                    models.DateTimeField(auto_now_add=True, verbose_name="Создана"),
+                ),
+                (
+                    "parent",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="children",
+                        to="core.group",
+                        verbose_name="Родительская группа",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Группа",
+                "verbose_name_plural": "Группы",
+                "ordering": ["name"],
+            },
+            bases=(core.models.TreeNodeMixin, models.Model),
+        ),
+        migrations.AlterUniqueTogether(
+            name="resourceaccess",
+            unique_together={("user", "resource", "permission")},
+        ),
+        migrations.AlterUniqueTogether(
+            name="userrole",
+            unique_together={("user", "role")},
+        ),
+        migrations.AddField(
+            model_name="resourceaccess",
+            name="group",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="resource_accesses",
+                to="core.group",
+            ),
+        ),
+        migrations.AddField(
+            model_name="usereffectivepermission",
+            name="group",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="+",
+                to="core.group",
+            ),
+        ),
+        migrations.AddField(
+            model_name="userrole",
+            name="group",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="group_roles",
+                to="core.group",
+            ),
+        ),
+        migrations.AlterUniqueTogether(
+            name="resourceaccess",
+            unique_together={
+                ("group", "resource", "permission"),
+                ("user", "resource", "permission"),
+            },
+        ),
+        migrations.AlterUniqueTogether(
+            name="userrole",
+            unique_together={("group", "role"), ("user", "role")},
+        ),
+        migrations.AddIndex(
+            model_name="usereffectivepermission",
+            index=models.Index(
+                fields=["group", "codename", "source"],
+                name="core_useref_group_i_a831fa_idx",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="resourceaccess",
+            constraint=models.CheckConstraint(
+                check=models.Q(
+                    models.Q(("group__isnull", True), ("user__isnull", False)),
+                    models.Q(("group__isnull", False), ("user__isnull", True)),
+                    _connector="OR",
+                ),
+                name="core_access_single_principal",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="userrole",
+            constraint=models.CheckConstraint(
+                check=models.Q(
+                    models.Q(("group__isnull", True), ("user__isnull", False)),
+                    models.Q(("group__isnull", False), ("user__isnull", True)),
+                    _connector="OR",
+                ),
+                name="core_userrole_single_principal",
+            ),
+        ),
+        migrations.AddField(
+            model_name="groupclosure",
+            name="ancestor",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="descendant_links",
+                to="core.group",
+            ),
+        ),
+        migrations.AddField(
+            model_name="groupclosure",
+            name="descendant",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="ancestor_links",
+                to="core.group",
+            ),
+        ),
+        migrations.AddField(
+            model_name="groupmembership",
+            name="group",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="memberships",
+                to="core.group",
+            ),
+        ),
+        migrations.AddField(
+            model_name="groupmembership",
+            name="user",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="group_memberships",
+                to=settings.AUTH_USER_MODEL,
+            ),
+        ),
+        migrations.AddField(
+            model_name="group",
+            name="members",
+            field=models.ManyToManyField(
+                related_name="member_groups",
+                through="core.GroupMembership",
+                to=settings.AUTH_USER_MODEL,
+                verbose_name="Участники",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="groupclosure",
+            index=models.Index(
+                fields=["descendant", "ancestor"], name="core_groupc_descend_59f918_idx"
+            ),
+        ),
+        migrations.AlterUniqueTogether(
+            name="groupclosure",
+            unique_together={("ancestor", "descendant")},
+        ),
+        migrations.AlterUniqueTogether(
+            name="groupmembership",
+            unique_together={("user", "group")},
+        ),
+    ]
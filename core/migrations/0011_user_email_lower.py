@@ -0,0 +1,41 @@
+# Generated by Django 5.0.2 on 2026-10-17 06:35
+
+import django.db.models.functions.text
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models.functions import Lower
+
+
+def lowercase_emails(apps, schema_editor):
+    # Дубликаты без учета регистра нужно объединить вручную до миграции
+    User = apps.get_model("core", "User")
+    duplicates = list(
+        User.objects.values(email_lower=Lower("email"))
+        .annotate(total=Count("pk"))
+        .filter(total__gt=1)
+        .values_list("email_lower", flat=True)
+    )
+    if duplicates:
+        raise RuntimeError(
+            "Email, различающиеся только регистром: %s" % ", ".join(duplicates)
+        )
+    User.objects.exclude(email=Lower("email")).update(email=Lower("email"))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("auth", "0012_alter_user_first_name_max_length"),
+        ("core", "0010_user_token_version"),
+    ]
+
+    operations = [
+        migrations.RunPython(lowercase_emails, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name="user",
+            constraint=models.UniqueConstraint(
+                django.db.models.functions.text.Lower("email"),
+                name="core_user_email_lower_uniq",
+            ),
+        ),
+    ]
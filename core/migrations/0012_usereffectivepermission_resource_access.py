@@ -0,0 +1,47 @@
+# Generated by Django 5.0.2 on 2026-10-17 06:41
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def link_direct_rows(apps, schema_editor):
+    # Строки прямого доступа связываются с доступом по получателю, ресурсу
+    # и разрешению; строки, оставшиеся от измененных или удаленных
+    # доступов, удаляются
+    ResourceAccess = apps.get_model("core", "ResourceAccess")
+    UserEffectivePermission = apps.get_model("core", "UserEffectivePermission")
+    direct = UserEffectivePermission.objects.filter(source="direct")
+    for principal in ("user", "group"):
+        direct.filter(**{f"{principal}__isnull": False}).update(
+            resource_access_id=Subquery(
+                ResourceAccess.objects.filter(
+                    **{principal: OuterRef(principal)},
+                    resource=OuterRef("resource"),
+                    permission=OuterRef("permission"),
+                ).values("pk")[:1]
+            )
+        )
+    direct.filter(resource_access__isnull=True).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0011_user_email_lower"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="usereffectivepermission",
+            name="resource_access",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="+",
+                to="core.resourceaccess",
+            ),
+        ),
+        migrations.RunPython(link_direct_rows, migrations.RunPython.noop),
+    ]
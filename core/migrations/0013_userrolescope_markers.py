@@ -0,0 +1,42 @@
+# Generated by Django 5.0.2 on 2026-10-17 06:45
+
+from django.db import migrations, models
+
+SCOPE_KINDS = {
+    "resource_types": "resource_type",
+    "owners": "owner",
+    "owner_department": "department",
+}
+
+
+def add_scope_markers(apps, schema_editor):
+    # Строка-маркер для каждого заданного вида ограничения: без нее
+    # ограничение без подходящих строк снималось, а не запрещало все
+    UserRole = apps.get_model("core", "UserRole")
+    UserRoleScope = apps.get_model("core", "UserRoleScope")
+    rows = []
+    for user_role_id, scope in UserRole.objects.values_list("id", "resource_scope"):
+        for key, kind in SCOPE_KINDS.items():
+            if (scope or {}).get(key) is not None:
+                rows.append(
+                    UserRoleScope(user_role_id=user_role_id, kind=kind, department=None)
+                )
+    UserRoleScope.objects.bulk_create(rows, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0012_usereffectivepermission_resource_access"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="userrolescope",
+            name="department",
+            field=models.CharField(
+                blank=True, max_length=100, null=True, verbose_name="Отдел владельца"
+            ),
+        ),
+        migrations.RunPython(add_scope_markers, migrations.RunPython.noop),
+    ]
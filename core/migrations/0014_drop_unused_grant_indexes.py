@@ -0,0 +1,25 @@
+# Generated by Django 5.0.2 on 2026-10-17 06:46
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0013_userrolescope_markers"),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name="resourceaccess",
+            name="core_access_no_expiry_idx",
+        ),
+        migrations.RemoveIndex(
+            model_name="resourceaccess",
+            name="core_access_expiring_idx",
+        ),
+        migrations.RemoveIndex(
+            model_name="usereffectivepermission",
+            name="core_effperm_expires_at_idx",
+        ),
+    ]
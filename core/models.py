@@ -1,17 +1,39 @@
-from django.db import models
+from django.db import models, transaction, IntegrityError
+from django.core.exceptions import ValidationError
 from django.contrib.auth.models import AbstractBaseUser, BaseUserManager, PermissionsMixin
+from django.db.models.functions import Lower
 from django.utils import timezone
 import uuid
 
 
 class UserManager(BaseUserManager):
+    @classmethod
+    def normalize_email(cls, email):
+        """Email без учета регистра: хранится и ищется в нижнем регистре"""
+        return (email or '').strip().lower()
+    
+    def by_email(self, email):
+        """Поиск по lower(email) - по уникальному функциональному индексу"""
+        return self.alias(email_lower=Lower('email')).filter(
+            email_lower=self.normalize_email(email)
+        )
+    
+    def get_by_natural_key(self, username):
+        return self.by_email(username).get()
+    
     def create_user(self, email, password=None, **extra_fields):
         if not email:
             raise ValueError('Email обязателен')
         
         email = self.normalize_email(email)
         user = self.model(email=email, **extra_fields)
-        user.set_password(password)
+        if password is None:
+            user.set_unusable_password()
+        else:
+            # Хэш вычисляется в ограниченном пуле (core/hashing.py)
+            from .hashing import hash_password
+            user.password = hash_password(password)
+            user._password = password
         user.save(using=self._db)
         return user
     
@@ -35,6 +57,7 @@ class User(AbstractBaseUser, PermissionsMixin):
     first_name = models.CharField('Имя', max_length=150, blank=True)
     last_name = models.CharField('Фамилия', max_length=150, blank=True)
     patronymic = models.CharField('Отчество', max_length=150, blank=True)
+    department = models.CharField('Отдел', max_length=100, blank=True, db_index=True)
     
     is_active = models.BooleanField('Активный', default=True)
     is_staff = models.BooleanField('Персонал', default=False)
@@ -42,6 +65,8 @@ class User(AbstractBaseUser, PermissionsMixin):
     
     date_joined = models.DateTimeField('Дата регистрации', default=timezone.now)
     last_login = models.DateTimeField('Последний вход', null=True, blank=True)
+    permission_epoch = models.PositiveIntegerField('Эпоха прав', default=0)
+    token_version = models.PositiveIntegerField('Версия токенов', default=0)
     
     objects = UserManager()
     
@@ -52,10 +77,19 @@ class User(AbstractBaseUser, PermissionsMixin):
         verbose_name = 'Пользователь'
         verbose_name_plural = 'Пользователи'
         ordering = ['-date_joined']
+        constraints = [
+            # Один пользователь на email без учета регистра; индекс по
+            # lower(email) используется при поиске (UserManager.by_email)
+            models.UniqueConstraint(Lower('email'), name='core_user_email_lower_uniq'),
+        ]
     
     def __str__(self):
         return self.email
     
+    def clean(self):
+        super().clean()
+        self.email = type(self).objects.normalize_email(self.email)
+    
     def get_full_name(self):
         return f"{self.last_name} {self.first_name} {self.patronymic}".strip()
     
@@ -101,6 +135,7 @@ class Permission(models.Model):
     )
     action = models.CharField('Действие', max_length=20, choices=ACTION_CHOICES)
     description = models.TextField('Описание', blank=True)
+    bit = models.PositiveIntegerField('Номер бита', unique=True, null=True, blank=True, editable=False)
     
     class Meta:
         verbose_name = 'Разрешение'
@@ -111,19 +146,90 @@ class Permission(models.Model):
     def __str__(self):
         return f"{self.name} ({self.resource_type.code})"
     
+    BIT_ATTEMPTS = 5
+    
     def save(self, *args, **kwargs):
         if not self.codename:
             self.codename = f"{self.action}_{self.resource_type.code}"
-        super().save(*args, **kwargs)
+        if self.bit is not None:
+            return super().save(*args, **kwargs)
+        
+        # Постоянный номер бита для битовых масок (core/bitmask.py).
+        # Одновременно созданные разрешения могут получить один номер:
+        # проигравшее сохранение повторяется со следующим свободным
+        for attempt in range(self.BIT_ATTEMPTS):
+            last_bit = Permission.objects.aggregate(models.Max('bit'))['bit__max']
+            self.bit = 0 if last_bit is None else last_bit + 1
+            try:
+                with transaction.atomic():
+                    return super().save(*args, **kwargs)
+            except IntegrityError:
+                taken = Permission.objects.filter(bit=self.bit).exists()
+                self.bit = None
+                if not taken or attempt == self.BIT_ATTEMPTS - 1:
+                    raise
+
+
+class TreeNodeMixin:
+    """
+    Узел иерархии (поле parent) с транзитивным замыканием, которое
+    обновляется при сохранении (см. core/effective.py). Циклы запрещены.
+    """
+    parent_error = 'Родитель не может быть этим объектом или его потомком'
+    
+    def get_closure_model(self):
+        raise NotImplementedError
+    
+    def clean(self):
+        super().clean()
+        self.check_parent()
+    
+    def check_parent(self):
+        """Запрещает циклы в иерархии"""
+        if self.parent_id is None or self._state.adding:
+            return
+        if self.parent_id == self.pk or self.get_closure_model().objects.filter(
+            ancestor_id=self.pk, descendant_id=self.parent_id
+        ).exists():
+            raise ValidationError({'parent': self.parent_error})
+    
+    def save(self, *args, **kwargs):
+        from .effective import attach_subtree
+        
+        adding = self._state.adding
+        previous_parent_id = None
+        if not adding:
+            previous_parent_id = type(self).objects.filter(pk=self.pk).values_list(
+                'parent_id', flat=True
+            ).first()
+        self.check_parent()
+        
+        # Флаг читается сигналом post_save (пересчет прав поддерева),
+        # поэтому замыкание существующего узла обновляется до сохранения
+        self._hierarchy_changed = not adding and previous_parent_id != self.parent_id
+        with transaction.atomic():
+            if self._hierarchy_changed:
+                attach_subtree(self)
+            super().save(*args, **kwargs)
+            if adding:
+                attach_subtree(self, adding=True)
 
 
-class Role(models.Model):
+class Role(TreeNodeMixin, models.Model):
     """Роль пользователя"""
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     name = models.CharField('Название', max_length=100, unique=True)
     code = models.CharField('Код', max_length=50, unique=True)
     description = models.TextField('Описание', blank=True)
     is_admin = models.BooleanField('Администратор', default=False)
+    parent = models.ForeignKey(
+        'self',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='children',
+        verbose_name='Родительская роль'
+    )
     permissions = models.ManyToManyField(
         Permission,
         through='RolePermission',
@@ -136,8 +242,41 @@ class Role(models.Model):
         verbose_name_plural = 'Роли'
         ordering = ['name']
     
+    parent_error = 'Родительская роль не может быть этой ролью или ее потомком'
+    
     def __str__(self):
         return self.name
+    
+    def get_closure_model(self):
+        return RoleClosure
+    
+    @property
+    def permission_mask(self):
+        """Битовая маска разрешений роли"""
+        from .bitmask import mask_from_bits
+        return mask_from_bits(self.permissions.values_list('bit', flat=True))
+
+
+class RoleClosure(models.Model):
+    """
+    Транзитивное замыкание иерархии ролей: пара (предок, потомок) для всех
+    предков роли, включая саму роль (depth=0). Поддерживается при сохранении
+    роли, см. core/effective.py
+    """
+    ancestor = models.ForeignKey(Role, on_delete=models.CASCADE, related_name='descendant_links')
+    descendant = models.ForeignKey(Role, on_delete=models.CASCADE, related_name='ancestor_links')
+    depth = models.PositiveIntegerField('Глубина')
+    
+    class Meta:
+        verbose_name = 'Связь иерархии ролей'
+        verbose_name_plural = 'Иерархия ролей'
+        unique_together = ['ancestor', 'descendant']
+        indexes = [
+            models.Index(fields=['descendant', 'ancestor']),
+        ]
+    
+    def __str__(self):
+        return f"{self.ancestor_id} -> {self.descendant_id} ({self.depth})"
 
 
 class RolePermission(models.Model):
@@ -156,10 +295,104 @@ class RolePermission(models.Model):
         return f"{self.role.name} - {self.permission.name}"
 
 
+class Group(TreeNodeMixin, models.Model):
+    """
+    Группа пользователей (команда, отдел). Группы вкладываются друг в друга:
+    участник группы считается участником всех ее родительских групп.
+    Роли и прямые доступы можно назначать группе.
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    name = models.CharField('Название', max_length=100, unique=True)
+    code = models.CharField('Код', max_length=50, unique=True)
+    description = models.TextField('Описание', blank=True)
+    parent = models.ForeignKey(
+        'self',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='children',
+        verbose_name='Родительская группа'
+    )
+    members = models.ManyToManyField(
+        User,
+        through='GroupMembership',
+        related_name='member_groups',
+        verbose_name='Участники'
+    )
+    created_at = models.DateTimeField('Создана', auto_now_add=True)
+    
+    class Meta:
+        verbose_name = 'Группа'
+        verbose_name_plural = 'Группы'
+        ordering = ['name']
+    
+    parent_error = 'Родительская группа не может быть этой группой или ее потомком'
+    
+    def __str__(self):
+        return self.name
+    
+    def get_closure_model(self):
+        return GroupClosure
+
+
+class GroupClosure(models.Model):
+    """Транзитивное замыкание иерархии групп (аналогично RoleClosure)"""
+    ancestor = models.ForeignKey(Group, on_delete=models.CASCADE, related_name='descendant_links')
+    descendant = models.ForeignKey(Group, on_delete=models.CASCADE, related_name='ancestor_links')
+    depth = models.PositiveIntegerField('Глубина')
+    
+    class Meta:
+        verbose_name = 'Связь иерархии групп'
+        verbose_name_plural = 'Иерархия групп'
+        unique_together = ['ancestor', 'descendant']
+        indexes = [
+            models.Index(fields=['descendant', 'ancestor']),
+        ]
+    
+    def __str__(self):
+        return f"{self.ancestor_id} -> {self.descendant_id} ({self.depth})"
+
+
+class GroupMembership(models.Model):
+    """Участие пользователя в группе"""
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    group = models.ForeignKey(Group, on_delete=models.CASCADE, related_name='memberships')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='group_memberships')
+    joined_at = models.DateTimeField('Добавлен', auto_now_add=True)
+    
+    class Meta:
+        verbose_name = 'Участник группы'
+        verbose_name_plural = 'Участники групп'
+        unique_together = ['user', 'group']
+    
+    def __str__(self):
+        return f"{self.user.email} - {self.group.name}"
+
+
+def member_group_ids(user_id):
+    """Подзапрос: группы пользователя, включая родительские группы его групп"""
+    return GroupClosure.objects.filter(
+        descendant__memberships__user_id=user_id
+    ).values('ancestor_id')
+
+
+def single_principal_q():
+    """Назначение адресовано либо пользователю, либо группе"""
+    return (
+        models.Q(user__isnull=False, group__isnull=True)
+        | models.Q(user__isnull=True, group__isnull=False)
+    )
+
+
 class UserRole(models.Model):
-    """Связь пользователя с ролью"""
+    """Связь пользователя (или группы) с ролью"""
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
-    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='user_roles')
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE, null=True, blank=True, related_name='user_roles'
+    )
+    group = models.ForeignKey(
+        Group, on_delete=models.CASCADE, null=True, blank=True, related_name='group_roles'
+    )
     role = models.ForeignKey(Role, on_delete=models.CASCADE, related_name='user_roles')
     assigned_at = models.DateTimeField('Назначена', auto_now_add=True)
     assigned_by = models.ForeignKey(
@@ -175,10 +408,109 @@ class UserRole(models.Model):
     class Meta:
         verbose_name = 'Роль пользователя'
         verbose_name_plural = 'Роли пользователей'
-        unique_together = ['user', 'role']
+        unique_together = [['user', 'role'], ['group', 'role']]
+        constraints = [
+            models.CheckConstraint(check=single_principal_q(), name='core_userrole_single_principal'),
+        ]
     
     def __str__(self):
-        return f"{self.user.email} - {self.role.name}"
+        principal = self.user.email if self.user_id else self.group.name
+        return f"{principal} - {self.role.name}"
+
+
+class UserRoleScope(models.Model):
+    """
+    Нормализованная область действия роли пользователя (UserRole.resource_scope).
+    Для каждого заданного вида ограничения есть строка-маркер без значения
+    (все поля цели пустые): ограничение, которому не соответствует ни одна
+    строка, запрещает все, а не снимается.
+    Поддерживается сигналами, см. core/effective.py
+    """
+    KIND_RESOURCE_TYPE = 'resource_type'
+    KIND_OWNER = 'owner'
+    KIND_DEPARTMENT = 'department'
+    KIND_CHOICES = [
+        (KIND_RESOURCE_TYPE, 'Тип ресурса'),
+        (KIND_OWNER, 'Владелец'),
+        (KIND_DEPARTMENT, 'Отдел владельца'),
+    ]
+    
+    user_role = models.ForeignKey(UserRole, on_delete=models.CASCADE, related_name='scopes')
+    kind = models.CharField('Вид ограничения', max_length=20, choices=KIND_CHOICES)
+    resource_type = models.ForeignKey(
+        ResourceType, on_delete=models.CASCADE, null=True, blank=True, related_name='+'
+    )
+    owner = models.ForeignKey(
+        User, on_delete=models.CASCADE, null=True, blank=True, related_name='+'
+    )
+    department = models.CharField('Отдел владельца', max_length=100, null=True, blank=True)
+    
+    class Meta:
+        verbose_name = 'Область действия роли'
+        verbose_name_plural = 'Области действия ролей'
+        indexes = [
+            models.Index(fields=['user_role', 'kind', 'resource_type']),
+            models.Index(fields=['user_role', 'kind', 'owner']),
+            models.Index(fields=['user_role', 'kind', 'department']),
+        ]
+    
+    def __str__(self):
+        return f"{self.user_role_id} - {self.kind}"
+
+
+def active_grant_q(now=None):
+    """Условие неистекшего доступа: срок не задан или еще не наступил"""
+    return models.Q(expires_at__isnull=True) | models.Q(expires_at__gt=now or timezone.now())
+
+
+class ResourceQuerySet(models.QuerySet):
+    def accessible_to(self, user, permission_codename=None):
+        """
+        Ресурсы, доступные пользователю, одним SQL-запросом без DISTINCT:
+        владелец или EXISTS по таблице эффективных разрешений - разрешение
+        роли на тип ресурса в области действия роли (UserRoleScope) либо
+        неистекший прямой доступ. Учитываются назначения групп пользователя.
+        Без permission_codename учитываются владение и любой прямой доступ.
+        """
+        if user.is_superuser or user.is_staff:
+            return self
+        
+        direct = models.Q(
+            source=UserEffectivePermission.SOURCE_DIRECT,
+            resource=models.OuterRef('pk')
+        ) & active_grant_q()
+        grants = UserEffectivePermission.objects.filter(
+            models.Q(user=user) | models.Q(group__in=member_group_ids(user.pk))
+        )
+        
+        if permission_codename:
+            grants = grants.filter(codename=permission_codename).filter(
+                direct | (
+                    models.Q(
+                        source=UserEffectivePermission.SOURCE_ROLE,
+                        resource_type=models.OuterRef('resource_type'),
+                        in_scope=True
+                    )
+                    & self._scope_condition(UserRoleScope.KIND_OWNER, owner=models.OuterRef(models.OuterRef('owner')))
+                    & self._scope_condition(
+                        UserRoleScope.KIND_DEPARTMENT,
+                        department=models.OuterRef(models.OuterRef('owner__department'))
+                    )
+                )
+            )
+        else:
+            grants = grants.filter(direct)
+        
+        return self.filter(models.Q(owner=user) | models.Exists(grants))
+    
+    @staticmethod
+    def _scope_condition(kind, **match):
+        """
+        Ограничения данного вида у роли нет (нет даже строки-маркера),
+        либо ресурс соответствует одной из его строк
+        """
+        scopes = UserRoleScope.objects.filter(user_role=models.OuterRef('user_role'), kind=kind)
+        return ~models.Exists(scopes) | models.Exists(scopes.filter(**match))
 
 
 class Resource(models.Model):
@@ -203,6 +535,8 @@ class Resource(models.Model):
     updated_at = models.DateTimeField('Обновлен', auto_now=True)
     is_active = models.BooleanField('Активный', default=True)
     
+    objects = ResourceQuerySet.as_manager()
+    
     class Meta:
         verbose_name = 'Ресурс'
         verbose_name_plural = 'Ресурсы'
@@ -215,10 +549,23 @@ class Resource(models.Model):
         return self.name
 
 
+class ResourceAccessQuerySet(models.QuerySet):
+    def active(self, now=None):
+        return self.filter(active_grant_q(now))
+    
+    def expired(self, now=None):
+        return self.filter(expires_at__lte=now or timezone.now())
+
+
 class ResourceAccess(models.Model):
-    """Прямой доступ к ресурсу"""
+    """Прямой доступ пользователя (или группы) к ресурсу"""
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
-    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='resource_accesses')
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE, null=True, blank=True, related_name='resource_accesses'
+    )
+    group = models.ForeignKey(
+        Group, on_delete=models.CASCADE, null=True, blank=True, related_name='resource_accesses'
+    )
     resource = models.ForeignKey(Resource, on_delete=models.CASCADE, related_name='accesses')
     permission = models.ForeignKey(Permission, on_delete=models.CASCADE, related_name='resource_accesses')
     granted_at = models.DateTimeField('Предоставлен', auto_now_add=True)
@@ -233,13 +580,28 @@ class ResourceAccess(models.Model):
     conditions = models.JSONField('Условия', default=dict, blank=True)
     expires_at = models.DateTimeField('Истекает', null=True, blank=True)
     
+    objects = ResourceAccessQuerySet.as_manager()
+    
     class Meta:
         verbose_name = 'Доступ к ресурсу'
         verbose_name_plural = 'Доступы к ресурсам'
-        unique_together = ['user', 'resource', 'permission']
+        unique_together = [['user', 'resource', 'permission'], ['group', 'resource', 'permission']]
+        constraints = [
+            models.CheckConstraint(check=single_principal_q(), name='core_access_single_principal'),
+        ]
+        # Права читаются из UserEffectivePermission; здесь нужен только
+        # индекс для очистки истекших доступов
+        indexes = [
+            models.Index(
+                fields=['expires_at'],
+                condition=models.Q(expires_at__isnull=False),
+                name='core_access_expires_at_idx'
+            ),
+        ]
     
     def __str__(self):
-        return f"{self.user.email} - {self.resource.name} - {self.permission.name}"
+        principal = self.user.email if self.user_id else self.group.name
+        return f"{principal} - {self.resource.name} - {self.permission.name}"
     
     def is_expired(self):
         if self.expires_at:
@@ -247,6 +609,55 @@ class ResourceAccess(models.Model):
         return False
 
 
+class UserEffectivePermission(models.Model):
+    """
+    Эффективное разрешение пользователя или группы (денормализованная таблица).
+    Строки групп не размножаются по участникам: участник получает их
+    через замыкание групп (member_group_ids).
+    Поддерживается сигналами, см. core/effective.py
+    """
+    SOURCE_ROLE = 'role'
+    SOURCE_DIRECT = 'direct'
+    SOURCE_CHOICES = [
+        (SOURCE_ROLE, 'Роль'),
+        (SOURCE_DIRECT, 'Прямой доступ'),
+    ]
+    
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE, null=True, blank=True, related_name='effective_permissions'
+    )
+    group = models.ForeignKey(Group, on_delete=models.CASCADE, null=True, blank=True, related_name='+')
+    permission = models.ForeignKey(Permission, on_delete=models.CASCADE, related_name='+')
+    codename = models.CharField('Кодовое имя', max_length=100)
+    resource_type = models.ForeignKey(ResourceType, on_delete=models.CASCADE, related_name='+')
+    source = models.CharField('Источник', max_length=20, choices=SOURCE_CHOICES)
+    user_role = models.ForeignKey(UserRole, on_delete=models.CASCADE, null=True, blank=True, related_name='+')
+    role = models.ForeignKey(Role, on_delete=models.CASCADE, null=True, blank=True, related_name='+')
+    resource = models.ForeignKey(Resource, on_delete=models.CASCADE, null=True, blank=True, related_name='+')
+    # Прямой доступ, из которого получена строка: при изменении доступа
+    # строка обновляется, при удалении - удаляется каскадом
+    resource_access = models.ForeignKey(
+        ResourceAccess, on_delete=models.CASCADE, null=True, blank=True, related_name='+'
+    )
+    scope = models.JSONField('Область действия', default=dict, blank=True)
+    in_scope = models.BooleanField('Тип ресурса в области действия', default=True)
+    conditions = models.JSONField('Условия', default=dict, blank=True)
+    expires_at = models.DateTimeField('Истекает', null=True, blank=True)
+    
+    class Meta:
+        verbose_name = 'Эффективное разрешение'
+        verbose_name_plural = 'Эффективные разрешения'
+        indexes = [
+            models.Index(fields=['user', 'codename', 'source']),
+            models.Index(fields=['group', 'codename', 'source']),
+            models.Index(fields=['role', 'permission']),
+            models.Index(fields=['resource', 'user']),
+        ]
+    
+    def __str__(self):
+        return f"{self.user_id or self.group_id} - {self.codename} ({self.source})"
+
+
 class AuditLog(models.Model):
     """Лог действий пользователей"""
     ACTION_CHOICES = [
@@ -1,7 +1,14 @@
+from django.db import models
 from rest_framework import permissions
 from rest_framework.exceptions import AuthenticationFailed, PermissionDenied
-from .models import Permission as CustomPermission, UserRole, ResourceAccess, Resource
-from django.utils import timezone
+from .models import Resource, User
+from .snapshot import get_permission_snapshot, get_permission_snapshots
+from .bitmask import mask_has
+from .conditions import ConditionContext, compile_conditions
+from .tokens import get_authz_claims, claims_decide
+from .decisions import (
+    cached_decision, resource_target, TARGET_PERMISSION, ADMIN_CODENAME
+)
 
 
 class IsAuthenticated(permissions.BasePermission):
@@ -33,8 +40,15 @@ class HasPermission(permissions.BasePermission):
         if request.user.is_superuser or request.user.is_staff:
             return True
         
-        # Проверяем наличие разрешения у пользователя
-        return self._check_user_permission(request.user, self.permission_codename)
+        # Режим без состояния: решаем по утверждениям токена
+        claims = get_authz_claims(request)
+        if claims is not None:
+            decision = claims_decide(claims, self.permission_codename)
+            if decision is not None:
+                return decision
+        
+        # Проверяем наличие разрешения у пользователя (через кэш решений)
+        return self._cached_user_permission(request)
     
     def has_object_permission(self, request, view, obj):
         if not request.user.is_authenticated:
@@ -45,109 +59,119 @@ class HasPermission(permissions.BasePermission):
         
         # Если объект является ресурсом, проверяем доступ к нему
         if isinstance(obj, Resource):
-            return self._check_resource_permission(
-                request.user,
-                obj,
-                self.permission_codename
+            return cached_decision(
+                request, request.user, self.permission_codename, resource_target(obj),
+                lambda: self._check_resource_permission(request.user, obj, self.permission_codename)
             )
         
-        return self._check_user_permission(request.user, self.permission_codename)
+        return self._cached_user_permission(request)
     
-    def _check_user_permission(self, user, permission_codename):
-        # Проверяем разрешения через роли пользователя
-        user_roles = UserRole.objects.filter(user=user)
+    def _cached_user_permission(self, request):
+        return cached_decision(
+            request, request.user, self.permission_codename, TARGET_PERMISSION,
+            lambda: self._check_user_permission(request.user, self.permission_codename, request)
+        )
+    
+    def _check_user_permission(self, user, permission_codename, request=None, snapshot=None):
+        snapshot = snapshot or get_permission_snapshot(user)
+        context = ConditionContext(user, request)
         
-        for user_role in user_roles:
-            # Проверяем разрешения роли
-            role_permissions = user_role.role.permissions.filter(
-                codename=permission_codename
-            )
-            
-            if role_permissions.exists():
-                # Проверяем условия
-                role_permission = user_role.role_permissions.filter(
-                    permission__codename=permission_codename
-                ).first()
-                
-                if role_permission:
-                    conditions = role_permission.conditions
-                    if self._check_conditions(user, conditions):
-                        return True
+        # Разрешения ролей без условий - побитовое И по маске
+        if mask_has(snapshot.permission_mask, permission_codename):
+            return True
         
-        # Проверяем прямые разрешения пользователя
-        direct_permissions = user.resource_accesses.filter(
-            permission__codename=permission_codename,
-            expires_at__gt=timezone.now()
-        )
+        # Проверяем разрешения через роли пользователя
+        for grant in snapshot.role_permissions.get(permission_codename, ()):
+            if self._check_conditions(context, grant):
+                return True
         
-        for access in direct_permissions:
-            if not access.is_expired() and self._check_conditions(user, access.conditions):
+        # Проверяем прямые разрешения пользователя
+        for grant in snapshot.active_direct_grants(permission_codename):
+            if self._check_conditions(context, grant):
                 return True
         
         return False
     
     def _check_resource_permission(self, user, resource, permission_codename):
-        # Проверяем, является ли пользователь владельцем
-        if resource.owner == user:
-            return True
-        
-        # Проверяем доступ через роли с учетом области действия
-        user_roles = UserRole.objects.filter(user=user)
-        
-        for user_role in user_roles:
-            # Проверяем область действия роли
-            resource_scope = user_role.resource_scope
-            if self._check_resource_scope(resource, resource_scope):
-                # Проверяем разрешения роли для этого типа ресурса
-                role_permissions = user_role.role.permissions.filter(
-                    codename=permission_codename,
-                    resource_type=resource.resource_type
-                )
-                
-                if role_permissions.exists():
-                    return True
-        
-        # Проверяем прямой доступ к ресурсу
-        direct_access = ResourceAccess.objects.filter(
-            user=user,
-            resource=resource,
-            permission__codename=permission_codename,
-            expires_at__gt=timezone.now()
-        ).exists()
-        
-        return direct_access
+        return bool(self._filter_resources(user, [resource], permission_codename))
     
-    def _check_conditions(self, user, conditions):
-        """Проверяет условия доступа"""
-        if not conditions:
-            return True
+    def _filter_resources(self, user, resources, permission_codename,
+                          snapshot=None, owner_departments=None):
+        """
+        Возвращает ресурсы, к которым у пользователя есть разрешение.
+        Не выполняет запросов, кроме построения снимка прав.
+        owner_departments - заранее загруженные {owner_id: отдел}.
+        """
+        resources = list(resources)
+        if not resources:
+            return []
         
-        # Пример проверки условий (можно расширять)
-        if 'time_restriction' in conditions:
-            # Проверка временных ограничений
-            pass
+        snapshot = snapshot or get_permission_snapshot(user)
+        role_grants = snapshot.role_permissions.get(permission_codename, ())
+        direct_resource_ids = {
+            grant.resource_id
+            for grant in snapshot.active_direct_grants(permission_codename)
+        }
         
-        if 'department' in conditions:
-            # Проверка отдела
-            pass
+        # Отделы владельцев нужны только для ролей с ограничением по отделу,
+        # загружаются одним запросом на всю пачку ресурсов
+        if owner_departments is None and any(
+            grant.scope and grant.scope.departments is not None for grant in role_grants
+        ):
+            owner_departments = dict(User.objects.filter(
+                pk__in={resource.owner_id for resource in resources}
+            ).values_list('pk', 'department'))
         
-        return True
+        allowed = []
+        for resource in resources:
+            # Владелец ресурса
+            if resource.owner_id == user.pk:
+                allowed.append(resource)
+            # Прямой доступ к ресурсу
+            elif resource.pk in direct_resource_ids:
+                allowed.append(resource)
+            # Доступ через роли с учетом области действия
+            elif any(
+                grant.resource_type_id == resource.resource_type_id
+                and self._check_resource_scope(resource, grant.scope, owner_departments)
+                for grant in role_grants
+            ):
+                allowed.append(resource)
+        
+        return allowed
     
-    def _check_resource_scope(self, resource, resource_scope):
-        """Проверяет область действия роли для ресурса"""
-        if not resource_scope:
+    def _check_conditions(self, context, grant):
+        """Проверяет условия доступа скомпилированным предикатом"""
+        if not grant.conditions_key:
             return True
         
-        # Пример: проверка по типу ресурса
-        if 'resource_types' in resource_scope:
-            allowed_types = resource_scope['resource_types']
-            if str(resource.resource_type.id) not in allowed_types:
-                return False
+        return compile_conditions(grant.conditions, grant.conditions_key)(context)
+    
+    def _check_resource_scope(self, resource, scope, owner_departments=None):
+        """
+        Проверяет область действия роли для ресурса поиском в множествах
+        (см. snapshot.compile_scope), не загружая связанные объекты.
+        owner_departments - {owner_id: отдел} для ограничений по отделу владельца.
+        """
+        if scope is None:
+            return True
+        
+        # Проверка по типу ресурса
+        if scope.resource_types is not None and str(resource.resource_type_id) not in scope.resource_types:
+            return False
         
-        # Пример: проверка по владельцу
-        if 'owner_department' in resource_scope:
-            # Проверка отдела владельца
-            pass
+        # Проверка по владельцу
+        if scope.owners is not None and str(resource.owner_id) not in scope.owners:
+            return False
+        
+        # Проверка отдела владельца
+        if scope.departments is not None:
+            if owner_departments is None:
+                owner_departments = dict(User.objects.filter(
+                    pk=resource.owner_id
+                ).values_list('pk', 'department'))
+            if owner_departments.get(resource.owner_id, '') not in scope.departments:
+                return False
         
         return True
 
@@ -163,7 +187,14 @@ class IsAdmin(permissions.BasePermission):
             return True
         
         # Проверяем администраторскую роль
-        return request.user.user_roles.filter(role__is_admin=True).exists()
+        claims = get_authz_claims(request)
+        if claims is not None:
+            return claims['adm']
+        
+        return cached_decision(
+            request, request.user, ADMIN_CODENAME, TARGET_PERMISSION,
+            lambda: get_permission_snapshot(request.user).is_admin
+        )
 
 
 class IsOwnerOrHasPermission(permissions.BasePermission):
@@ -174,8 +205,11 @@ class IsOwnerOrHasPermission(permissions.BasePermission):
         self.permission_codename = permission_codename
     
     def has_object_permission(self, request, view, obj):
-        # Владелец всегда имеет доступ
-        if hasattr(obj, 'owner') and obj.owner == request.user:
+        # Владелец всегда имеет доступ (по owner_id, без загрузки владельца)
+        if hasattr(obj, 'owner_id'):
+            if obj.owner_id == request.user.pk:
+                return True
+        elif hasattr(obj, 'owner') and obj.owner == request.user:
             return True
         
         # Проверяем конкретное разрешение
@@ -183,4 +217,87 @@ class IsOwnerOrHasPermission(permissions.BasePermission):
             permission_checker = HasPermission(self.permission_codename)
             return permission_checker.has_object_permission(request, view, obj)
         
-        return False
\ No newline at end of file
+        return False
+
+
+def check_many(user, resources, permission_codename):
+    """
+    Пакетная проверка доступа к ресурсам.
+    Возвращает подмножество resources, доступное пользователю, за постоянное
+    число запросов независимо от количества ресурсов.
+    """
+    if not user or not user.is_authenticated:
+        return []
+    
+    resources = list(resources)
+    if user.is_superuser or user.is_staff:
+        return resources
+    
+    return HasPermission(permission_codename)._filter_resources(
+        user, resources, permission_codename
+    )
+
+
+def check_batch(checks, request=None):
+    """
+    Пакетная проверка кортежей (subject_id, resource_id, permission_codename)
+    с семантикой HasPermission: resource_id=None - проверка разрешения
+    (has_permission), иначе - доступа к ресурсу (has_object_permission).
+    Возвращает список решений в порядке checks за постоянное число запросов:
+    пользователи, ресурсы с отделами владельцев и снимки прав (пакетом).
+    request - запрос вызывающего; используется как контекст условий только
+    для проверок, где субъект совпадает с вызывающим пользователем.
+    """
+    checks = list(checks)
+    subjects = User.objects.in_bulk({subject_id for subject_id, _, _ in checks})
+    resources = {
+        resource.pk: resource
+        for resource in Resource.objects.filter(
+            pk__in={resource_id for _, resource_id, _ in checks if resource_id}
+        ).annotate(owner_department=models.F('owner__department'))
+    }
+    owner_departments = {
+        resource.owner_id: resource.owner_department for resource in resources.values()
+    }
+    snapshots = get_permission_snapshots(
+        user.pk for user in subjects.values()
+        if user.is_active and not (user.is_superuser or user.is_staff)
+    )
+    caller = getattr(request, 'user', None)
+    
+    # Ресурсы группируются по (субъект, разрешение), чтобы проверить их
+    # одним вызовом _filter_resources
+    resource_checks = {}
+    decisions = []
+    for index, (subject_id, resource_id, codename) in enumerate(checks):
+        user = subjects.get(subject_id)
+        if user is None or not user.is_active:
+            decisions.append(False)
+        elif user.is_superuser or user.is_staff:
+            decisions.append(True)
+        elif resource_id is None:
+            checker = HasPermission(codename)
+            decisions.append(checker._check_user_permission(
+                user, codename,
+                request if caller is not None and caller.pk == user.pk else None,
+                snapshots[user.pk],
+            ))
+        elif resource_id not in resources:
+            decisions.append(False)
+        else:
+            decisions.append(False)
+            resource_checks.setdefault((user.pk, codename), []).append(index)
+    
+    for (user_id, codename), indexes in resource_checks.items():
+        allowed = HasPermission(codename)._filter_resources(
+            subjects[user_id],
+            {resources[checks[index][1]] for index in indexes},
+            codename,
+            snapshot=snapshots[user_id],
+            owner_departments=owner_departments,
+        )
+        allowed_ids = {resource.pk for resource in allowed}
+        for index in indexes:
+            decisions[index] = checks[index][1] in allowed_ids
+    
+    return decisions
@@ -1,9 +1,15 @@
+from django.conf import settings
+from django.db import IntegrityError, transaction
 from rest_framework import serializers
+from rest_framework_simplejwt.serializers import TokenRefreshSerializer as BaseTokenRefreshSerializer
 from django.utils.translation import gettext_lazy as _
 from .models import (
-    User, Role, Permission, UserRole, ResourceType,
-    Resource, ResourceAccess, AuditLog
+    User, Role, RoleClosure, Permission, UserRole, ResourceType,
+    Resource, ResourceAccess, AuditLog, Group, GroupClosure, GroupMembership
 )
+from .tokens import AuthzRefreshToken
+from .hashing import check_user_password
+from .effective import subtree_ids
 import re
 
 
@@ -27,14 +33,14 @@ class RegisterSerializer(serializers.ModelSerializer):
         model = User
         fields = ('email', 'password', 'password2', 'first_name', 'last_name', 'patronymic')
         extra_kwargs = {
+            # Уникальность проверяет сама вставка (см. create), без отдельного запроса
+            'email': {'validators': []},
             'first_name': {'required': True},
             'last_name': {'required': True},
         }
     
     def validate_email(self, value):
-        if User.objects.filter(email=value).exists():
-            raise serializers.ValidationError("Пользователь с таким email уже существует")
-        return value
+        return User.objects.normalize_email(value)
     
     def validate_password(self, value):
         # Проверка сложности пароля
@@ -53,7 +59,15 @@ class RegisterSerializer(serializers.ModelSerializer):
     
     def create(self, validated_data):
         validated_data.pop('password2')
-        user = User.objects.create_user(**validated_data)
+        # Одна вставка вместо проверки и вставки: одновременные регистрации
+        # с одним email упираются в уникальный индекс по lower(email)
+        try:
+            with transaction.atomic():
+                user = User.objects.create_user(**validated_data)
+        except IntegrityError:
+            raise serializers.ValidationError(
+                {'email': ["Пользователь с таким email уже существует"]}
+            )
         return user
 
 
@@ -71,13 +85,13 @@ class LoginSerializer(serializers.Serializer):
         
         if email and password:
             try:
-                user = User.objects.get(email=email)
+                user = User.objects.by_email(email).get()
             except User.DoesNotExist:
                 msg = _('Неверный email или пароль')
                 raise serializers.ValidationError(msg, code='authorization')
             
-            # Проверяем пароль с помощью check_password
-            if not user.check_password(password):
+            # Проверяем пароль в пуле хэширования (с перехэшированием при смене хэшера)
+            if not check_user_password(user, password):
                 msg = _('Неверный email или пароль')
                 raise serializers.ValidationError(msg, code='authorization')
             
@@ -93,6 +107,11 @@ class LoginSerializer(serializers.Serializer):
         return data
 
 
+class TokenRefreshSerializer(BaseTokenRefreshSerializer):
+    """Обновление токена с актуальными утверждениями авторизации"""
+    token_class = AuthzRefreshToken
+
+
 class UserSerializer(serializers.ModelSerializer):
     full_name = serializers.SerializerMethodField()
     roles = serializers.SerializerMethodField()
@@ -101,10 +120,10 @@ class UserSerializer(serializers.ModelSerializer):
         model = User
         fields = (
             'id', 'email', 'first_name', 'last_name', 'patronymic',
-            'full_name', 'is_active', 'date_joined', 'last_login',
+            'department', 'full_name', 'is_active', 'date_joined', 'last_login',
             'roles'
         )
-        read_only_fields = ('id', 'email', 'is_active', 'date_joined', 'last_login')
+        read_only_fields = ('id', 'email', 'department', 'is_active', 'date_joined', 'last_login')
     
     def get_full_name(self, obj):
         return obj.get_full_name()
@@ -147,7 +166,15 @@ class RoleSerializer(serializers.ModelSerializer):
     
     class Meta:
         model = Role
-        fields = ('id', 'name', 'code', 'description', 'is_admin', 'permissions', 'permissions_ids')
+        fields = ('id', 'name', 'code', 'description', 'is_admin', 'parent', 'permissions', 'permissions_ids')
+    
+    def validate_parent(self, value):
+        if value is not None and self.instance is not None:
+            if value.pk in subtree_ids(RoleClosure, [self.instance.pk]):
+                raise serializers.ValidationError(
+                    "Родительская роль не может быть этой ролью или ее потомком"
+                )
+        return value
     
     def create(self, validated_data):
         permissions_ids = validated_data.pop('permissions_ids', [])
@@ -170,16 +197,61 @@ class RoleSerializer(serializers.ModelSerializer):
         return role
 
 
+def _check_single_principal(data, instance=None):
+    """Назначение адресуется либо пользователю, либо группе"""
+    user = data.get('user', getattr(instance, 'user', None))
+    group = data.get('group', getattr(instance, 'group', None))
+    if (user is None) == (group is None):
+        raise serializers.ValidationError("Укажите либо пользователя, либо группу")
+
+
+class GroupSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Group
+        fields = ('id', 'name', 'code', 'description', 'parent', 'created_at')
+        read_only_fields = ('created_at',)
+    
+    def validate_parent(self, value):
+        if value is not None and self.instance is not None:
+            if value.pk in subtree_ids(GroupClosure, [self.instance.pk]):
+                raise serializers.ValidationError(
+                    "Родительская группа не может быть этой группой или ее потомком"
+                )
+        return value
+
+
+class GroupMembershipSerializer(serializers.ModelSerializer):
+    user_email = serializers.EmailField(source='user.email', read_only=True)
+    group_name = serializers.CharField(source='group.name', read_only=True)
+    
+    class Meta:
+        model = GroupMembership
+        fields = ('id', 'group', 'user', 'user_email', 'group_name', 'joined_at')
+        read_only_fields = ('joined_at',)
+
+
 class UserRoleSerializer(serializers.ModelSerializer):
+    # default=None: иначе проверка unique_together делает оба поля обязательными
+    user = serializers.PrimaryKeyRelatedField(
+        queryset=User.objects.all(), allow_null=True, default=None
+    )
+    group = serializers.PrimaryKeyRelatedField(
+        queryset=Group.objects.all(), allow_null=True, default=None
+    )
     user_email = serializers.EmailField(source='user.email', read_only=True)
+    group_name = serializers.CharField(source='group.name', read_only=True)
     role_name = serializers.CharField(source='role.name', read_only=True)
     
     class Meta:
         model = UserRole
-        fields = ('id', 'user', 'role', 'user_email', 'role_name',
+        fields = ('id', 'user', 'group', 'role', 'user_email', 'group_name', 'role_name',
                  'assigned_at', 'assigned_by', 'resource_scope')
         read_only_fields = ('assigned_at', 'assigned_by')
     
+    def validate(self, data):
+        _check_single_principal(data, self.instance)
+        return data
+    
     def create(self, validated_data):
         validated_data['assigned_by'] = self.context['request'].user
         return super().create(validated_data)
@@ -210,20 +282,30 @@ class ResourceSerializer(serializers.ModelSerializer):
 
 
 class ResourceAccessSerializer(serializers.ModelSerializer):
+    # default=None: иначе проверка unique_together делает оба поля обязательными
+    user = serializers.PrimaryKeyRelatedField(
+        queryset=User.objects.all(), allow_null=True, default=None
+    )
+    group = serializers.PrimaryKeyRelatedField(
+        queryset=Group.objects.all(), allow_null=True, default=None
+    )
     user_email = serializers.EmailField(source='user.email', read_only=True)
+    group_name = serializers.CharField(source='group.name', read_only=True)
     resource_name = serializers.CharField(source='resource.name', read_only=True)
     permission_name = serializers.CharField(source='permission.name', read_only=True)
     
     class Meta:
         model = ResourceAccess
         fields = (
-            'id', 'user', 'resource', 'permission', 'user_email',
-            'resource_name', 'permission_name', 'granted_at',
+            'id', 'user', 'group', 'resource', 'permission', 'user_email',
+            'group_name', 'resource_name', 'permission_name', 'granted_at',
             'granted_by', 'conditions', 'expires_at'
         )
         read_only_fields = ('granted_at', 'granted_by')
     
     def validate(self, data):
+        _check_single_principal(data, self.instance)
+        
         # Проверяем, что у пользователя есть доступ на предоставление такого разрешения
         request_user = self.context['request'].user
         permission = data.get('permission')
@@ -240,6 +322,23 @@ class ResourceAccessSerializer(serializers.ModelSerializer):
         return super().create(validated_data)
 
 
+class AuthzCheckItemSerializer(serializers.Serializer):
+    subject = serializers.UUIDField(required=False)
+    resource_id = serializers.UUIDField(required=False, allow_null=True, default=None)
+    permission = serializers.CharField(max_length=100)
+
+
+class AuthzCheckSerializer(serializers.Serializer):
+    checks = AuthzCheckItemSerializer(many=True, allow_empty=False)
+    
+    def validate_checks(self, value):
+        if len(value) > settings.AUTHZ_CHECK_MAX_BATCH:
+            raise serializers.ValidationError(
+                f"Не более {settings.AUTHZ_CHECK_MAX_BATCH} проверок в одном запросе"
+            )
+        return value
+
+
 class AuditLogSerializer(serializers.ModelSerializer):
     user_email = serializers.EmailField(source='user.email', read_only=True)
     
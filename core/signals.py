@@ -0,0 +1,246 @@
+"""
+Сигналы для поддержки таблицы эффективных разрешений и сброса
+кэшированных прав пользователей.
+"""
+
+from django.db import transaction
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete, m2m_changed
+from django.dispatch import receiver
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+
+from .models import (
+    User, Role, RoleClosure, Permission, RolePermission, UserRole, ResourceAccess,
+    UserEffectivePermission, Group, GroupClosure, GroupMembership
+)
+from .effective import (
+    sync_effective_permissions, add_role_permissions, remove_role_permissions,
+    sync_direct_grant, sync_user_role_scopes,
+    subtree_ids, detach_subtree, group_members
+)
+from .bitmask import invalidate_permission_bits
+from .snapshot import invalidate_permission_snapshots, bump_permission_epoch
+from .decisions import bump_global_version
+from .authentication import invalidate_cached_users
+from .blacklist import token_blacklisted
+
+
+def _invalidate_users(user_ids):
+    user_ids = list(user_ids)
+    bump_permission_epoch(user_ids)
+    # Сбрасываем и сразу, и после коммита, чтобы конкурентный запрос
+    # не успел закэшировать данные незавершенной транзакции
+    invalidate_permission_snapshots(user_ids)
+    transaction.on_commit(lambda: invalidate_permission_snapshots(user_ids))
+
+
+def _invalidate_principals(user_ids, group_ids):
+    _invalidate_users(set(user_ids) | set(group_members(group_ids)))
+
+
+def _principal(instance):
+    """Пользователь или группа назначения: ([user_id], []) либо ([], [group_id])"""
+    if instance.user_id:
+        return [instance.user_id], []
+    return [], [instance.group_id]
+
+
+def _previous_principals(sender, instance):
+    """
+    Прежние (user_id, group_id) сохраняемой записи, если они изменились
+    (вызывается в pre_save, пока в базе старое значение)
+    """
+    if instance._state.adding:
+        return []
+    return list(sender.objects.filter(pk=instance.pk).exclude(
+        user_id=instance.user_id, group_id=instance.group_id
+    ).values_list('user_id', 'group_id'))
+
+
+def _split_principals(rows):
+    user_ids, group_ids = set(), set()
+    for user_id, group_id in rows:
+        if user_id:
+            user_ids.add(user_id)
+        else:
+            group_ids.add(group_id)
+    return user_ids, group_ids
+
+
+def _role_holders(role_ids):
+    """Пользователи и группы с ролями role_ids или их ролями-потомками"""
+    return _split_principals(UserRole.objects.filter(
+        role__ancestor_links__ancestor_id__in=role_ids
+    ).values_list('user_id', 'group_id'))
+
+
+def _invalidate_all_decisions():
+    # Изменения ролей, разрешений и групп затрагивают многих пользователей:
+    # кэш решений сбрасывается сменой глобальной версии (и после коммита)
+    bump_global_version()
+    transaction.on_commit(bump_global_version)
+
+
+def _sync_role_holders(user_ids, group_ids):
+    sync_effective_permissions(
+        user_ids, sources=[UserEffectivePermission.SOURCE_ROLE], group_ids=group_ids
+    )
+    _invalidate_principals(user_ids, group_ids)
+
+
+@receiver([post_save, post_delete], sender=User)
+def user_changed(sender, instance, **kwargs):
+    # Кэш пользователя для аутентификации (деактивация действует сразу)
+    invalidate_cached_users([instance.pk])
+
+
+@receiver(post_save, sender=BlacklistedToken)
+def blacklisted_token_saved(sender, instance, created, **kwargs):
+    if created:
+        token_blacklisted(instance)
+
+
+@receiver(pre_save, sender=UserRole)
+def user_role_saving(sender, instance, **kwargs):
+    instance._previous_principals = _previous_principals(sender, instance)
+
+
+@receiver(post_save, sender=UserRole)
+def user_role_saved(sender, instance, **kwargs):
+    sync_user_role_scopes(instance)
+    # Права теряет и прежний держатель роли, если он сменился
+    _sync_role_holders(*_split_principals([
+        (instance.user_id, instance.group_id),
+        *getattr(instance, '_previous_principals', ()),
+    ]))
+
+
+@receiver(post_delete, sender=UserRole)
+def user_role_changed(sender, instance, **kwargs):
+    _sync_role_holders(*_principal(instance))
+
+
+@receiver(post_save, sender=ResourceAccess)
+def resource_access_saved(sender, instance, **kwargs):
+    # Права теряет и прежний получатель доступа, если он сменился
+    previous = sync_direct_grant(instance)
+    _invalidate_principals(*_split_principals(
+        [(instance.user_id, instance.group_id), *previous]
+    ))
+
+
+@receiver(post_delete, sender=ResourceAccess)
+def resource_access_deleted(sender, instance, **kwargs):
+    # Строка UserEffectivePermission уже удалена каскадом
+    _invalidate_principals(*_principal(instance))
+
+
+@receiver([post_save, post_delete], sender=RolePermission)
+def role_permission_changed(sender, instance, **kwargs):
+    _invalidate_all_decisions()
+    _sync_role_holders(*_role_holders([instance.role_id]))
+
+
+@receiver(post_save, sender=Role)
+def role_changed(sender, instance, **kwargs):
+    _invalidate_all_decisions()
+    holders = _role_holders([instance.pk])
+    if getattr(instance, '_hierarchy_changed', False):
+        _sync_role_holders(*holders)
+    else:
+        _invalidate_principals(*holders)
+
+
+@receiver(pre_delete, sender=Role)
+def role_deleting(sender, instance, **kwargs):
+    # После удаления замыкание роли уже не найти: запоминаем держателей
+    # потомков и отвязываем поддерево (дочерние роли становятся корневыми)
+    instance._affected = _role_holders(subtree_ids(RoleClosure, [instance.pk]) - {instance.pk})
+    detach_subtree(RoleClosure, instance.pk)
+
+
+@receiver(post_delete, sender=Role)
+def role_deleted(sender, instance, **kwargs):
+    _invalidate_all_decisions()
+    _sync_role_holders(*getattr(instance, '_affected', ((), ())))
+
+
+@receiver(pre_save, sender=GroupMembership)
+def group_membership_saving(sender, instance, **kwargs):
+    instance._previous_principals = _previous_principals(sender, instance)
+
+
+@receiver([post_save, post_delete], sender=GroupMembership)
+def group_membership_changed(sender, instance, **kwargs):
+    # Строки групп не зависят от состава: достаточно сбросить права участника,
+    # в том числе прежнего, если участник записи сменился
+    previous = getattr(instance, '_previous_principals', ())
+    _invalidate_users({instance.user_id, *(user_id for user_id, _ in previous)})
+
+
+@receiver(post_save, sender=Group)
+def group_changed(sender, instance, **kwargs):
+    if getattr(instance, '_hierarchy_changed', False):
+        _invalidate_all_decisions()
+        _invalidate_users(group_members([instance.pk]))
+
+
+@receiver(pre_delete, sender=Group)
+def group_deleting(sender, instance, **kwargs):
+    instance._affected_users = group_members([instance.pk])
+    detach_subtree(GroupClosure, instance.pk)
+
+
+@receiver(post_delete, sender=Group)
+def group_deleted(sender, instance, **kwargs):
+    _invalidate_all_decisions()
+    _invalidate_users(getattr(instance, '_affected_users', []))
+
+
+@receiver(post_delete, sender=Permission)
+def permission_deleted(sender, instance, **kwargs):
+    _invalidate_all_decisions()
+    invalidate_permission_bits()
+
+
+@receiver(post_save, sender=Permission)
+def permission_changed(sender, instance, created, **kwargs):
+    invalidate_permission_bits()
+    _invalidate_all_decisions()
+    if created:
+        return
+    # Кодовое имя и тип ресурса денормализованы в UserEffectivePermission
+    user_ids, group_ids = _role_holders(instance.roles.values_list('pk', flat=True))
+    direct_user_ids, direct_group_ids = _split_principals(
+        instance.resource_accesses.values_list('user_id', 'group_id')
+    )
+    user_ids |= direct_user_ids
+    group_ids |= direct_group_ids
+    sync_effective_permissions(user_ids, group_ids=group_ids)
+    _invalidate_principals(user_ids, group_ids)
+
+
+@receiver(m2m_changed, sender=Role.permissions.through)
+def role_permissions_set(sender, instance, action, reverse, pk_set, **kwargs):
+    # role.permissions.set()/add()/remove() не вызывают post_save у RolePermission.
+    # set() сам вычисляет разницу и передает в pk_set только изменения,
+    # поэтому таблица обновляется только по добавленным и удаленным разрешениям.
+    # pre_clear: после очистки связи роли с разрешением уже не найти
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+
+    if reverse:
+        # instance - разрешение, pk_set - роли
+        role_ids = pk_set or list(instance.roles.values_list('pk', flat=True))
+        changes = [(role_id, [instance.pk]) for role_id in role_ids]
+    else:
+        role_ids = [instance.pk]
+        changes = [(instance.pk, pk_set)]
+
+    _invalidate_all_decisions()
+    for role_id, permission_ids in changes:
+        if action == 'post_add':
+            add_role_permissions(role_id, permission_ids)
+        else:
+            remove_role_permissions(role_id, permission_ids)
+
+    _invalidate_principals(*_role_holders(role_ids))
@@ -0,0 +1,377 @@
+"""
+Снимок эффективных прав пользователя.
+
+Снимок строится одним-двумя запросами, хранится в локальном кэше процесса
+и в общем кэше Django и сбрасывается сигналами при изменении ролей,
+разрешений ролей и прямых доступов (см. core/signals.py).
+"""
+
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import models
+from django.utils import timezone
+
+from .conditions import conditions_key
+
+
+# v2: в снимке хранится эпоха прав (старые записи общего кэша не читаются)
+SNAPSHOT_CACHE_PREFIX = 'authz:snapshot:v2:'
+EPOCH_CACHE_PREFIX = 'authz:epoch:'
+
+# Разрешение, полученное через роль
+RoleGrant = namedtuple('RoleGrant', [
+    'role_code', 'resource_type_id', 'conditions', 'conditions_key', 'scope',
+])
+
+# Прямой доступ к ресурсу (ResourceAccess)
+DirectGrant = namedtuple('DirectGrant', [
+    'resource_id', 'expires_at', 'conditions', 'conditions_key',
+])
+
+
+class PermissionSnapshot(namedtuple('PermissionSnapshot', [
+    'user_id', 'role_codes', 'is_admin', 'role_permissions', 'direct_grants',
+    'permission_mask', 'epoch',
+])):
+    """
+    Неизменяемый снимок прав пользователя.
+
+    role_permissions: {codename: (RoleGrant, ...)}
+    direct_grants: {codename: (DirectGrant, ...)}
+    permission_mask: битовая маска разрешений ролей без условий (core/bitmask.py)
+    epoch: эпоха прав пользователя, прочитанная до построения снимка; снимок
+           не старше этой эпохи, поэтому по ней ключуются производные данные
+           (утверждение pep токена, кэш решений)
+    """
+    __slots__ = ()
+
+    @property
+    def codenames(self):
+        return frozenset(self.role_permissions) | frozenset(self.direct_grants)
+
+    def has_role(self, *codes):
+        return not self.role_codes.isdisjoint(codes)
+
+    def active_direct_grants(self, permission_codename, now=None):
+        """Неистекшие прямые доступы по разрешению (expires_at=None - бессрочный)"""
+        now = now or timezone.now()
+        return [
+            grant for grant in self.direct_grants.get(permission_codename, ())
+            if grant.expires_at is None or grant.expires_at > now
+        ]
+
+
+# Скомпилированная область действия роли: множества строковых идентификаторов
+# типов ресурсов и владельцев и множество отделов владельца; None - без ограничения
+RoleScope = namedtuple('RoleScope', ['resource_types', 'owners', 'departments'])
+
+SCOPE_KEYS = {
+    'resource_types': 'resource_types',
+    'owners': 'owners',
+    'owner_department': 'departments',
+}
+
+
+def compile_scope(resource_scope):
+    """
+    Приводит resource_scope роли к RoleScope для проверки поиском в множествах.
+    None означает отсутствие ограничений.
+    """
+    if not resource_scope:
+        return None
+    
+    values = {}
+    for key, field in SCOPE_KEYS.items():
+        value = resource_scope.get(key)
+        if value is None:
+            values[field] = None
+            continue
+        if not isinstance(value, (list, tuple)):
+            value = [value]
+        values[field] = frozenset(str(item) for item in value)
+    
+    scope = RoleScope(**values)
+    if scope == (None, None, None):
+        return None
+    return scope
+
+
+def _user_id(user):
+    return getattr(user, 'pk', user)
+
+
+_GRANT_FIELDS = (
+    'source', 'codename', 'resource_type_id', 'role__code', 'scope',
+    'conditions', 'resource_id', 'expires_at', 'permission__bit',
+)
+
+
+def _assemble_snapshot(user_id, epoch, role_rows, grant_rows):
+    """Собирает снимок из строк ролей (код, администратор) и строк _GRANT_FIELDS"""
+    from .models import UserEffectivePermission
+
+    role_codes = set()
+    is_admin = False
+    for role_code, role_is_admin in role_rows:
+        role_codes.add(role_code)
+        is_admin = is_admin or role_is_admin
+
+    role_permissions = {}
+    direct_grants = {}
+    permission_mask = 0
+    for source, codename, resource_type_id, role_code, scope, conditions, resource_id, expires_at, bit in grant_rows:
+        if source == UserEffectivePermission.SOURCE_ROLE:
+            if not conditions and bit is not None:
+                permission_mask |= 1 << bit
+            role_permissions.setdefault(codename, []).append(RoleGrant(
+                role_code=role_code,
+                resource_type_id=resource_type_id,
+                conditions=conditions or {},
+                conditions_key=conditions_key(conditions),
+                scope=compile_scope(scope),
+            ))
+        else:
+            direct_grants.setdefault(codename, []).append(DirectGrant(
+                resource_id=resource_id,
+                expires_at=expires_at,
+                conditions=conditions or {},
+                conditions_key=conditions_key(conditions),
+            ))
+
+    return PermissionSnapshot(
+        user_id=user_id,
+        role_codes=frozenset(role_codes),
+        is_admin=is_admin,
+        role_permissions={key: tuple(value) for key, value in role_permissions.items()},
+        direct_grants={key: tuple(value) for key, value in direct_grants.items()},
+        permission_mask=permission_mask,
+        epoch=epoch,
+    )
+
+
+def build_permission_snapshot(user):
+    """
+    Строит снимок прав пользователя двумя запросами: роли и строки
+    таблицы эффективных разрешений (UserEffectivePermission). Назначения
+    групп пользователя учитываются в тех же запросах через подзапрос
+    по замыканию групп.
+    user - пользователь или его идентификатор.
+    """
+    from django.db.models import Q
+    from .models import UserRole, UserEffectivePermission, member_group_ids
+    
+    user_id = _user_id(user)
+    # Эпоха читается до строк: изменение между запросами дает старую эпоху
+    # при новых правах, но не наоборот
+    epoch = get_permission_epoch(user_id)
+    principals = Q(user_id=user_id) | Q(group_id__in=member_group_ids(user_id))
+
+    # Роли пользователя вместе с унаследованными (через замыкание RoleClosure)
+    role_rows = UserRole.objects.filter(principals).values_list(
+        'role__ancestor_links__ancestor__code', 'role__ancestor_links__ancestor__is_admin'
+    )
+    grant_rows = UserEffectivePermission.objects.filter(principals).values_list(*_GRANT_FIELDS)
+    return _assemble_snapshot(user_id, epoch, role_rows, grant_rows)
+
+
+def build_permission_snapshots(user_ids):
+    """
+    Строит снимки прав нескольких пользователей тремя запросами независимо
+    от их числа: группы пользователей, роли и строки таблицы эффективных
+    разрешений. Возвращает {user_id: PermissionSnapshot}.
+    """
+    from django.db.models import Q
+    from .models import User, UserRole, UserEffectivePermission, GroupClosure
+
+    user_ids = set(user_ids)
+    if not user_ids:
+        return {}
+
+    epochs = dict(User.objects.filter(pk__in=user_ids).values_list('pk', 'permission_epoch'))
+
+    group_users = {}
+    for group_id, user_id in GroupClosure.objects.filter(
+        descendant__memberships__user_id__in=user_ids
+    ).values_list('ancestor_id', 'descendant__memberships__user_id'):
+        group_users.setdefault(group_id, set()).add(user_id)
+    principals = Q(user_id__in=user_ids) | Q(group_id__in=list(group_users))
+
+    def distribute(queryset):
+        # Строки группы достаются всем ее участникам из пачки
+        rows = {user_id: [] for user_id in user_ids}
+        for user_id, group_id, *values in queryset:
+            for owner_id in ([user_id] if user_id else group_users[group_id]):
+                rows[owner_id].append(values)
+        return rows
+
+    role_rows = distribute(UserRole.objects.filter(principals).values_list(
+        'user_id', 'group_id',
+        'role__ancestor_links__ancestor__code', 'role__ancestor_links__ancestor__is_admin',
+    ))
+    grant_rows = distribute(UserEffectivePermission.objects.filter(principals).values_list(
+        'user_id', 'group_id', *_GRANT_FIELDS
+    ))
+    return {
+        user_id: _assemble_snapshot(user_id, epochs.get(user_id, 0), role_rows[user_id], grant_rows[user_id])
+        for user_id in user_ids
+    }
+
+
+class _LocalSnapshotCache:
+    """Локальный LRU-кэш процесса с коротким временем жизни записей"""
+
+    def __init__(self):
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, timeout, max_size):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + timeout, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > max_size:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+_local_cache = _LocalSnapshotCache()
+
+
+def _cache_key(user_id):
+    return f'{SNAPSHOT_CACHE_PREFIX}{user_id}'
+
+
+def get_permission_snapshot(user, local=True):
+    """
+    Возвращает снимок прав пользователя.
+    Порядок поиска: локальный кэш процесса -> общий кэш -> база данных.
+    user - пользователь или его идентификатор; local=False - не читать
+    локальный кэш (его сбрасывает только процесс, изменивший права).
+    """
+    key = _cache_key(_user_id(user))
+
+    if local:
+        snapshot = _local_cache.get(key)
+        if snapshot is not None:
+            return snapshot
+
+    snapshot = cache.get(key)
+    if snapshot is None:
+        snapshot = build_permission_snapshot(user)
+        cache.set(key, snapshot, settings.AUTHZ_SNAPSHOT_TTL)
+
+    _local_cache.set(
+        key, snapshot,
+        settings.AUTHZ_SNAPSHOT_LOCAL_TTL,
+        settings.AUTHZ_SNAPSHOT_LOCAL_MAX_SIZE,
+    )
+    return snapshot
+
+
+def get_permission_snapshots(users):
+    """
+    Пакетный вариант get_permission_snapshot: {user_id: снимок}.
+    Промахи кэша строятся вместе (build_permission_snapshots), поэтому число
+    запросов не зависит от количества пользователей.
+    """
+    user_ids = {_user_id(user) for user in users}
+    snapshots = {}
+    missing = []
+    for user_id in user_ids:
+        snapshot = _local_cache.get(_cache_key(user_id))
+        if snapshot is None:
+            missing.append(user_id)
+        else:
+            snapshots[user_id] = snapshot
+
+    if missing:
+        cached = cache.get_many([_cache_key(user_id) for user_id in missing])
+        built = build_permission_snapshots(
+            user_id for user_id in missing if _cache_key(user_id) not in cached
+        )
+        if built:
+            cache.set_many(
+                {_cache_key(user_id): snapshot for user_id, snapshot in built.items()},
+                settings.AUTHZ_SNAPSHOT_TTL,
+            )
+        for user_id in missing:
+            snapshot = built.get(user_id) or cached[_cache_key(user_id)]
+            _local_cache.set(
+                _cache_key(user_id), snapshot,
+                settings.AUTHZ_SNAPSHOT_LOCAL_TTL,
+                settings.AUTHZ_SNAPSHOT_LOCAL_MAX_SIZE,
+            )
+            snapshots[user_id] = snapshot
+
+    return snapshots
+
+
+def _epoch_key(user_id):
+    return f'{EPOCH_CACHE_PREFIX}{user_id}'
+
+
+def invalidate_permission_snapshots(user_ids):
+    """Сбрасывает снимки и закэшированные эпохи прав указанных пользователей"""
+    user_ids = set(user_ids)
+    if not user_ids:
+        return
+    keys = [_cache_key(user_id) for user_id in user_ids]
+    for key in keys:
+        _local_cache.delete(key)
+    cache.delete_many(keys + [_epoch_key(user_id) for user_id in user_ids])
+
+
+def get_permission_epoch(user):
+    """
+    Текущая эпоха прав пользователя (User.permission_epoch).
+    Читается из общего кэша, при промахе - из базы данных.
+    """
+    from .models import User
+    
+    user_id = _user_id(user)
+    key = _epoch_key(user_id)
+    epoch = cache.get(key)
+    if epoch is None:
+        epoch = User.objects.filter(pk=user_id).values_list(
+            'permission_epoch', flat=True
+        ).first() or 0
+        cache.set(key, epoch, settings.AUTHZ_SNAPSHOT_TTL)
+    return epoch
+
+
+def bump_permission_epoch(user_ids):
+    """
+    Увеличивает эпоху прав пользователей.
+    Токены с устаревшей эпохой перестают использоваться для авторизации.
+    Кэш сбрасывается в invalidate_permission_snapshots.
+    """
+    from .models import User
+    
+    user_ids = set(user_ids)
+    if not user_ids:
+        return
+    User.objects.filter(pk__in=user_ids).update(
+        permission_epoch=models.F('permission_epoch') + 1
+    )
@@ -0,0 +1,468 @@
+import io
+import json
+import tempfile
+import threading
+import uuid
+from datetime import timedelta
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import DatabaseError, models
+from django.db.models import QuerySet
+from django.test import AsyncRequestFactory, RequestFactory, TestCase, override_settings
+from django.utils import timezone
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, TokenError
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+
+from .models import (
+    User, ResourceType, Permission, Resource, ResourceAccess, UserEffectivePermission,
+    Role, RolePermission, UserRole, AuditLog, Group, GroupMembership
+)
+from business_app import async_views as business_async_views
+from . import async_views, last_login
+from .authentication import CachedJWTAuthentication, _user_cache_key, revoke_user_tokens
+from .blacklist import _BlacklistIndex, _BloomFilter, prune_expired_tokens
+from .conditions import ConditionContext, compile_conditions
+from .permissions import HasPermission, check_many
+from .snapshot import _cache_key, _local_cache, get_permission_epoch, get_permission_snapshot
+from .throttling import MemorySlidingWindow
+from .tokens import AuthzRefreshToken, claims_decide
+from .utils import soft_delete_user, sweep_expired_grants
+
+
+class AuthzTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.project = ResourceType.objects.create(name='Проект', code='project')
+        cls.view = Permission.objects.create(
+            name='Просмотр проектов', resource_type=cls.project, action='view'
+        )
+        cls.edit = Permission.objects.create(
+            name='Редактирование проектов', resource_type=cls.project, action='edit'
+        )
+        cls.owner = User.objects.create_user('owner@example.com', 'Owner123!')
+        cls.user = User.objects.create_user('user@example.com', 'User123!')
+        cls.r1 = Resource.objects.create(resource_type=cls.project, name='r1', owner=cls.owner)
+        cls.r2 = Resource.objects.create(resource_type=cls.project, name='r2', owner=cls.owner)
+
+    def setUp(self):
+        # Откат транзакции теста не вызывает сигналов сброса кэшей
+        cache.clear()
+        _local_cache.clear()
+
+    def assign_role(self, code='observer'):
+        role = Role.objects.create(name=code, code=code)
+        RolePermission.objects.create(role=role, permission=self.view)
+        return UserRole.objects.create(user=self.user, role=role)
+
+    def keep_stale_local_snapshot(self, snapshot):
+        """Локальный кэш другого процесса, не получившего сигнал сброса"""
+        _local_cache.set(_cache_key(self.user.pk), snapshot, 60, 100)
+
+    def has_permission(self, codename):
+        user = User.objects.get(pk=self.user.pk)
+        return HasPermission(codename)._check_user_permission(user, codename)
+
+    def accessible(self, codename):
+        return sorted(Resource.objects.accessible_to(self.user, codename).values_list('name', flat=True))
+
+
+class DirectGrantTests(AuthzTestCase):
+    def direct_rows(self):
+        return UserEffectivePermission.objects.filter(source=UserEffectivePermission.SOURCE_DIRECT)
+
+    def test_changed_grant_replaces_row(self):
+        access = ResourceAccess.objects.create(user=self.user, resource=self.r1, permission=self.view)
+        self.assertEqual(self.accessible('view_project'), ['r1'])
+
+        access.permission = self.edit
+        access.resource = self.r2
+        access.save()
+
+        self.assertEqual(self.direct_rows().count(), 1)
+        self.assertFalse(self.has_permission('view_project'))
+        self.assertEqual(self.accessible('view_project'), [])
+        self.assertEqual(self.accessible('edit_project'), ['r2'])
+
+    def test_changed_principal_revokes_previous_user(self):
+        access = ResourceAccess.objects.create(user=self.user, resource=self.r1, permission=self.view)
+        self.assertTrue(self.has_permission('view_project'))
+
+        access.user = self.owner
+        access.save()
+
+        self.assertFalse(self.has_permission('view_project'))
+        self.assertEqual(self.direct_rows().get().user_id, self.owner.pk)
+
+    def test_deleted_grant_removes_row(self):
+        access = ResourceAccess.objects.create(user=self.user, resource=self.r1, permission=self.view)
+        access.resource = self.r2
+        access.save()
+        access.delete()
+
+        self.assertFalse(self.direct_rows().exists())
+        self.assertFalse(self.has_permission('view_project'))
+        self.assertEqual(self.accessible('view_project'), [])
+
+    def test_changed_member_loses_group_grant(self):
+        group = Group.objects.create(name='Отдел продаж')
+        membership = GroupMembership.objects.create(group=group, user=self.user)
+        ResourceAccess.objects.create(group=group, resource=self.r1, permission=self.view)
+        self.assertTrue(self.has_permission('view_project'))
+        epoch = get_permission_epoch(self.user)
+
+        membership.user = self.owner
+        membership.save()
+
+        self.assertFalse(self.has_permission('view_project'))
+        self.assertGreater(get_permission_epoch(self.user), epoch)
+
+    def test_group_grant_str(self):
+        group = Group.objects.create(name='Отдел продаж')
+        access = ResourceAccess.objects.create(group=group, resource=self.r1, permission=self.view)
+        self.assertEqual(str(access), 'Отдел продаж - r1 - Просмотр проектов')
+
+
+class TokenRevocationTests(AuthzTestCase):
+    def assertRevoked(self, revoke):
+        refresh = AuthzRefreshToken.for_user(User.objects.get(pk=self.user.pk))
+        authentication = CachedJWTAuthentication()
+        access = authentication.get_validated_token(str(refresh.access_token))
+        self.assertEqual(authentication.get_user(access), self.user)
+        if settings.AUTH_USER_CACHE_TTL:
+            # Пользователь токена закэширован до отзыва
+            self.assertIsNotNone(cache.get(_user_cache_key(self.user.pk)))
+
+        revoke()
+
+        with self.assertRaises(AuthenticationFailed):
+            authentication.get_user(access)
+        # Повторно: пользователь уже снова в кэше
+        with self.assertRaises(AuthenticationFailed):
+            async_to_sync(authentication.aget_user)(access)
+        with self.assertRaises(TokenError):
+            AuthzRefreshToken(str(refresh))
+
+    def test_revoke_user_tokens(self):
+        self.assertRevoked(lambda: revoke_user_tokens([self.user.pk]))
+
+    def test_soft_delete_user(self):
+        self.assertRevoked(lambda: soft_delete_user(User.objects.get(pk=self.user.pk)))
+
+    @override_settings(AUTH_USER_CACHE_TTL=0)
+    def test_revoke_without_user_cache(self):
+        self.assertRevoked(lambda: revoke_user_tokens([self.user.pk]))
+
+
+class StatelessClaimsTests(AuthzTestCase):
+    @override_settings(AUTHZ_STATELESS=True)
+    def test_claims_ignore_stale_local_snapshot(self):
+        user_role = self.assign_role()
+        stale = get_permission_snapshot(self.user)
+
+        user_role.delete()
+        self.keep_stale_local_snapshot(stale)
+        access = AuthzRefreshToken.for_user(self.user).access_token
+
+        self.assertEqual(access['pep'], get_permission_epoch(self.user))
+        self.assertFalse(claims_decide(access, 'view_project'))
+
+
+class DecisionCacheTests(AuthzTestCase):
+    def check(self):
+        request = RequestFactory().get('/')
+        request.user = User.objects.get(pk=self.user.pk)
+        return HasPermission('view_project').has_permission(request, None)
+
+    def test_stale_local_snapshot_not_shared(self):
+        user_role = self.assign_role()
+        stale = get_permission_snapshot(self.user)
+
+        user_role.delete()
+        self.keep_stale_local_snapshot(stale)
+        self.check()
+
+        # Другой процесс без устаревшего локального снимка
+        _local_cache.clear()
+        self.assertFalse(self.check())
+
+
+class PermissionBitTests(AuthzTestCase):
+    def test_taken_bit_is_retried(self):
+        # Конкурентное создание: Max('bit') прочитан до вставки соседа
+        stale = Permission.objects.aggregate(models.Max('bit'))
+        real_aggregate = QuerySet.aggregate
+        calls = iter([stale])
+
+        def aggregate(queryset, *args, **kwargs):
+            return next(calls, None) or real_aggregate(queryset, *args, **kwargs)
+
+        Permission.objects.create(name='Удаление проектов', resource_type=self.project, action='delete')
+        with mock.patch.object(QuerySet, 'aggregate', aggregate):
+            permission = Permission.objects.create(
+                name='Управление проектами', resource_type=self.project, action='manage'
+            )
+
+        self.assertEqual(permission.bit, stale['bit__max'] + 2)
+
+
+class ConditionIpTests(TestCase):
+    conditions = {'ip_ranges': ['10.0.0.0/8']}
+
+    def check(self, **meta):
+        request = RequestFactory().get('/', **meta)
+        return compile_conditions(self.conditions)(ConditionContext(User(), request))
+
+    def test_forwarded_for_ignored_without_trusted_proxy(self):
+        self.assertFalse(self.check(REMOTE_ADDR='203.0.113.5', HTTP_X_FORWARDED_FOR='10.1.2.3'))
+        self.assertTrue(self.check(REMOTE_ADDR='10.1.2.3'))
+
+    @override_settings(TRUSTED_PROXIES=['192.168.0.0/16'])
+    def test_forwarded_for_read_behind_trusted_proxy(self):
+        # Левые адреса подставляет клиент: учитывается первый недоверенный справа
+        self.assertTrue(self.check(REMOTE_ADDR='192.168.0.1', HTTP_X_FORWARDED_FOR='10.1.2.3'))
+        self.assertFalse(self.check(
+            REMOTE_ADDR='192.168.0.1', HTTP_X_FORWARDED_FOR='10.1.2.3, 203.0.113.5'
+        ))
+        self.assertFalse(self.check(REMOTE_ADDR='203.0.113.5', HTTP_X_FORWARDED_FOR='10.1.2.3'))
+
+
+class RoleScopeTests(AuthzTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.role = Role.objects.create(name='Наблюдатель', code='observer')
+        RolePermission.objects.create(role=cls.role, permission=cls.view)
+
+    def assign(self, resource_scope):
+        UserRole.objects.create(user=self.user, role=self.role, resource_scope=resource_scope)
+
+    def assertAccessible(self, expected):
+        user = User.objects.get(pk=self.user.pk)
+        resources = Resource.objects.order_by('name')
+        self.assertEqual(sorted(r.name for r in check_many(user, resources, 'view_project')), expected)
+        self.assertEqual(self.accessible('view_project'), expected)
+
+    def test_unrestricted_scope(self):
+        self.assign({})
+        self.assertAccessible(['r1', 'r2'])
+
+    def test_owner_scope(self):
+        self.assign({'owners': [str(self.owner.pk)]})
+        self.assertAccessible(['r1', 'r2'])
+
+    def test_unknown_owner_denies(self):
+        self.assign({'owners': [str(uuid.uuid4())]})
+        self.assertAccessible([])
+
+    def test_deleted_owner_keeps_restriction(self):
+        other = User.objects.create_user('other@example.com', 'Other123!')
+        self.assign({'owners': [str(other.pk)]})
+        other.delete()
+        self.assertAccessible([])
+
+    def test_empty_department_list_denies(self):
+        self.assign({'owner_department': []})
+        self.assertAccessible([])
+
+    def test_changed_principal_revokes_previous_user(self):
+        user_role = UserRole.objects.create(user=self.user, role=self.role)
+        self.assertTrue(self.has_permission('view_project'))
+
+        user_role.user = self.owner
+        user_role.save()
+
+        self.assertFalse(self.has_permission('view_project'))
+        self.assertFalse(UserEffectivePermission.objects.filter(user=self.user).exists())
+        self.assertTrue(UserEffectivePermission.objects.filter(user=self.owner).exists())
+
+
+class RebuildEffectivePermissionsTests(AuthzTestCase):
+    def test_verify_reports_drift(self):
+        ResourceAccess.objects.create(user=self.user, resource=self.r1, permission=self.view)
+        UserEffectivePermission.objects.all().delete()
+
+        options = {'emails': ['USER@Example.com'], 'stdout': io.StringIO()}
+        with self.assertRaises(CommandError):
+            call_command('rebuild_effective_permissions', verify=True, **options)
+        call_command('rebuild_effective_permissions', **options)
+        self.assertEqual(UserEffectivePermission.objects.filter(user=self.user).count(), 1)
+
+
+class ImportUsersTests(AuthzTestCase):
+    def test_unknown_role_counted_as_error(self):
+        Role.objects.create(name='Наблюдатель', code='observer')
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', encoding='utf-8') as source:
+            source.write('email,password,roles\nnew@example.com,New123!,observer;missing\n')
+            source.flush()
+            stdout, stderr = io.StringIO(), io.StringIO()
+            call_command('import_users', source.name, workers=1, stdout=stdout, stderr=stderr)
+
+        self.assertIn("неизвестная роль 'missing'", stderr.getvalue())
+        self.assertIn('ошибок - 1', stdout.getvalue())
+        self.assertEqual(
+            list(UserRole.objects.filter(user__email='new@example.com').values_list('role__code', flat=True)),
+            ['observer']
+        )
+        self.assertEqual(AuditLog.objects.get(details__action='import').details['errors'], 1)
+
+
+class SweepExpiredGrantsTests(AuthzTestCase):
+    def test_sweep_removes_expired_grants(self):
+        past = timezone.now() - timedelta(hours=1)
+        ResourceAccess.objects.create(user=self.user, resource=self.r1, permission=self.view, expires_at=past)
+        ResourceAccess.objects.create(user=self.user, resource=self.r2, permission=self.view)
+
+        self.assertEqual(sweep_expired_grants(batch_size=1), 1)
+
+        self.assertEqual(list(ResourceAccess.objects.values_list('resource__name', flat=True)), ['r2'])
+        self.assertEqual(UserEffectivePermission.objects.filter(user=self.user).count(), 1)
+        self.assertEqual(self.accessible('view_project'), ['r2'])
+        self.assertTrue(AuditLog.objects.filter(action='access_revoked', details__count=1).exists())
+
+
+class PruneExpiredTokensTests(AuthzTestCase):
+    def test_prune_removes_expired_tokens(self):
+        now = timezone.now()
+        for jti, expires_at in (('old', now - timedelta(days=1)), ('new', now + timedelta(days=1))):
+            token = OutstandingToken.objects.create(
+                user=self.user, jti=jti, token=jti, expires_at=expires_at
+            )
+            BlacklistedToken.objects.create(token=token)
+
+        self.assertEqual(prune_expired_tokens(dry_run=True), 1)
+        self.assertEqual(prune_expired_tokens(batch_size=1), 1)
+
+        self.assertEqual(list(OutstandingToken.objects.values_list('jti', flat=True)), ['new'])
+        self.assertEqual(BlacklistedToken.objects.count(), 1)
+
+
+class BlacklistIndexTests(AuthzTestCase):
+    def blacklist(self, jti):
+        token = OutstandingToken.objects.create(
+            user=self.user, jti=jti, token=jti, expires_at=timezone.now() + timedelta(days=1)
+        )
+        return BlacklistedToken.objects.create(token=token)
+
+    def test_negative_answer_skips_database(self):
+        self.blacklist('old')
+        index = _BlacklistIndex()
+        self.assertTrue(index.contains('old'))
+        with self.assertNumQueries(0):
+            self.assertFalse(index.contains('fresh'))
+
+    def test_other_process_loads_after_cursor(self):
+        self.blacklist('old')
+        index = _BlacklistIndex()
+        index.contains('old')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.blacklist('new')
+        # Одна догрузка строк после курсора и подтверждение положительного ответа
+        with self.assertNumQueries(2):
+            self.assertTrue(index.contains('new'))
+
+    def test_own_blacklisting_does_not_reload(self):
+        index = _BlacklistIndex()
+        index.contains('warmup')
+        with mock.patch('core.blacklist._index', index), self.captureOnCommitCallbacks(execute=True):
+            self.blacklist('own')
+
+        with self.assertNumQueries(1):
+            self.assertTrue(index.contains('own'))
+
+    def test_late_commit_below_cursor_is_loaded(self):
+        late, later = self.blacklist('late'), self.blacklist('later')
+        index = _BlacklistIndex()
+        index._filter = _BloomFilter(100)
+        index._cursor = late.pk - 1
+        # Строка late еще не закоммичена, когда процесс прочитал later
+        index._load(index._filter, BlacklistedToken.objects.filter(pk=later.pk))
+        self.assertNotIn('late', index._filter)
+
+        index._refresh(generation=0)
+        self.assertIn('late', index._filter)
+        self.assertEqual(index._gaps, {})
+
+
+class MemorySlidingWindowTests(TestCase):
+    @override_settings(LOGIN_THROTTLE_MAX_KEYS=2)
+    def test_least_recently_used_keys_evicted(self):
+        window = MemorySlidingWindow()
+        self.assertEqual(window.attempt([('a', 1, 60)], 0), 0)
+        window.attempt([('b', 1, 60)], 1)
+        self.assertTrue(window.attempt([('a', 1, 60)], 2))
+        window.attempt([('c', 1, 60)], 3)
+
+        # Вытеснен b: к нему обращались раньше, чем к a
+        self.assertEqual(list(window._hits), ['a', 'c'])
+        self.assertTrue(window.attempt([('a', 1, 60)], 4))
+        self.assertEqual(window.attempt([('b', 1, 60)], 5), 0)
+
+
+class LastLoginTests(AuthzTestCase):
+    def tearDown(self):
+        last_login._pending.clear()
+        timer = last_login._timer[0]
+        if timer is not None:
+            timer.cancel()
+            last_login._timer[0] = None
+
+    @override_settings(LAST_LOGIN_FLUSH_INTERVAL=0.05)
+    def test_idle_process_flushes_on_timer(self):
+        flushed = threading.Event()
+        with mock.patch.object(last_login, 'flush_last_login', side_effect=lambda: flushed.set()):
+            last_login.record_login(self.user)
+            self.assertTrue(flushed.wait(2))
+
+    @override_settings(LAST_LOGIN_FLUSH_SIZE=1, LAST_LOGIN_FLUSH_INTERVAL=60)
+    def test_flush_error_does_not_fail_login(self):
+        with mock.patch.object(QuerySet, 'bulk_update', side_effect=DatabaseError('down')), \
+                self.assertLogs('core.last_login', 'ERROR'):
+            last_login.record_login(self.user)
+
+        # Время входа осталось в буфере и записывается следующей попыткой
+        self.assertIn(self.user.pk, last_login._pending)
+        self.assertEqual(last_login.flush_last_login(), 1)
+        self.user.refresh_from_db()
+        self.assertIsNotNone(self.user.last_login)
+
+
+class AsyncViewsTests(AuthzTestCase):
+    def authorized(self, path):
+        token = AuthzRefreshToken.for_user(self.user).access_token
+        return AsyncRequestFactory().get(path, headers={'Authorization': f'Bearer {token}'})
+
+    def test_login_validates_serializer_fields(self):
+        request = AsyncRequestFactory().post(
+            '/api/auth/login/', {'email': 'not-an-email', 'password': 'User123!'},
+            content_type='application/json'
+        )
+        response = async_to_sync(async_views.login)(request)
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('email', json.loads(response.content))
+        self.assertIsInstance(request.user, AnonymousUser)
+
+    @override_settings(AUTH_USER_CACHE_TTL=0)
+    def test_aget_user_reads_database_without_cache(self):
+        token = AuthzRefreshToken.for_user(self.user).access_token
+        with mock.patch('core.authentication.aget_cached_user', side_effect=AssertionError):
+            user = async_to_sync(CachedJWTAuthentication().aget_user)(token)
+        self.assertEqual(user, self.user)
+
+    def test_dashboard_includes_group_roles(self):
+        manager = Role.objects.create(name='Менеджер', code='manager')
+        group = Group.objects.create(name='Отдел продаж')
+        GroupMembership.objects.create(group=group, user=self.user)
+        UserRole.objects.create(group=group, role=manager)
+
+        response = async_to_sync(business_async_views.dashboard)(self.authorized('/api/dashboard/'))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.content)['user']['roles'], ['Менеджер'])
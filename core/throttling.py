@@ -0,0 +1,150 @@
+"""
+Ограничение частоты попыток входа по email и по IP-адресу.
+
+Проверка выполняется классом троттлинга DRF до вызова LoginView.post,
+то есть до хэширования пароля: перебор паролей отклоняется с 429
+и не расходует CPU.
+
+Лимиты задаются в LOGIN_THROTTLE_RATES в формате DRF ('5/min').
+Хранилище - LOGIN_THROTTLE_BACKEND:
+    memory - скользящее окно (журнал времен попыток) в памяти процесса;
+    cache  - скользящее окно по двум счетчикам в общем кэше Django
+             (общий лимит для всех процессов, оценка с точностью до
+             равномерного распределения попыток в прошлом окне).
+"""
+
+import hashlib
+import math
+import threading
+import time
+from collections import OrderedDict, deque
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.throttling import BaseThrottle
+
+from .utils import get_client_ip
+
+
+THROTTLE_CACHE_PREFIX = 'auth:throttle:'
+
+PERIODS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+def parse_rate(rate):
+    """'5/min' -> (5, 60)"""
+    count, period = rate.split('/')
+    return int(count), PERIODS[period[0]]
+
+
+class MemorySlidingWindow:
+    """
+    Журналы времен попыток по ключам в памяти процесса. Число ключей
+    ограничено LOGIN_THROTTLE_MAX_KEYS: при переполнении вытесняются
+    ключи, к которым дольше всего не обращались (LRU).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._hits = OrderedDict()
+
+    def attempt(self, limits, now):
+        """
+        limits - [(ключ, лимит, окно в секундах)]. Попытка учитывается,
+        только если она укладывается во все лимиты. Возвращает время
+        ожидания в секундах (0 - попытка разрешена).
+        """
+        with self._lock:
+            wait = 0
+            for key, limit, window in limits:
+                hits = self._hits.get(key)
+                if hits is None:
+                    hits = self._hits[key] = deque()
+                else:
+                    self._hits.move_to_end(key)
+                while hits and hits[0] <= now - window:
+                    hits.popleft()
+                if len(hits) >= limit:
+                    wait = max(wait, hits[-limit] + window - now)
+            # Ключи текущей попытки только что перемещены в конец
+            max_keys = max(settings.LOGIN_THROTTLE_MAX_KEYS, len(limits))
+            while len(self._hits) > max_keys:
+                self._hits.popitem(last=False)
+            if wait:
+                return wait
+
+            for key, limit, window in limits:
+                self._hits[key].append(now)
+            return 0
+
+
+class CacheSlidingWindow:
+    """Скользящее окно по счетчикам текущего и прошлого окна в кэше Django"""
+
+    def _key(self, key, window_index):
+        return f'{THROTTLE_CACHE_PREFIX}{key}:{window_index}'
+
+    def attempt(self, limits, now):
+        keys = []
+        for key, limit, window in limits:
+            index = int(now // window)
+            keys += [self._key(key, index), self._key(key, index - 1)]
+        counts = cache.get_many(keys)
+
+        wait = 0
+        for key, limit, window in limits:
+            index = int(now // window)
+            elapsed = now - index * window
+            current = counts.get(self._key(key, index), 0)
+            previous = counts.get(self._key(key, index - 1), 0)
+            if previous * (window - elapsed) / window + current >= limit:
+                wait = max(wait, window - elapsed)
+        if wait:
+            return wait
+
+        for key, limit, window in limits:
+            current_key = self._key(key, int(now // window))
+            cache.add(current_key, 0, window * 2)
+            try:
+                cache.incr(current_key)
+            except ValueError:
+                cache.set(current_key, 1, window * 2)
+        return 0
+
+
+_backends = {
+    'memory': MemorySlidingWindow(),
+    'cache': CacheSlidingWindow(),
+}
+
+
+def _subject(value):
+    return hashlib.sha256(value.encode()).hexdigest()[:32]
+
+
+class LoginRateThrottle(BaseThrottle):
+    """Лимиты попыток входа на email и на IP-адрес клиента"""
+
+    def get_limits(self, request):
+        rates = settings.LOGIN_THROTTLE_RATES
+        limits = []
+        ip = get_client_ip(request)
+        if ip and rates.get('ip'):
+            limits.append((f'ip:{_subject(ip)}', *parse_rate(rates['ip'])))
+
+        email = request.data.get('email') if hasattr(request.data, 'get') else None
+        if isinstance(email, str) and email.strip() and rates.get('email'):
+            limits.append((f'email:{_subject(email.strip().lower())}', *parse_rate(rates['email'])))
+        return limits
+
+    def allow_request(self, request, view):
+        limits = self.get_limits(request)
+        if not limits:
+            return True
+
+        backend = _backends[settings.LOGIN_THROTTLE_BACKEND]
+        self._wait = backend.attempt(limits, time.time())
+        return not self._wait
+
+    def wait(self):
+        return math.ceil(self._wait)
@@ -0,0 +1,130 @@
+"""
+JWT-токены с утверждениями авторизации (режим AUTHZ_STATELESS).
+
+В токен доступа добавляются:
+    roles  - коды ролей пользователя
+    adm    - есть ли административная роль
+    perms  - маска разрешений ролей без условий (решаются прямо по токену)
+    xperms - маска разрешений, требующих проверки на сервере
+             (условия, прямые доступы)
+    pep    - эпоха прав пользователя на момент выпуска токена
+
+Во всех режимах в токены добавляется tver - версия токенов пользователя
+(см. core/authentication.py).
+
+Маски кодируются через core/bitmask.py.
+"""
+
+from django.conf import settings
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+
+from .bitmask import (
+    encode_mask, decode_mask, get_permission_bits, mask_from_codenames, mask_has
+)
+from .snapshot import get_permission_snapshot, get_permission_epoch
+from .authentication import TOKEN_VERSION_CLAIM, get_cached_user, token_version_matches
+from .blacklist import is_blacklisted
+from .jwks import get_keyring_backend
+
+
+AUTHZ_CLAIMS = ('roles', 'adm', 'perms', 'xperms', 'pep')
+
+
+def set_authz_claims(token, user):
+    """Записывает в токен утверждения авторизации пользователя"""
+    # Локальный кэш другого процесса может пережить отзыв прав: снимок
+    # берется из общего кэша, а pep - из самого снимка, а не отдельным чтением
+    snapshot = get_permission_snapshot(user, local=False)
+    server_side = (
+        set(snapshot.direct_grants) | set(snapshot.role_permissions)
+    ) - {
+        codename for codename in snapshot.role_permissions
+        if mask_has(snapshot.permission_mask, codename)
+    }
+
+    token['roles'] = sorted(snapshot.role_codes)
+    token['adm'] = snapshot.is_admin
+    token['perms'] = encode_mask(snapshot.permission_mask)
+    token['xperms'] = encode_mask(mask_from_codenames(server_side))
+    token['pep'] = snapshot.epoch
+
+
+class KeyRingTokenMixin:
+    """Подпись и проверка ключами JWT_KEYS_DIR, если они настроены (core/jwks.py)"""
+
+    def get_token_backend(self):
+        return get_keyring_backend() or super().get_token_backend()
+
+
+class AuthzAccessToken(KeyRingTokenMixin, AccessToken):
+    pass
+
+
+class AuthzRefreshToken(KeyRingTokenMixin, RefreshToken):
+    """
+    Refresh-токен, который при выпуске токена доступа обновляет
+    утверждения авторизации из текущих прав пользователя.
+    """
+    access_token_class = AuthzAccessToken
+
+    @classmethod
+    def for_user(cls, user):
+        token = super().for_user(user)
+        token[TOKEN_VERSION_CLAIM] = user.token_version
+        if settings.AUTHZ_STATELESS:
+            set_authz_claims(token, user)
+        return token
+
+    def check_blacklist(self):
+        # Черный список в памяти процесса вместо запроса на каждую проверку
+        if is_blacklisted(self.payload[api_settings.JTI_CLAIM]):
+            raise TokenError(_('Token is blacklisted'))
+
+    def verify(self):
+        super().verify()
+        # Токены, выпущенные до отзыва всех токенов пользователя, не обновляются
+        user = get_cached_user(self.payload[api_settings.USER_ID_CLAIM])
+        if user is None or not user.is_active or not token_version_matches(self.payload, user):
+            raise TokenError(_('Token is revoked'))
+
+    @property
+    def access_token(self):
+        if settings.AUTHZ_STATELESS:
+            set_authz_claims(self, self.payload[api_settings.USER_ID_CLAIM])
+        return super().access_token
+
+
+def get_authz_claims(request):
+    """
+    Возвращает утверждения авторизации из токена запроса.
+    None - режим выключен, токен без утверждений или эпоха прав устарела;
+    в этом случае права проверяются по базе данных.
+    """
+    if not settings.AUTHZ_STATELESS:
+        return None
+
+    token = getattr(request, 'auth', None)
+    if token is None or 'pep' not in token:
+        return None
+
+    if token['pep'] != get_permission_epoch(request.user):
+        return None
+
+    return token
+
+
+def claims_decide(claims, permission_codename):
+    """
+    Решение по утверждениям токена: True/False, либо None,
+    если разрешение нужно проверить на сервере.
+    """
+    if permission_codename not in get_permission_bits():
+        return None
+    if mask_has(decode_mask(claims['perms']), permission_codename):
+        return True
+    if mask_has(decode_mask(claims['xperms']), permission_codename):
+        return None
+    return False
@@ -1,3 +1,4 @@
+from django.conf import settings
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from rest_framework_simplejwt.views import TokenRefreshView
@@ -5,26 +6,39 @@ from .views import (
     RegisterView, LoginView, LogoutView, UserProfileView,
     RoleViewSet, PermissionViewSet, UserRoleViewSet,
     ResourceTypeViewSet, ResourceViewSet, ResourceAccessViewSet,
-    InitializeSystemView
+    GroupViewSet, GroupMembershipViewSet, InitializeSystemView
 )
 
 router = DefaultRouter()
 router.register(r'roles', RoleViewSet, basename='role')
 router.register(r'permissions', PermissionViewSet, basename='permission')
 router.register(r'user-roles', UserRoleViewSet, basename='user-role')
+router.register(r'groups', GroupViewSet, basename='group')
+router.register(r'group-memberships', GroupMembershipViewSet, basename='group-membership')
 router.register(r'resource-types', ResourceTypeViewSet, basename='resource-type')
 router.register(r'resources', ResourceViewSet, basename='resource')
 router.register(r'resource-access', ResourceAccessViewSet, basename='resource-access')
 
+if settings.ASYNC_VIEWS:
+    # ASGI: асинхронные версии входа, обновления токенов и профиля
+    from . import async_views
+    login = async_views.login
+    refresh = async_views.refresh
+    profile = async_views.profile
+else:
+    login = LoginView.as_view()
+    refresh = TokenRefreshView.as_view()
+    profile = UserProfileView.as_view()
+
 urlpatterns = [
     # Аутентификация
     path('register/', RegisterView.as_view(), name='register'),
-    path('login/', LoginView.as_view(), name='login'),
+    path('login/', login, name='login'),
     path('logout/', LogoutView.as_view(), name='logout'),
-    path('refresh/', TokenRefreshView.as_view(), name='token_refresh'),
+    path('refresh/', refresh, name='token_refresh'),
     
     # Профиль пользователя
-    path('profile/', UserProfileView.as_view(), name='profile'),
+    path('profile/', profile, name='profile'),
     
     # Системные эндпоинты
     path('system/initialize/', InitializeSystemView.as_view(), name='initialize-system'),
@@ -1,11 +1,12 @@
+import functools
+import ipaddress
+
+from django.conf import settings
+
 from .models import AuditLog
 
 
-def log_action(user, action, resource_type='', resource_id='', details=None, 
-               request=None):
-    """
-    Логирует действие пользователя
-    """
+def _audit_log(user, action, resource_type, resource_id, details, request):
     audit_log = AuditLog(
         user=user,
         action=action,
@@ -18,38 +19,96 @@ def log_action(user, action, resource_type='', resource_id='', details=None,
         audit_log.ip_address = get_client_ip(request)
         audit_log.user_agent = request.META.get('HTTP_USER_AGENT', '')
     
+    return audit_log
+
+
+def log_action(user, action, resource_type='', resource_id='', details=None, 
+               request=None):
+    """
+    Логирует действие пользователя
+    """
+    audit_log = _audit_log(user, action, resource_type, resource_id, details, request)
     audit_log.save()
     return audit_log
 
 
+async def alog_action(user, action, resource_type='', resource_id='', details=None,
+                      request=None):
+    """
+    log_action для async-представлений
+    """
+    audit_log = _audit_log(user, action, resource_type, resource_id, details, request)
+    await audit_log.asave()
+    return audit_log
+
+
+@functools.lru_cache(maxsize=8)
+def _proxy_networks(proxies):
+    return tuple(ipaddress.ip_network(value.strip(), strict=False) for value in proxies)
+
+
+def _parse_ip(value):
+    try:
+        return ipaddress.ip_address(value.strip())
+    except (AttributeError, ValueError):
+        return None
+
+
+def client_ip_address(request):
+    """
+    IP адрес клиента (ipaddress) или None. X-Forwarded-For учитывается только
+    для запросов от доверенных прокси (TRUSTED_PROXIES): адреса читаются
+    справа налево до первого недоверенного. Результат запоминается в запросе.
+    """
+    ip = getattr(request, '_client_ip_address', False)
+    if ip is not False:
+        return ip
+
+    ip = _parse_ip(request.META.get('REMOTE_ADDR'))
+    proxies = _proxy_networks(tuple(settings.TRUSTED_PROXIES))
+    if proxies:
+        forwarded = [
+            value for value in request.META.get('HTTP_X_FORWARDED_FOR', '').split(',')
+            if value.strip()
+        ]
+        while ip is not None and forwarded and any(ip in network for network in proxies):
+            ip = _parse_ip(forwarded.pop())
+
+    request._client_ip_address = ip
+    return ip
+
+
 def get_client_ip(request):
     """
     Получает IP адрес клиента из запроса
     """
-    x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
-    if x_forwarded_for:
-        ip = x_forwarded_for.split(',')[0]
-    else:
-        ip = request.META.get('REMOTE_ADDR')
-    return ip
+    ip = client_ip_address(request)
+    return str(ip) if ip is not None else None
 
 
 def check_resource_access(user, resource, permission_codename):
     """
-    Проверяет доступ пользователя к ресурсу
+    Проверяет доступ пользователя к ресурсу.
+    Можно передать список ресурсов - тогда возвращается доступное подмножество.
     """
-    from .permissions import HasPermission
+    from .permissions import check_many
     
-    permission_checker = HasPermission(permission_codename)
-    return permission_checker.has_object_permission(None, None, resource)
+    if isinstance(resource, (list, tuple, set)) or hasattr(resource, 'model'):
+        return check_many(user, resource, permission_codename)
+    
+    return bool(check_many(user, [resource], permission_codename))
 
 
 def soft_delete_user(user):
     """
-    Мягкое удаление пользователя
+    Мягкое удаление пользователя.
+    Все выпущенные токены пользователя отзываются.
     """
+    from .authentication import revoke_user_tokens
+    
     user.is_active = False
-    user.save()
+    user.save(update_fields=['is_active'])
+    revoke_user_tokens([user.pk])
     
 
 
@@ -94,4 +153,65 @@ def create_default_permissions():
                     'action': action,
                     'description': f'Разрешение на {action} {name.lower()}ов'
                 }
-            )
\ No newline at end of file
+            )
+
+def delete_in_batches(queryset, delete_batch, batch_size=1000, dry_run=False):
+    """
+    Удаляет строки queryset пачками: delete_batch(rows) вызывается в отдельной
+    транзакции для каждых batch_size строк, пока queryset не опустеет.
+    Возвращает количество удаленных строк (при dry_run - число строк
+    в первой пачке).
+    """
+    from django.db import transaction
+    
+    total = 0
+    while True:
+        rows = list(queryset[:batch_size])
+        if dry_run:
+            return len(rows)
+        if not rows:
+            return total
+        with transaction.atomic():
+            delete_batch(rows)
+        total += len(rows)
+
+
+def sweep_expired_grants(batch_size=1000, now=None, dry_run=False):
+    """
+    Удаляет истекшие прямые доступы пачками.
+    Строки эффективных разрешений удаляются каскадом, снимки прав
+    получателей сбрасываются сигналами удаления.
+    Для каждой пачки пишется одна запись AuditLog со списком удаленных доступов.
+    Возвращает количество удаленных доступов (при dry_run - число истекших
+    доступов в первой пачке).
+    """
+    from django.utils import timezone
+    from .models import ResourceAccess
+    
+    def delete_batch(batch):
+        ResourceAccess.objects.filter(id__in=[row['id'] for row in batch]).delete()
+        log_action(
+            user=None,
+            action='access_revoked',
+            resource_type='resource_access',
+            details={
+                'reason': 'expired',
+                'count': len(batch),
+                'grants': [
+                    {
+                        'id': str(row['id']),
+                        'user': str(row['user_id'] or ''),
+                        'group': str(row['group_id'] or ''),
+                        'resource': str(row['resource_id']),
+                        'permission': str(row['permission_id']),
+                        'expires_at': row['expires_at'].isoformat(),
+                    }
+                    for row in batch
+                ],
+            }
+        )
+    
+    expired = ResourceAccess.objects.expired(now or timezone.now()).order_by('expires_at').values(
+        'id', 'user_id', 'group_id', 'resource_id', 'permission_id', 'expires_at'
+    )
+    return delete_in_batches(expired, delete_batch, batch_size=batch_size, dry_run=dry_run)
@@ -1,23 +1,32 @@
 from rest_framework import viewsets, generics, status
 from rest_framework.response import Response
 from rest_framework.views import APIView
-from rest_framework.permissions import AllowAny, IsAuthenticated as DRFIsAuthenticated
-from rest_framework_simplejwt.tokens import RefreshToken
-from django.utils import timezone
+from rest_framework.permissions import AllowAny, IsAuthenticated as DRFIsAuthenticated, SAFE_METHODS
+from django.db import transaction
+from django.core.exceptions import ValidationError
 from rest_framework_simplejwt.exceptions import TokenError
 
 from .models import (
     User, Role, Permission, UserRole, ResourceType,
-    Resource, ResourceAccess
+    Resource, ResourceAccess, Group, GroupMembership
 )
 from .serializers import (
     RegisterSerializer, LoginSerializer, UserSerializer,
     UserUpdateSerializer, RoleSerializer, PermissionSerializer,
     UserRoleSerializer, ResourceTypeSerializer, ResourceSerializer,
-    ResourceAccessSerializer
+    ResourceAccessSerializer, GroupSerializer, GroupMembershipSerializer,
+    AuthzCheckSerializer
+)
+from .permissions import (
+    IsAuthenticated, HasPermission, IsAdmin, IsOwnerOrHasPermission, check_batch
 )
-from .permissions import IsAuthenticated, HasPermission, IsAdmin, IsOwnerOrHasPermission
 from .utils import log_action, soft_delete_user, create_default_permissions
+from .snapshot import get_permission_snapshot
+from .tokens import AuthzRefreshToken
+from .authentication import revoke_user_tokens
+from .throttling import LoginRateThrottle
+from .last_login import record_login
+from .explain import explain_permission, resolve_user
 
 
 class RegisterView(generics.CreateAPIView):
@@ -31,7 +40,7 @@ class RegisterView(generics.CreateAPIView):
         user = serializer.save()
         
         # Создаем токены
-        refresh = RefreshToken.for_user(user)
+        refresh = AuthzRefreshToken.for_user(user)
         
         # Логируем регистрацию
         log_action(
@@ -56,34 +65,38 @@ class RegisterView(generics.CreateAPIView):
 class LoginView(APIView):
     """Вход в систему"""
     permission_classes = [AllowAny]
+    # Лимит попыток проверяется до хэширования пароля
+    throttle_classes = [LoginRateThrottle]
     
     def post(self, request):
         serializer = LoginSerializer(data=request.data, context={'request': request})
         serializer.is_valid(raise_exception=True)
         user = serializer.validated_data['user']
-        
-        # Создаем токены
-        refresh = RefreshToken.for_user(user)
-        
-        # Обновляем последний вход
-        user.last_login = timezone.now()
-        user.save(update_fields=['last_login'])
-        
-        # Логируем вход
+        return Response(complete_login(user, request))
+
+
+def complete_login(user, request):
+    """Выпуск токенов после проверки пароля; возвращает тело ответа входа"""
+    # Токен (OutstandingToken) и запись аудита - одна транзакция
+    with transaction.atomic():
+        refresh = AuthzRefreshToken.for_user(user)
         log_action(
             user=user,
             action='login',
             request=request
         )
-        
-        return Response({
-            'message': 'Вход выполнен успешно',
-            'user': UserSerializer(user).data,
-            'tokens': {
-                'refresh': str(refresh),
-                'access': str(refresh.access_token),
-            }
-        })
+    
+    # Последний вход записывается отложенно, пачками
+    record_login(user)
+    
+    return {
+        'message': 'Вход выполнен успешно',
+        'user': UserSerializer(user).data,
+        'tokens': {
+            'refresh': str(refresh),
+            'access': str(refresh.access_token),
+        }
+    }
 
 
 class LogoutView(APIView):
@@ -92,9 +105,13 @@ class LogoutView(APIView):
     
     def post(self, request):
         try:
+            # all=true - выход на всех устройствах: отзываются все токены пользователя
+            logout_all = str(request.data.get('all', '')).lower() in ('1', 'true')
             refresh_token = request.data.get('refresh')
-            if refresh_token:
-                token = RefreshToken(refresh_token)
+            if logout_all:
+                revoke_user_tokens([request.user.pk])
+            elif refresh_token:
+                token = AuthzRefreshToken(refresh_token)
                 token.blacklist() 
             else:
                 pass
@@ -102,6 +119,7 @@ class LogoutView(APIView):
             log_action(
                 user=request.user,
                 action='logout',
+                details={'all_devices': True} if logout_all else None,
                 request=request
             )
             
@@ -123,7 +141,11 @@ class UserProfileView(generics.RetrieveUpdateDestroyAPIView):
     serializer_class = UserSerializer
     
     def get_object(self):
-        return self.request.user
+        # Пользователь запроса может быть взят из кэша аутентификации:
+        # изменения выполняются над актуальной строкой из базы
+        if self.request.method in SAFE_METHODS:
+            return self.request.user
+        return User.objects.get(pk=self.request.user.pk)
     
     def get_serializer_class(self):
         if self.request.method in ['PUT', 'PATCH']:
@@ -146,15 +168,7 @@ class UserProfileView(generics.RetrieveUpdateDestroyAPIView):
             request=request
         )
         
-        # Выход из системы
-        try:
-                refresh_token = request.data.get('refresh')
-                if refresh_token:
-                    token = RefreshToken(refresh_token)
-                    token.blacklist()
-        except:
-                pass 
-                    
+        # Токены пользователя отозваны в soft_delete_user
         return Response(
             {'message': 'Аккаунт успешно удален'},
             status=status.HTTP_200_OK
@@ -189,10 +203,13 @@ class UserRoleViewSet(viewsets.ModelViewSet):
     def get_queryset(self):
         queryset = super().get_queryset()
         user_id = self.request.query_params.get('user_id')
+        group_id = self.request.query_params.get('group_id')
         role_id = self.request.query_params.get('role_id')
         
         if user_id:
             queryset = queryset.filter(user_id=user_id)
+        if group_id:
+            queryset = queryset.filter(group_id=group_id)
         if role_id:
             queryset = queryset.filter(role_id=role_id)
         
@@ -208,12 +225,39 @@ class UserRoleViewSet(viewsets.ModelViewSet):
             resource_type='role',
             resource_id=str(serializer.instance.role_id),
             details={
-                'assigned_to': str(serializer.instance.user_id),
+                'assigned_to': str(serializer.instance.user_id or ''),
+                'group': str(serializer.instance.group_id or ''),
                 'role': serializer.instance.role.name
             }
         )
 
 
+class GroupViewSet(viewsets.ModelViewSet):
+    """Управление группами пользователей (только для администраторов)"""
+    queryset = Group.objects.all()
+    serializer_class = GroupSerializer
+    permission_classes = [IsAuthenticated, IsAdmin]
+
+
+class GroupMembershipViewSet(viewsets.ModelViewSet):
+    """Управление участниками групп (только для администраторов)"""
+    queryset = GroupMembership.objects.select_related('user', 'group')
+    serializer_class = GroupMembershipSerializer
+    permission_classes = [IsAuthenticated, IsAdmin]
+    
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        user_id = self.request.query_params.get('user_id')
+        group_id = self.request.query_params.get('group_id')
+        
+        if user_id:
+            queryset = queryset.filter(user_id=user_id)
+        if group_id:
+            queryset = queryset.filter(group_id=group_id)
+        
+        return queryset
+
+
 class ResourceTypeViewSet(viewsets.ModelViewSet):
     """Управление типами ресурсов (только для администраторов)"""
     queryset = ResourceType.objects.all()
@@ -237,24 +281,14 @@ class ResourceViewSet(viewsets.ModelViewSet):
     
     def get_queryset(self):
         user = self.request.user
+        queryset = Resource.objects.select_related('owner', 'resource_type')
         
         # Администраторы видят все
-        if user.is_superuser or user.user_roles.filter(role__is_admin=True).exists():
-            return Resource.objects.all()
-        
-        # Владельцы видят свои ресурсы
-        queryset = Resource.objects.filter(owner=user)
-        
-        # Пользователи видят ресурсы, к которым у них есть доступ
-        user_access = ResourceAccess.objects.filter(
-            user=user,
-            expires_at__gt=timezone.now()
-        ).values_list('resource_id', flat=True)
-        
-        if user_access:
-            queryset = queryset | Resource.objects.filter(id__in=user_access)
+        if user.is_superuser or get_permission_snapshot(user).is_admin:
+            return queryset
         
-        return queryset.distinct()
+        # Владельцы видят свои ресурсы, пользователи - ресурсы с прямым доступом
+        return queryset.accessible_to(user)
 
 
 class ResourceAccessViewSet(viewsets.ModelViewSet):
@@ -266,10 +300,13 @@ class ResourceAccessViewSet(viewsets.ModelViewSet):
     def get_queryset(self):
         queryset = super().get_queryset()
         user_id = self.request.query_params.get('user_id')
+        group_id = self.request.query_params.get('group_id')
         resource_id = self.request.query_params.get('resource_id')
         
         if user_id:
             queryset = queryset.filter(user_id=user_id)
+        if group_id:
+            queryset = queryset.filter(group_id=group_id)
         if resource_id:
             queryset = queryset.filter(resource_id=resource_id)
         
@@ -285,13 +322,102 @@ class ResourceAccessViewSet(viewsets.ModelViewSet):
             resource_type='resource_access',
             resource_id=str(serializer.instance.id),
             details={
-                'user': str(serializer.instance.user_id),
+                'user': str(serializer.instance.user_id or ''),
+                'group': str(serializer.instance.group_id or ''),
                 'resource': str(serializer.instance.resource_id),
                 'permission': serializer.instance.permission.codename
             }
         )
 
 
+class AuthzCheckView(APIView):
+    """
+    Пакетная проверка прав для внешних сервисов.
+    Принимает {"checks": [{"subject": id, "resource_id": id | null, "permission": codename}]},
+    subject по умолчанию - текущий пользователь. Проверять права других
+    пользователей могут только администраторы.
+    """
+    permission_classes = [IsAuthenticated]
+    
+    def post(self, request):
+        serializer = AuthzCheckSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        checks = serializer.validated_data['checks']
+        
+        for check in checks:
+            check.setdefault('subject', request.user.pk)
+        
+        if any(check['subject'] != request.user.pk for check in checks):
+            if not IsAdmin().has_permission(request, self):
+                return Response(
+                    {
+                        'error': 'You do not have permission to perform this action.',
+                        'code': 'permission_denied',
+                        'message': 'Проверять права других пользователей могут только администраторы'
+                    },
+                    status=status.HTTP_403_FORBIDDEN
+                )
+        
+        decisions = check_batch(
+            [(check['subject'], check['resource_id'], check['permission']) for check in checks],
+            request
+        )
+        
+        return Response({
+            'results': [
+                {
+                    'subject': str(check['subject']),
+                    'resource_id': str(check['resource_id']) if check['resource_id'] else None,
+                    'permission': check['permission'],
+                    'allowed': allowed
+                }
+                for check, allowed in zip(checks, decisions)
+            ]
+        })
+
+
+class AuthzExplainView(APIView):
+    """
+    Объяснение проверки прав (только для администраторов):
+    ?user=<id|email>&permission=<codename>[&resource=<id>][&fresh=1]
+    """
+    permission_classes = [IsAuthenticated, IsAdmin]
+    
+    def get(self, request):
+        user_value = request.query_params.get('user', '')
+        permission_codename = request.query_params.get('permission')
+        resource_id = request.query_params.get('resource')
+        
+        if not user_value or not permission_codename:
+            return Response(
+                {'error': 'Укажите параметры user и permission'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        try:
+            user = resolve_user(user_value)
+            resource = Resource.objects.filter(pk=resource_id).first() if resource_id else None
+        except ValidationError:
+            return Response(
+                {'error': 'Некорректный идентификатор'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        if user is None or (resource_id and resource is None):
+            return Response(
+                {'error': 'Пользователь или ресурс не найден'},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        
+        return Response(explain_permission(
+            user,
+            permission_codename,
+            resource=resource,
+            request=request if user.pk == request.user.pk else None,
+            fresh=request.query_params.get('fresh') in ('1', 'true')
+        ))
+
+
 class InitializeSystemView(APIView):
     """Инициализация системы (создание стандартных данных)"""
     permission_classes = [IsAuthenticated, IsAdmin]
@@ -304,47 +430,47 @@ class InitializeSystemView(APIView):
             # Создаем стандартные роли
             from .models import Role, Permission, ResourceType
             
-            # Роль администратора
-            admin_role, created = Role.objects.get_or_create(
-                code='admin',
+            # Иерархия ролей: пользователь <- менеджер <- администратор,
+            # каждая роль хранит только свои разрешения и наследует остальные
+            user_role, created = Role.objects.get_or_create(
+                code='user',
                 defaults={
-                    'name': 'Администратор',
-                    'description': 'Полный доступ ко всем функциям системы',
-                    'is_admin': True
+                    'name': 'Пользователь',
+                    'description': 'Базовый пользователь',
+                    'is_admin': False
                 }
             )
             
-            # Роль менеджера
             manager_role, created = Role.objects.get_or_create(
                 code='manager',
                 defaults={
                     'name': 'Менеджер',
                     'description': 'Управление проектами и документами',
-                    'is_admin': False
+                    'is_admin': False,
+                    'parent': user_role
                 }
             )
             
-            # Роль пользователя
-            user_role, created = Role.objects.get_or_create(
-                code='user',
+            admin_role, created = Role.objects.get_or_create(
+                code='admin',
                 defaults={
-                    'name': 'Пользователь',
-                    'description': 'Базовый пользователь',
-                    'is_admin': False
+                    'name': 'Администратор',
+                    'description': 'Полный доступ ко всем функциям системы',
+                    'is_admin': True,
+                    'parent': manager_role
                 }
             )
             
+            # Роли, созданные до появления иерархии
+            for role, parent in ((manager_role, user_role), (admin_role, manager_role)):
+                if role.parent_id != parent.pk:
+                    role.parent = parent
+                    role.save()
+            
             # Назначаем разрешения ролям
             project_type = ResourceType.objects.get(code='project')
             document_type = ResourceType.objects.get(code='document')
             
-            # Разрешения для менеджера
-            manager_permissions = Permission.objects.filter(
-                resource_type__in=[project_type, document_type]
-            ).exclude(action='manage')
-            
-            manager_role.permissions.set(manager_permissions)
-            
             # Разрешения для пользователя
             user_permissions = Permission.objects.filter(
                 resource_type__in=[project_type, document_type],
@@ -353,9 +479,18 @@ class InitializeSystemView(APIView):
             
             user_role.permissions.set(user_permissions)
             
-            # Назначаем администратору все разрешения
-            all_permissions = Permission.objects.all()
-            admin_role.permissions.set(all_permissions)
+            # Разрешения для менеджера (сверх унаследованных)
+            manager_permissions = Permission.objects.filter(
+                resource_type__in=[project_type, document_type]
+            ).exclude(action='manage').exclude(pk__in=user_permissions)
+            
+            manager_role.permissions.set(manager_permissions)
+            
+            # Администратору - все остальные разрешения
+            admin_permissions = Permission.objects.exclude(
+                pk__in=manager_permissions
+            ).exclude(pk__in=user_permissions)
+            admin_role.permissions.set(admin_permissions)
             
             return Response({
                 'message': 'Система инициализирована успешно',